@@ -0,0 +1,44 @@
+"""
+Read-optimized client rows for list and search pages.
+
+ClientSerializer builds a model instance per row, runs every field through
+DRF, and looks up the credit officer once per client. Listings instead
+read plain dicts with values(), join the officer's names in the same
+query, and shape each dict like ClientSerializer's output.
+"""
+from .serializers import ClientSerializer
+
+CLIENT_LIST_FIELDS = [
+    field for field in ClientSerializer.Meta.fields
+    if field not in ('full_name', 'credit_officer_name')
+]
+_OFFICER_NAME_FIELDS = ['credit_officer__first_name', 'credit_officer__last_name']
+
+
+def client_rows(queryset, *extra_fields):
+    """Queryset of dicts with the list fields plus the officer's names.
+
+    ``extra_fields`` (such as a cursor's ordering field) are read too but
+    left out of the encoded rows.
+    """
+    extra = [field for field in extra_fields if field not in CLIENT_LIST_FIELDS]
+    return queryset.values(*CLIENT_LIST_FIELDS, *_OFFICER_NAME_FIELDS, *extra)
+
+
+def encode_client_row(row):
+    """Shape a client_rows() dict like ClientSerializer(client).data.
+
+    Like the serializer, full_name is left out (it is not stored) and so is
+    credit_officer_name for clients without an officer.
+    """
+    data = {field: row[field] for field in CLIENT_LIST_FIELDS}
+    if data['credit_officer'] is not None:
+        # User.get_full_name()
+        data['credit_officer_name'] = (
+            f"{row['credit_officer__first_name']} {row['credit_officer__last_name']}".strip()
+        )
+    return data
+
+
+def encode_client_rows(rows):
+    return [encode_client_row(row) for row in rows]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:01
+
+from datetime import datetime, time
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Min
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def backfill_created_at(apps, schema_editor):
+    """Date existing clients from their first loan application.
+
+    Clients are numbered in registration order, so one without loans
+    takes the earliest date of the clients registered after it. Only the
+    newest clients with no loans at all fall back to the migration time.
+    That carry-forward is a running minimum, so the dates are worked out
+    here and written in batches rather than by a per-row subquery.
+    """
+    Client = apps.get_model('clients', 'Client')
+    first_loans = dict(
+        Client.objects.values_list('pk').annotate(first=Min('loans__application_date'))
+    )
+    earliest = django.utils.timezone.now()
+    clients = []
+    for pk in sorted(first_loans, reverse=True):
+        if first_loans[pk] is not None:
+            applied = django.utils.timezone.make_aware(datetime.combine(first_loans[pk], time.min))
+            earliest = min(earliest, applied)
+        clients.append(Client(pk=pk, created_at=earliest))
+    Client.objects.bulk_update(clients, ['created_at'], batch_size=BACKFILL_BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_alter_client_date_of_birth'),
+        ('loans', '0004_remove_loanrestructuring_loan_alter_loan_options_and_more'),
+    ]
+
+    operations = [
+        # Nullable first, so existing rows are not all stamped with the migration time
+        migrations.AddField(
+            model_name='client',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='client',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:04
+
+import clients.search
+from django.db import migrations
+
+
+def backfill_search_documents(apps, schema_editor):
+    Client = apps.get_model('clients', 'Client')
+    batch = []
+    for client in Client.objects.select_related('credit_officer').iterator(chunk_size=2000):
+        client.search_document = clients.search.build_search_document(client, client.credit_officer)
+        batch.append(client)
+        if len(batch) == 2000:
+            Client.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    Client.objects.bulk_update(batch, ['search_document'])
+
+
+def create_search_index(apps, schema_editor):
+    clients.search.ensure_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    clients.search.drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0004_client_created_at_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='search_document',
+            field=clients.search.SearchDocumentField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
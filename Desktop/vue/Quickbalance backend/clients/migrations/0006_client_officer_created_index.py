@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0005_client_search_document'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['credit_officer', 'created_at'], name='clients_cli_credit__067340_idx'),
+        ),
+    ]
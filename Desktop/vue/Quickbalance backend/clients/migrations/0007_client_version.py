@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0006_client_officer_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import F
 from django.conf import settings
+from django.utils import timezone
+from .search import SearchDocumentField, build_search_document
 
 class Client(models.Model):
     # Basic details
@@ -45,10 +48,45 @@ class Client(models.Model):
         null=True,
         related_name="clients"
     )
+
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Normalized tokens for full-text search (see search.py)
+    search_document = SearchDocumentField(blank=True, default='', editable=False)
+
+    # Bumped by every write; detail and list ETags are built from it (config/etags.py)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    # Officer as last loaded from the database, so signals can tell reassignments
+    _loaded_credit_officer_id = None
+
+    class Meta:
+        indexes = [
+            # An officer's clients, newest first (filtered list, cursor pages, stats)
+            models.Index(fields=['credit_officer', 'created_at']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'credit_officer_id' in field_names:
+            instance._loaded_credit_officer_id = instance.credit_officer_id
+        return instance
+
     def save(self, *args, **kwargs):
         # Auto-generate full name
         self.full_name = f"{self.first_name} {self.other_names or ''}".strip()
+        self.search_document = build_search_document(self, self.credit_officer)
+        adding = self._state.adding
+        if not adding:
+            # Incremented in SQL, so concurrent edits never share a version
+            self.version = F('version') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'search_document', 'version'}
         super().save(*args, **kwargs)
+        if not adding:
+            self.refresh_from_db(fields=['version'])
 
     def __str__(self):
         return self.full_name
@@ -0,0 +1,99 @@
+"""
+Keyset (cursor) pagination for client listings.
+
+Page-number pagination counts the whole filtered queryset and OFFSET-scans
+to reach deep pages. In cursor mode the listing is ordered by the
+requested field plus id, and each page continues strictly after the last
+row of the previous one, so every page costs the same. The cursor is an
+opaque token carrying the ordering and the last row's key.
+
+NULLs sort first ascending and last descending on every backend, so
+nullable ordering fields page the same way on MySQL and SQLite.
+"""
+import base64
+import json
+
+from django.db.models import F, Q
+
+from .models import Client
+
+
+def wants_cursor_pagination(request):
+    params = request.query_params
+    return params.get('pagination') == 'cursor' or 'cursor' in params
+
+
+def encode_cursor(ordering, client):
+    """``client`` is a Client or a values() dict including the ordering field"""
+    field = ordering.lstrip('-')
+    if isinstance(client, dict):
+        value, pk = client[field], client['id']
+    else:
+        value, pk = getattr(client, field), client.pk
+    if value is not None:
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    payload = json.dumps([ordering, value, pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    """Return (value, id) from a cursor issued for this ordering"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_ordering, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_ordering != ordering:
+            raise ValueError("cursor was issued for a different ordering")
+        field = Client._meta.get_field(ordering.lstrip('-'))
+        return (None if value is None else field.to_python(value)), int(last_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def _keyset_ordering(ordering):
+    field = ordering.lstrip('-')
+    if ordering.startswith('-'):
+        return [F(field).desc(nulls_last=True), F('id').desc()]
+    return [F(field).asc(nulls_first=True), F('id').asc()]
+
+
+def _after(ordering, value, last_id):
+    """Rows that sort strictly after (value, last_id)"""
+    field = ordering.lstrip('-')
+    descending = ordering.startswith('-')
+    same_value_later_id = Q(**{f'{field}__isnull': True} if value is None else {field: value}) & Q(
+        **{'id__lt' if descending else 'id__gt': last_id}
+    )
+
+    if value is None:
+        # NULLs come last descending, first ascending
+        return same_value_later_id if descending else same_value_later_id | Q(**{f'{field}__isnull': False})
+    beyond = Q(**{f'{field}__lt' if descending else f'{field}__gt': value})
+    if descending:
+        beyond |= Q(**{f'{field}__isnull': True})
+    return beyond | same_value_later_id
+
+
+def _page_queryset(queryset, ordering, cursor, page_size):
+    queryset = queryset.order_by(*_keyset_ordering(ordering))
+    if cursor:
+        value, last_id = decode_cursor(cursor, ordering)
+        queryset = queryset.filter(_after(ordering, value, last_id))
+    # One extra row tells us whether there is a next page without a COUNT
+    return queryset[:page_size + 1]
+
+
+def _split_page(rows, ordering, page_size):
+    next_cursor = encode_cursor(ordering, rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def paginate_by_cursor(queryset, ordering, cursor, page_size):
+    """Return (rows, next cursor) for the page after ``cursor``"""
+    rows = list(_page_queryset(queryset, ordering, cursor, page_size))
+    return _split_page(rows, ordering, page_size)
+
+
+async def apaginate_by_cursor(queryset, ordering, cursor, page_size):
+    """paginate_by_cursor() for async views"""
+    rows = [row async for row in _page_queryset(queryset, ordering, cursor, page_size)]
+    return _split_page(rows, ordering, page_size)
@@ -0,0 +1,174 @@
+"""
+Indexed client search.
+
+Each client keeps a normalized ``search_document``: the lower-cased
+tokens of its names, phone, email, IDs and occupation, then ' | ' and the
+credit officer's username and names. Text searches run against that one
+column through a full-text index:
+
+* MySQL: a FULLTEXT index queried with MATCH ... AGAINST in boolean mode,
+  every token required and prefix-matched.
+* SQLite (local development and tests): an FTS5 table kept in sync with
+  triggers, standing in for the FULLTEXT index.
+* Anything else: every token must appear in the document (LIKE).
+
+Terms that look like a phone number or an ID skip full-text search and use
+prefix lookups on the indexed phone / national_id / passport columns. Those
+lookups are case-insensitive LIKEs, which SQLite only serves from NOCASE
+indexes, so SQLite gets one per identifier column as well.
+"""
+import re
+
+from django.db import models
+from django.db.models import Lookup, Q
+
+FULLTEXT_INDEX_NAME = 'clients_client_search_ft'
+SQLITE_FTS_TABLE = 'clients_client_fts'
+
+# InnoDB ignores shorter words (innodb_ft_min_token_size); those tokens
+# are matched with LIKE instead
+MIN_FULLTEXT_TOKEN = 3
+
+CLIENT_SEARCH_FIELDS = [
+    'first_name', 'other_names', 'phone', 'email',
+    'national_id', 'passport_number', 'occupation',
+]
+OFFICER_SEARCH_FIELDS = ['username', 'first_name', 'last_name']
+IDENTIFIER_FIELDS = ['phone', 'national_id', 'passport_number']
+OFFICER_SEPARATOR = ' | '
+
+_TOKEN_RE = re.compile(r'[0-9a-z]+')
+# Phone numbers and ID/passport numbers: one word containing a digit
+_IDENTIFIER_RE = re.compile(r'(?=[^\s]*\d)[0-9A-Za-z/-]+')
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def _tokens_of(obj, fields):
+    tokens = []
+    for field in fields:
+        value = getattr(obj, field, None)
+        # Placeholder defaults carry no information
+        if value and value != 'N/A':
+            tokens += tokenize(str(value))
+    return ' '.join(tokens)
+
+
+def officer_search_text(officer):
+    return _tokens_of(officer, OFFICER_SEARCH_FIELDS) if officer else ''
+
+
+def build_search_document(client, officer):
+    return _tokens_of(client, CLIENT_SEARCH_FIELDS) + OFFICER_SEPARATOR + officer_search_text(officer)
+
+
+class SearchDocumentField(models.TextField):
+    """TextField holding normalized search tokens; supports ``__match``"""
+
+
+@SearchDocumentField.register_lookup
+class FullTextMatch(Lookup):
+    lookup_name = 'match'
+
+    def as_mysql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        query = ' '.join(f'+{token}*' for token in tokenize(self.rhs))
+        return f'MATCH ({lhs}) AGAINST (%s IN BOOLEAN MODE)', [*lhs_params, query]
+
+    def as_sqlite(self, compiler, connection):
+        quote = connection.ops.quote_name
+        query = ' '.join(f'"{token}"*' for token in tokenize(self.rhs))
+        return (
+            f'{quote(self.lhs.alias)}.{quote("id")} IN '
+            f'(SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s)'
+        ), [query]
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        tokens = tokenize(self.rhs)
+        sql = ' AND '.join([f'{lhs} LIKE %s'] * len(tokens))
+        params = []
+        for token in tokens:
+            params += [*lhs_params, f'%{token}%']
+        return sql, params
+
+
+def apply_search(queryset, term):
+    term = (term or '').strip()
+    if not term:
+        return queryset
+
+    if _IDENTIFIER_RE.fullmatch(term):
+        lookups = Q()
+        for field in IDENTIFIER_FIELDS:
+            lookups |= Q(**{f'{field}__istartswith': term})
+        return queryset.filter(lookups)
+
+    tokens = tokenize(term)
+    if not tokens:
+        return queryset.none()
+    indexed = [token for token in tokens if len(token) >= MIN_FULLTEXT_TOKEN]
+    if indexed:
+        queryset = queryset.filter(search_document__match=' '.join(indexed))
+    for token in tokens:
+        if len(token) < MIN_FULLTEXT_TOKEN:
+            queryset = queryset.filter(search_document__contains=token)
+    return queryset
+
+
+def ensure_search_index(connection):
+    """Create the full-text index for this database if it is missing.
+
+    Safe to run repeatedly. On SQLite it also re-creates the FTS triggers,
+    which are lost whenever a migration rebuilds the clients table.
+    """
+    table = 'clients_client'
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT COUNT(*) FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+                [table, FULLTEXT_INDEX_NAME],
+            )
+            if not cursor.fetchone()[0]:
+                cursor.execute(f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX_NAME} ON {table} (search_document)")
+        elif connection.vendor == 'sqlite':
+            fts = SQLITE_FTS_TABLE
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"search_document, content='{table}', content_rowid='id')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, search_document) VALUES (new.id, new.search_document); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, search_document) "
+                f"VALUES ('delete', old.id, old.search_document); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, search_document) "
+                f"VALUES ('delete', old.id, old.search_document); "
+                f"INSERT INTO {fts}(rowid, search_document) VALUES (new.id, new.search_document); END"
+            )
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            for field in IDENTIFIER_FIELDS:
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_{field}_nocase ON {table} ({field} COLLATE NOCASE)"
+                )
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(f"DROP INDEX {FULLTEXT_INDEX_NAME} ON clients_client")
+        elif connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_{suffix}")
+            for field in IDENTIFIER_FIELDS:
+                cursor.execute(f"DROP INDEX IF EXISTS clients_client_{field}_nocase")
+            cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}")
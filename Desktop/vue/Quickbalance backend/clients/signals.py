@@ -0,0 +1,48 @@
+# signals.py
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Client
+from . import stats
+from .search import OFFICER_SEPARATOR, build_search_document, ensure_search_index, officer_search_text
+
+
+@receiver(post_save, sender=Client)
+def update_stats_on_save(sender, instance, created, **kwargs):
+    # Counters move only once the write is committed
+    if created:
+        transaction.on_commit(lambda: stats.record_client_created(instance))
+    elif instance._loaded_credit_officer_id != instance.credit_officer_id:
+        old_officer_id = instance._loaded_credit_officer_id
+        new_officer_id = instance.credit_officer_id
+        transaction.on_commit(lambda: stats.record_officer_change(old_officer_id, new_officer_id))
+    instance._loaded_credit_officer_id = instance.credit_officer_id
+
+
+@receiver(post_delete, sender=Client)
+def update_stats_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: stats.record_client_deleted(instance))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reindex_officer_clients(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login; nothing searchable changed
+    if update_fields is not None and not {'username', 'first_name', 'last_name'} & set(update_fields):
+        return
+    stale = Client.objects.filter(credit_officer=instance).exclude(
+        search_document__endswith=OFFICER_SEPARATOR + officer_search_text(instance)
+    )
+    clients = list(stale)
+    for client in clients:
+        client.search_document = build_search_document(client, instance)
+        # credit_officer_name changed too
+        client.version = F('version') + 1
+    Client.objects.bulk_update(clients, ['search_document', 'version'], batch_size=500)
+
+
+def ensure_client_search_index(sender, using, **kwargs):
+    # Re-applied after every migrate: SQLite loses the FTS triggers whenever
+    # a migration rebuilds the clients table
+    ensure_search_index(connections[using])
@@ -0,0 +1,153 @@
+"""
+Cached client counters for the dashboard.
+
+client_stats used to run three COUNT queries per request. The counts now
+live in the cache: a global total, one counter per credit officer and
+one counter per creation day for the rolling "recent" window. Client
+save/delete signals (see signals.py) keep them current; a counter that
+is missing or expired is recounted from the database on the next read.
+Counters only move when they are already cached, so a cold counter is
+never incremented from a wrong starting point. aget_client_stats() is the
+same read for async views, on the async cache and ORM APIs.
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Client
+
+RECENT_DAYS = 7
+# Totals re-sync with the database at most this often (seconds)
+COUNTER_TIMEOUT = 60 * 60
+# Day buckets only need to outlive the window they belong to
+DAY_TIMEOUT = (RECENT_DAYS + 1) * 24 * 60 * 60
+
+TOTAL_KEY = 'client_stats:total'
+
+
+def officer_key(officer_id):
+    return f'client_stats:officer:{officer_id}'
+
+
+def day_key(day):
+    return f'client_stats:day:{day.isoformat()}'
+
+
+def recent_days(today=None):
+    """The calendar days (today included) that make up the recent window"""
+    today = today or timezone.localdate()
+    return [today - timedelta(days=offset) for offset in range(RECENT_DAYS)]
+
+
+def get_client_stats(user):
+    """Dashboard counts, from the cache whenever it is warm"""
+    days = recent_days()
+    keys = [TOTAL_KEY, officer_key(user.pk)] + [day_key(day) for day in days]
+    cached = cache.get_many(keys)
+
+    total = cached.get(TOTAL_KEY)
+    if total is None:
+        total = Client.objects.count()
+        cache.add(TOTAL_KEY, total, COUNTER_TIMEOUT)
+
+    mine = cached.get(officer_key(user.pk))
+    if mine is None:
+        mine = Client.objects.filter(credit_officer=user).count()
+        cache.add(officer_key(user.pk), mine, COUNTER_TIMEOUT)
+
+    recent = 0
+    for day in days:
+        count = cached.get(day_key(day))
+        if count is None:
+            count = _count_created_on(day)
+            cache.add(day_key(day), count, DAY_TIMEOUT)
+        recent += count
+
+    return {
+        'total_clients': total,
+        'my_clients': mine,
+        'recent_clients': recent,
+    }
+
+
+async def aget_client_stats(user):
+    """get_client_stats() for async views"""
+    days = recent_days()
+    keys = [TOTAL_KEY, officer_key(user.pk)] + [day_key(day) for day in days]
+    cached = await cache.aget_many(keys)
+
+    total = cached.get(TOTAL_KEY)
+    if total is None:
+        total = await Client.objects.acount()
+        await cache.aadd(TOTAL_KEY, total, COUNTER_TIMEOUT)
+
+    mine = cached.get(officer_key(user.pk))
+    if mine is None:
+        mine = await Client.objects.filter(credit_officer=user).acount()
+        await cache.aadd(officer_key(user.pk), mine, COUNTER_TIMEOUT)
+
+    recent = 0
+    for day in days:
+        count = cached.get(day_key(day))
+        if count is None:
+            count = await _created_on(day).acount()
+            await cache.aadd(day_key(day), count, DAY_TIMEOUT)
+        recent += count
+
+    return {
+        'total_clients': total,
+        'my_clients': mine,
+        'recent_clients': recent,
+    }
+
+
+def cached_client_count(officer_id=None):
+    """Cached total (or one officer's) client count, or None when cold"""
+    return cache.get(officer_key(officer_id) if officer_id else TOTAL_KEY)
+
+
+def _created_on(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return Client.objects.filter(created_at__gte=start, created_at__lt=start + timedelta(days=1))
+
+
+def _count_created_on(day):
+    return _created_on(day).count()
+
+
+def adjust_counter(key, delta):
+    """Move a cached counter; leave it alone if it is not cached"""
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        pass
+
+
+def record_client_created(client):
+    adjust_counter(TOTAL_KEY, 1)
+    if client.credit_officer_id:
+        adjust_counter(officer_key(client.credit_officer_id), 1)
+    adjust_counter(day_key(timezone.localdate(client.created_at)), 1)
+
+
+def record_client_deleted(client):
+    adjust_counter(TOTAL_KEY, -1)
+    if client.credit_officer_id:
+        adjust_counter(officer_key(client.credit_officer_id), -1)
+    adjust_counter(day_key(timezone.localdate(client.created_at)), -1)
+
+
+def record_officer_change(old_officer_id, new_officer_id):
+    if old_officer_id:
+        adjust_counter(officer_key(old_officer_id), -1)
+    if new_officer_id:
+        adjust_counter(officer_key(new_officer_id), 1)
+
+
+def invalidate_counters(officer_ids=()):
+    """Drop the total, officer and recent-day counters so they are recounted.
+
+    For changes made without the save/delete signals, such as bulk_create.
+    """
+    cache.delete_many([TOTAL_KEY] + [officer_key(pk) for pk in officer_ids] + [day_key(day) for day in recent_days()])
@@ -13,4 +13,8 @@ urlpatterns = [
     path('<int:pk>/delete/', views.client_detail, name='client-delete'),
     path('search/', views.client_search, name='client-search'),
     path('stats/', views.client_stats, name='client-stats'),
+    # Async versions for ASGI deployments (see config/asgi.py)
+    path('async/<int:pk>/', views.client_detail_async, name='client-detail-async'),
+    path('async/search/', views.client_search_async, name='client-search-async'),
+    path('async/stats/', views.client_stats_async, name='client-stats-async'),
 ]
\ No newline at end of file
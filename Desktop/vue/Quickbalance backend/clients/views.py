@@ -1,22 +1,38 @@
-from rest_framework.decorators import api_view, permission_classes
+from asgiref.sync import sync_to_async
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, Count
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.utils import timezone
-from datetime import timedelta
+from django.core.paginator import Page, Paginator, EmptyPage, PageNotAnInteger
+from django.views.decorators.http import require_GET
 from .models import Client
 from .serializers import ClientSerializer
+from .stats import aget_client_stats, cached_client_count, get_client_stats
+from .pagination import apaginate_by_cursor, paginate_by_cursor, wants_cursor_pagination
+from .search import apply_search
+from .listing import client_rows, encode_client_row, encode_client_rows
+from config.etags import etag_matches, make_etag, not_modified, page_versions, rows_etag, with_etag
+from config.renderers import ORJSONRenderer, dumps
+from config.routers import read_from_replica
 
 # Constants for better maintainability
 DEFAULT_PAGE_SIZE = 15
 MAX_PAGE_SIZE = 50
 VALID_ORDERING_FIELDS = ['created_at', 'updated_at', 'first_name', 'other_names', 'phone', 'email']
+# Rows fetched per query when streaming search results as NDJSON
+STREAM_CHUNK_SIZE = 500
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, BrowsableAPIRenderer])
+@read_from_replica
 def client_list_create(request):
     if request.method == 'GET':
         return _get_client_list(request)
@@ -26,11 +42,16 @@ def client_list_create(request):
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def client_detail(request, pk):
+    if request.method in ('GET', 'HEAD') and request.META.get('HTTP_IF_NONE_MATCH'):
+        # Answer a poll from the version alone
+        version = Client.objects.filter(pk=pk).values_list('version', flat=True).first()
+        if version is not None and etag_matches(request, _client_etag(pk, version)):
+            return not_modified(_client_etag(pk, version))
 
     client = get_object_or_404(Client, pk=pk)
     
     if request.method == 'GET':
-        return _get_client_detail(client)
+        return _get_client_detail(client, request)
     elif request.method in ['PUT', 'PATCH']:
         return _update_client(client, request, partial=request.method == 'PATCH')
     elif request.method == 'DELETE':
@@ -38,17 +59,22 @@ def client_detail(request, pk):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, BrowsableAPIRenderer])
+@read_from_replica
 def client_search(request):
     try:
         queryset = Client.objects.all()
         queryset = _apply_filters(queryset, request)
         queryset = _apply_search(queryset, request)
-        queryset = _apply_ordering(queryset, request)
         
         # Pagination with validation
         page = request.query_params.get('page', 1)
         page_size = min(int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
-        
+
+        if wants_cursor_pagination(request):
+            return _get_cursor_page(request, queryset, page_size)
+
+        queryset = client_rows(_apply_ordering(queryset, request))
         paginator = Paginator(queryset, page_size)
         
         try:
@@ -57,7 +83,6 @@ def client_search(request):
             clients = paginator.page(1)
         except EmptyPage:
             clients = paginator.page(paginator.num_pages)
-        serializer = ClientSerializer(clients, many=True, context={'request': request})
         return Response({
             'count': paginator.count,
             'total_pages': paginator.num_pages,
@@ -65,7 +90,7 @@ def client_search(request):
             'page_size': page_size,
             'next': clients.next_page_number() if clients.has_next() else None,
             'previous': clients.previous_page_number() if clients.has_previous() else None,
-            'results': serializer.data
+            'results': encode_client_rows(clients)
         })
         
     except Exception as e:
@@ -76,21 +101,12 @@ def client_search(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_from_replica
 def client_stats(request):
 
     try:
-        total_clients = Client.objects.count()
-        user_clients = Client.objects.filter(credit_officer=request.user)
-        my_clients = user_clients.count()
-        recent_clients = Client.objects.filter(
-            created_at__gte=timezone.now() - timedelta(days=7)
-        ).count()
-        
-        return Response({
-            'total_clients': total_clients,
-            'my_clients': my_clients,
-            'recent_clients': recent_clients,
-        })
+        # Counters come from the cache; see stats.py
+        return Response(get_client_stats(request.user))
         
     except Exception as e:
         return Response(
@@ -104,17 +120,30 @@ def _get_client_list(request):
         credit_officer_id = request.query_params.get('credit_officer')
         if credit_officer_id:
             queryset = queryset.filter(credit_officer_id=credit_officer_id)
-        ordering = request.query_params.get('ordering', '-created_at')
-        if ordering.lstrip('-') in VALID_ORDERING_FIELDS:
-            queryset = queryset.order_by(ordering)
-        else:
-            queryset = queryset.order_by('-created_at')
         
         # Pagination with validation
         page = request.query_params.get('page', 1)
         page_size = min(int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
-        
-        paginator = Paginator(queryset, page_size)
+
+        if wants_cursor_pagination(request):
+            # The cached dashboard counters double as a free count estimate
+            return _get_cursor_page(
+                request, queryset, page_size,
+                estimated_count=cached_client_count(credit_officer_id),
+            )
+
+        queryset = _apply_ordering(queryset, request)
+        count = None
+        if request.META.get('HTTP_IF_NONE_MATCH'):
+            # Compare the page's ids and versions before reading its rows
+            versions, count = page_versions(queryset, ['pk', 'version'], page_size, page)
+            etag = rows_etag('clients', versions, count)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+        paginator = Paginator(client_rows(queryset, 'version'), page_size)
+        if count is not None:
+            paginator.count = count
         try:
             clients = paginator.page(page)
         except PageNotAnInteger:
@@ -122,17 +151,16 @@ def _get_client_list(request):
         except EmptyPage:
             clients = paginator.page(paginator.num_pages)
         
-        serializer = ClientSerializer(clients, many=True, context={'request': request})
-        
-        return Response({
+        etag = rows_etag('clients', [(row['id'], row['version']) for row in clients], paginator.count)
+        return with_etag(Response({
             'count': paginator.count,
             'total_pages': paginator.num_pages,
             'current_page': clients.number,
             'page_size': page_size,
             'next': clients.next_page_number() if clients.has_next() else None,
             'previous': clients.previous_page_number() if clients.has_previous() else None,
-            'results': serializer.data
-        })
+            'results': encode_client_rows(clients)
+        }), etag)
         
     except ValueError:
         return Response(
@@ -162,10 +190,13 @@ def _create_client(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+def _client_etag(pk, version):
+    return make_etag('client', pk, version)
+
 def _get_client_detail(client, request):
     try:
         serializer = ClientSerializer(client, context={'request': request})
-        return Response(serializer.data)
+        return with_etag(Response(serializer.data), _client_etag(client.pk, client.version))
     except Exception as e:
         return Response(
             {"error": "Failed to retrieve client details", "details": str(e)},
@@ -184,7 +215,7 @@ def _update_client(client, request, partial=False):
         
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return with_etag(Response(serializer.data), _client_etag(client.pk, client.version))
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
@@ -227,35 +258,185 @@ def _apply_filters(queryset, request):
     return queryset.filter(**filters) if filters else queryset
 
 def _apply_search(queryset, request):
-    # Apply search functionality across multiple fields
-    search_term = request.query_params.get('search')
-    
-    if search_term:
-        queryset = queryset.filter(
-            Q(first_name__icontains=search_term) |
-            Q(other_names__icontains=search_term) |
-            Q(phone__icontains=search_term) |
-            Q(email__icontains=search_term) |
-            Q(national_id__icontains=search_term) |
-            Q(passport_number__icontains=search_term) |
-            Q(occupation__icontains=search_term) |
-            Q(credit_officer__username__icontains=search_term) |
-            Q(credit_officer__first_name__icontains=search_term) |
-            Q(credit_officer__last_name__icontains=search_term)
-        )
-    return queryset
+    # Full-text / identifier search over the indexed search document
+    return apply_search(queryset, request.query_params.get('search'))
 
-def _apply_ordering(queryset, request):
-    """
-    Apply ordering with validation
-    """
+def _get_ordering(request):
     ordering = request.query_params.get('ordering', '-created_at')
     
     if ordering.lstrip('-') in VALID_ORDERING_FIELDS:
-        return queryset.order_by(ordering)
+        return ordering
     
     # Default ordering
-    return queryset.order_by('-created_at')
+    return '-created_at'
+
+def _apply_ordering(queryset, request):
+    """
+    Apply ordering with validation
+    """
+    return queryset.order_by(_get_ordering(request))
+
+def _get_cursor_page(request, queryset, page_size, estimated_count=None):
+    """
+    Keyset pagination: no COUNT(*), no OFFSET; 'next' is an opaque cursor
+    """
+    ordering = _get_ordering(request)
+    try:
+        clients, next_cursor = paginate_by_cursor(
+            client_rows(queryset, ordering.lstrip('-')), ordering,
+            request.query_params.get('cursor'), page_size
+        )
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'estimated_count': estimated_count,
+        'page_size': page_size,
+        'next': next_cursor,
+        'results': encode_client_rows(clients)
+    })
+
+
+# Async (ASGI) versions of the read-heavy endpoints.
+#
+# A sync worker is held for the whole transfer to a slow mobile client;
+# under ASGI the event loop writes to it while serving other requests,
+# and the database work goes through the async ORM. DRF's @api_view has
+# no async support, so these are plain Django views that authenticate
+# with DRF's configured authentication classes and return the same JSON
+# as their sync counterparts. Deploy with config/asgi.py to benefit.
+
+@require_GET
+@read_from_replica
+async def client_search_async(request):
+    drf_request, denied = await _authenticate_async(request)
+    if denied:
+        return denied
+    try:
+        queryset = Client.objects.all()
+        queryset = _apply_filters(queryset, drf_request)
+        queryset = _apply_search(queryset, drf_request)
+
+        if drf_request.query_params.get('stream') == 'ndjson':
+            # Every match, one JSON row per line (e.g. an officer's offline copy)
+            return _stream_client_rows(client_rows(_apply_ordering(queryset, drf_request)))
+
+        page = drf_request.query_params.get('page', 1)
+        page_size = min(int(drf_request.query_params.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+
+        if wants_cursor_pagination(drf_request):
+            return await _get_cursor_page_async(drf_request, queryset, page_size)
+
+        queryset = client_rows(_apply_ordering(queryset, drf_request))
+        paginator = Paginator(queryset, page_size)
+        paginator.count = await queryset.acount()
+        try:
+            number = paginator.validate_number(page)
+        except PageNotAnInteger:
+            number = 1
+        except EmptyPage:
+            number = paginator.num_pages
+        bottom = (number - 1) * page_size
+        clients = Page([row async for row in queryset[bottom:bottom + page_size]], number, paginator)
+        return _json_response({
+            'count': paginator.count,
+            'total_pages': paginator.num_pages,
+            'current_page': clients.number,
+            'page_size': page_size,
+            'next': clients.next_page_number() if clients.has_next() else None,
+            'previous': clients.previous_page_number() if clients.has_previous() else None,
+            'results': encode_client_rows(clients)
+        })
+
+    except Exception as e:
+        return _json_response(
+            {"error": "An error occurred during search", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@require_GET
+@read_from_replica
+async def client_stats_async(request):
+    drf_request, denied = await _authenticate_async(request)
+    if denied:
+        return denied
+    try:
+        return _json_response(await aget_client_stats(drf_request.user))
+    except Exception as e:
+        return _json_response(
+            {"error": "Failed to retrieve statistics", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@require_GET
+async def client_detail_async(request, pk):
+    drf_request, denied = await _authenticate_async(request)
+    if denied:
+        return denied
+    if request.META.get('HTTP_IF_NONE_MATCH'):
+        version = await Client.objects.filter(pk=pk).values_list('version', flat=True).afirst()
+        if version is not None and etag_matches(request, _client_etag(pk, version)):
+            return not_modified(_client_etag(pk, version))
+    try:
+        client = await Client.objects.select_related('credit_officer').aget(pk=pk)
+    except Client.DoesNotExist:
+        return _json_response({"detail": "No Client matches the given query."}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        serializer = ClientSerializer(client, context={'request': drf_request})
+        return with_etag(_json_response(serializer.data), _client_etag(client.pk, client.version))
+    except Exception as e:
+        return _json_response(
+            {"error": "Failed to retrieve client details", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+async def _authenticate_async(request):
+    """
+    Wrap the request for DRF and authenticate it; returns (request, error response or None)
+    """
+    drf_request = Request(
+        request, authenticators=[authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    try:
+        # Authenticators read the session / user table synchronously
+        user = await sync_to_async(lambda: drf_request.user)()
+    except APIException as e:
+        return drf_request, _json_response({"detail": e.detail}, status=e.status_code)
+    if user and user.is_authenticated:
+        return drf_request, None
+
+    # Like DRF: 401 with a challenge when the first authenticator has one, else 403
+    challenge = drf_request.authenticators[0].authenticate_header(drf_request) if drf_request.authenticators else None
+    response = _json_response(
+        {"detail": NotAuthenticated.default_detail},
+        status=status.HTTP_401_UNAUTHORIZED if challenge else status.HTTP_403_FORBIDDEN
+    )
+    if challenge:
+        response['WWW-Authenticate'] = challenge
+    return drf_request, response
+
+async def _get_cursor_page_async(request, queryset, page_size):
+    ordering = _get_ordering(request)
+    try:
+        clients, next_cursor = await apaginate_by_cursor(
+            client_rows(queryset, ordering.lstrip('-')), ordering,
+            request.query_params.get('cursor'), page_size
+        )
+    except ValueError as e:
+        return _json_response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    return _json_response({
+        'estimated_count': None,
+        'page_size': page_size,
+        'next': next_cursor,
+        'results': encode_client_rows(clients)
+    })
 
+def _stream_client_rows(rows):
+    async def lines():
+        async for row in rows.aiterator(chunk_size=STREAM_CHUNK_SIZE):
+            yield dumps(encode_client_row(row)) + b'\n'
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
 
+def _json_response(data, status=status.HTTP_200_OK):
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class ProjectConfig(AppConfig):
+    # Project-wide wiring that belongs to no single app
+    name = 'config'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .metrics import record_connection
+
+        # Before the first request, so /metrics counts every connection
+        connection_created.connect(record_connection, dispatch_uid='config.metrics.record_connection')
@@ -3,6 +3,17 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it under uvicorn workers managed by gunicorn (settings in
+config/gunicorn_asgi.py):
+
+    gunicorn config.asgi:application -c config/gunicorn_asgi.py
+
+or, without gunicorn, ``uvicorn config.asgi:application --workers 4``.
+The /api/clients/async/ endpoints then serve slow clients from the event
+loop instead of holding a worker each; the sync views keep working, each
+on a thread of its own. Compare the two with the benchmark_serving
+command.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -0,0 +1,64 @@
+"""
+Version-based ETags for the client and loan endpoints the app polls.
+
+Client and Loan rows carry a version counter that every write bumps (see
+their save() and Loan.bump_versions()). A detail ETag is built from the
+version alone, so a request with a matching If-None-Match is answered
+304 after a one-column lookup, without loading the row or running the
+serializer. A list page's ETag hashes the ids and versions of its rows
+with the total count, read with a narrow query on the page's own
+filters and ordering.
+
+Responses are marked private and always revalidated; the browser cache
+sends If-None-Match on its own.
+"""
+import hashlib
+
+from django.core.paginator import Paginator
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+
+
+def make_etag(*parts):
+    """Weak ETag from parts such as a kind, an id and a version"""
+    return 'W/"{}"'.format('-'.join(str(part) for part in parts))
+
+
+def rows_etag(kind, rows, *parts):
+    """Weak ETag for a list page from its (id, version, ...) rows"""
+    digest = hashlib.sha1(repr(list(rows)).encode()).hexdigest()[:20]
+    return make_etag(kind, *parts, digest)
+
+
+def page_versions(queryset, fields, page_size, page):
+    """One page of ``fields`` (ids and versions) from ``queryset``, and the total count.
+
+    Out-of-range and invalid page numbers fall back like the list views do.
+    """
+    versions = Paginator(queryset.values_list(*fields), page_size).get_page(page)
+    return list(versions), versions.paginator.count
+
+
+def etag_matches(request, etag):
+    """Whether the request's If-None-Match already names ``etag``"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    # Weak comparison, as If-None-Match requires
+    return '*' in etags or _opaque(etag) in {_opaque(candidate) for candidate in etags}
+
+
+def _opaque(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def not_modified(etag):
+    return with_etag(HttpResponseNotModified(), etag)
+
+
+def with_etag(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,28 @@
+"""
+gunicorn settings for serving config.asgi with uvicorn workers.
+
+    gunicorn config.asgi:application -c config/gunicorn_asgi.py
+
+Needs the gunicorn and uvicorn packages. Every value can be overridden
+from the environment, e.g. WEB_CONCURRENCY=8.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+worker_class = 'uvicorn.workers.UvicornWorker'
+# One event loop per worker serves many connections; CPU bound, not I/O bound
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() + 1))
+# Mobile clients reuse their connection between requests on the same screen
+keepalive = int(os.environ.get('KEEPALIVE', 20))
+# A slow client only holds a socket, not the worker, so this is generous
+timeout = int(os.environ.get('TIMEOUT', 120))
+graceful_timeout = 30
+# Restart workers now and then to cap slow memory growth
+max_requests = 5000
+max_requests_jitter = 500
+accesslog = '-'
+# Async requests run their ORM calls on short-lived threads, so persistent
+# connections would pile up rather than be reused; connect per request
+# (front MySQL with a pooler such as ProxySQL to avoid the handshake)
+raw_env = [f"DB_CONN_MAX_AGE={os.environ.get('DB_CONN_MAX_AGE', 0)}"]
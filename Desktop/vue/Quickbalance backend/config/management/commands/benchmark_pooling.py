@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from config.pooling import DEFAULT_DURATION, DEFAULT_MAX_AGES, DEFAULT_WORKERS, run_pooling_benchmark
+
+
+class Command(BaseCommand):
+    help = "Compare client list requests/sec with per-request and persistent database connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', default=','.join(map(str, DEFAULT_MAX_AGES)),
+                            help="Comma-separated CONN_MAX_AGE values to compare (0 = connect per request)")
+        parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help="Seconds per run")
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="WSGI worker threads")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the generated data")
+
+    def handle(self, *args, **options):
+        try:
+            max_ages = [int(max_age) for max_age in options['max_age'].split(',') if max_age]
+        except ValueError:
+            raise CommandError("--max-age must be comma-separated integers")
+        if not max_ages or min(max_ages) < 0:
+            raise CommandError("--max-age values must be zero or positive")
+        if options['workers'] <= 0 or options['duration'] <= 0:
+            raise CommandError("--duration and --workers must be positive")
+
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        test_settings['MIGRATE'] = False
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            # Request threads need a database file they can all open (see stress_repayments)
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'benchmark_pooling.sqlite3')
+
+        # Never touch the real database (see run_benchmarks)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            run_pooling_benchmark(
+                max_ages, options['duration'], options['workers'], options['seed'], progress=self._report,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _report(self, result):
+        self.stdout.write(
+            f"CONN_MAX_AGE {result['max_age']:>5}  {result['concurrency']} workers  {result['requests']:>6} requests  "
+            f"{result['per_second']:>8.1f}/s  median {result['median_ms']:>6.1f} ms  "
+            f"p95 {result['p95_ms']:>6.1f} ms  {result['connections']:>5} connections  {result['errors']} errors"
+        )
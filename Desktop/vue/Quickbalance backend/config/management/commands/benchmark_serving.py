@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from config.serving import (
+    DEFAULT_BANDWIDTH, DEFAULT_CONCURRENCY, DEFAULT_DURATION, DEFAULT_WORKERS, SERVERS, run_serving
+)
+
+
+class Command(BaseCommand):
+    help = "Compare how many concurrent slow clients the WSGI and ASGI deployments serve"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default=','.join(map(str, DEFAULT_CONCURRENCY)),
+                            help="Comma-separated numbers of simultaneous clients")
+        parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help="Seconds per run")
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="WSGI worker threads")
+        parser.add_argument('--bandwidth', type=int, default=DEFAULT_BANDWIDTH,
+                            help="Client link speed in bytes per second")
+        parser.add_argument('--server', choices=SERVERS, action='append',
+                            help="Run only this server (repeatable; default: both)")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the generated data")
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',') if level]
+        except ValueError:
+            raise CommandError("--concurrency must be comma-separated integers")
+        if not levels or min(levels) <= 0 or options['workers'] <= 0 or options['bandwidth'] <= 0 \
+                or options['duration'] <= 0:
+            raise CommandError("--concurrency, --duration, --workers and --bandwidth must be positive")
+
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        test_settings['MIGRATE'] = False
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            # Request threads need a database file they can all open (see stress_repayments)
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'benchmark_serving.sqlite3')
+
+        # Never touch the real database (see run_benchmarks)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            run_serving(
+                levels, options['duration'], options['workers'], options['bandwidth'],
+                options['server'] or SERVERS, options['seed'], progress=self._report,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _report(self, result):
+        self.stdout.write(
+            f"{result['server']:<5} {result['concurrency']:>5} clients  {result['requests']:>6} requests  "
+            f"{result['per_second']:>8.1f}/s  median {result['median_ms']:>8.1f} ms  "
+            f"p95 {result['p95_ms']:>8.1f} ms  {result['errors']} errors"
+        )
@@ -0,0 +1,264 @@
+"""
+Per-request SQL and latency metrics.
+
+QueryMetricsMiddleware times every request and, through a database
+execute wrapper, counts its queries and their total time. A statement
+repeated QUERY_METRICS_DUPLICATE_THRESHOLD or more times in one request
+(the usual N+1 shape) is logged with its SQL and counted. Each response
+gets a Server-Timing header. Totals and latency histograms per URL name
+are served in Prometheus text format from /metrics, together with the
+number of database connections opened and currently held open per alias
+(persistent connections, see CONN_MAX_AGE in settings).
+
+The per-request cost is one function call and a dict update per query,
+and one locked update of the totals per request; run_benchmarks times
+it against the same requests without the middleware
+(metrics_middleware_overhead). The middleware runs
+natively under both WSGI and ASGI, so it never forces async views back
+onto a thread. Totals are kept per
+process; scrape each worker, or put the workers behind one exporter.
+"""
+import bisect
+import logging
+import threading
+import time
+import weakref
+from collections import Counter, defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_DUPLICATE_THRESHOLD = 5
+DEFAULT_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+
+class _RouteStats:
+    __slots__ = ('requests', 'latency_sum', 'buckets', 'queries', 'db_time', 'duplicates', 'n_plus_one')
+
+    def __init__(self):
+        self.requests = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.queries = 0
+        self.db_time = 0.0
+        self.duplicates = 0
+        self.n_plus_one = 0
+
+
+class MetricsRegistry:
+    """Process-wide totals keyed by (view name, method)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(_RouteStats)
+
+    def record(self, view, method, latency, queries, db_time, duplicates, n_plus_one):
+        with self._lock:
+            stats = self._routes[(view, method)]
+            stats.requests += 1
+            stats.latency_sum += latency
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+            stats.queries += queries
+            stats.db_time += db_time
+            stats.duplicates += duplicates
+            stats.n_plus_one += n_plus_one
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            routes = [(key, _copy(stats)) for key, stats in routes]
+
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by URL name.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (view, method), stats in routes:
+            labels = f'view="{_escape(view)}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.requests}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {stats.latency_sum:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {stats.requests}')
+
+        counters = [
+            ('db_queries_total', 'SQL statements executed.', 'queries', '{}'),
+            ('db_query_duration_seconds_total', 'Time spent in SQL statements.', 'db_time', '{:.6f}'),
+            ('db_duplicate_queries_total', 'Statements repeated within the same request.', 'duplicates', '{}'),
+            ('db_n_plus_one_requests_total', 'Requests that repeated a statement past the threshold.',
+             'n_plus_one', '{}'),
+        ]
+        for name, help_text, attribute, value_format in counters:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (view, method), stats in routes:
+                value = value_format.format(getattr(stats, attribute))
+                lines.append(f'{name}{{view="{_escape(view)}",method="{method}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _copy(stats):
+    copy = _RouteStats()
+    for name in _RouteStats.__slots__:
+        value = getattr(stats, name)
+        setattr(copy, name, list(value) if isinstance(value, list) else value)
+    return copy
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+
+
+class ConnectionStats:
+    """Database connections this process has opened, and those it holds open, per alias"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._opened = Counter()
+        # Every thread has its own wrapper per alias; they go away with the thread
+        self._wrappers = weakref.WeakSet()
+
+    def record_opened(self, connection):
+        with self._lock:
+            self._opened[connection.alias] += 1
+            self._wrappers.add(connection)
+
+    def opened(self, alias=None):
+        with self._lock:
+            return sum(self._opened.values()) if alias is None else self._opened[alias]
+
+    def open_connections(self):
+        with self._lock:
+            wrappers = list(self._wrappers)
+        return Counter(wrapper.alias for wrapper in wrappers if wrapper.connection is not None)
+
+    def render(self):
+        with self._lock:
+            opened = sorted(self._opened.items())
+        held = self.open_connections()
+        lines = [
+            '# HELP db_connections_opened_total Database connections opened; compare with requests for the reuse rate.',
+            '# TYPE db_connections_opened_total counter',
+        ]
+        lines += [f'db_connections_opened_total{{alias="{_escape(alias)}"}} {count}' for alias, count in opened]
+        lines += [
+            '# HELP db_connections_open Database connections currently open (at most one per thread).',
+            '# TYPE db_connections_open gauge',
+        ]
+        lines += [f'db_connections_open{{alias="{_escape(alias)}"}} {held[alias]}' for alias, _ in opened]
+        return '\n'.join(lines) + '\n'
+
+
+connection_stats = ConnectionStats()
+
+
+def record_connection(sender, connection, **kwargs):
+    """connection_created receiver, connected at startup by ProjectConfig.ready"""
+    connection_stats.record_opened(connection)
+
+
+class _QueryRecorder:
+    """Execute wrapper counting the statements of one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.count += 1
+            # sql is the parameterized template, so repeats share a key
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+
+
+class QueryMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'QUERY_METRICS_DUPLICATE_THRESHOLD', DEFAULT_DUPLICATE_THRESHOLD)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        recorder = _QueryRecorder()
+        started = time.perf_counter()
+        wrapped = self._start_recording(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop_recording(wrapped, recorder)
+        return self._finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = _QueryRecorder()
+        started = time.perf_counter()
+        wrapped = self._start_recording(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop_recording(wrapped, recorder)
+        return self._finish(request, response, recorder, started)
+
+    # connection.execute_wrapper() without its context manager, which
+    # costs more than the rest of the bookkeeping on a fast request
+    def _start_recording(self, recorder):
+        wrapped = connections.all()
+        for connection in wrapped:
+            connection.execute_wrappers.append(recorder)
+        return wrapped
+
+    def _stop_recording(self, wrapped, recorder):
+        for connection in wrapped:
+            connection.execute_wrappers.remove(recorder)
+
+    def _finish(self, request, response, recorder, started):
+        latency = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else 'unmatched'
+        repeated = {sql: count for sql, count in recorder.statements.items() if count > 1}
+        duplicates = sum(count - 1 for count in repeated.values())
+        suspects = {sql: count for sql, count in repeated.items() if count >= self.threshold}
+        for sql, count in suspects.items():
+            logger.warning("Possible N+1 in %s: %d x %s", view, count, sql)
+
+        registry.record(
+            view, request.method, latency, recorder.count, recorder.time, duplicates, 1 if suspects else 0
+        )
+        response['Server-Timing'] = (
+            f'db;dur={recorder.time * 1000:.1f};desc="{recorder.count} queries, {duplicates} repeated", '
+            f'total;dur={latency * 1000:.1f}'
+        )
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, only answered for METRICS_ALLOWED_IPS"""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', DEFAULT_ALLOWED_IPS)
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render() + connection_stats.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,98 @@
+"""
+Requests per second on the client list with and without persistent
+database connections.
+
+Each run drives config.wsgi with a pool of ``workers`` threads, as sync
+gunicorn workers would, through the full request cycle: Django closes or
+keeps each thread's connection at the end of every request according to
+CONN_MAX_AGE, exactly as in production. Runs differ only in CONN_MAX_AGE
+(0 reconnects on every request) and report the connections they opened.
+
+The connection cost is the configured backend's: a MySQL handshake over
+TCP costs far more than opening a local SQLite file, so run this against
+MySQL to size the win.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.wsgi import get_wsgi_application
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .metrics import connection_stats
+from .serving import RequestResults, serving_cases, wsgi_environ
+
+DEFAULT_MAX_AGES = [0, 60]
+DEFAULT_DURATION = 10  # seconds per run
+DEFAULT_WORKERS = 4
+PATH = '/api/clients/'
+
+
+def run_pooling(path, cookie, max_age, duration, workers=DEFAULT_WORKERS):
+    """Serve ``path`` from ``workers`` threads for ``duration`` seconds with this CONN_MAX_AGE"""
+    application = get_wsgi_application()
+    # Threads created from here on connect with this setting
+    for alias in connections:
+        connections.settings[alias]['CONN_MAX_AGE'] = max_age
+    results = RequestResults()
+    opened_before = connection_stats.opened(DEFAULT_DB_ALIAS)
+
+    def serve():
+        statuses = []
+        started = time.perf_counter()
+        body = application(wsgi_environ(path, cookie), lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            for _ in body:
+                pass
+        finally:
+            # Fires request_finished, which closes or keeps the connection
+            if hasattr(body, 'close'):
+                body.close()
+        results.record(started, int(statuses[0].split()[0]))
+
+    def worker(deadline):
+        while time.perf_counter() < deadline:
+            serve()
+
+    started = time.perf_counter()
+    deadline = started + duration
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(worker, deadline) for _ in range(workers)]:
+            future.result()
+        elapsed = time.perf_counter() - started
+        # Close what the workers kept open, so the next run starts clean:
+        # each task waits for the others, so every thread runs exactly one
+        barrier = threading.Barrier(workers)
+        for future in [pool.submit(_close_connections, barrier) for _ in range(workers)]:
+            future.result()
+
+    summary = results.summary('wsgi', workers, elapsed)
+    summary['max_age'] = max_age
+    summary['connections'] = connection_stats.opened(DEFAULT_DB_ALIAS) - opened_before
+    return summary
+
+
+def _close_connections(barrier):
+    barrier.wait()
+    connections.close_all()
+
+
+def run_pooling_benchmark(max_ages=DEFAULT_MAX_AGES, duration=DEFAULT_DURATION, workers=DEFAULT_WORKERS,
+                          seed=0, progress=None):
+    """Run each CONN_MAX_AGE in turn; returns the results in order.
+
+    ``progress`` is called with each result as it completes.
+    """
+    cookie, _ = serving_cases(seed)
+    original = {alias: connections.settings[alias].get('CONN_MAX_AGE', 0) for alias in connections}
+    results = []
+    try:
+        for max_age in max_ages:
+            result = run_pooling(PATH, cookie, max_age, duration, workers)
+            results.append(result)
+            if progress:
+                progress(result)
+    finally:
+        for alias, max_age in original.items():
+            connections.settings[alias]['CONN_MAX_AGE'] = max_age
+    return results
@@ -0,0 +1,50 @@
+"""
+orjson-backed JSON renderer.
+
+Produces the same JSON as DRF's JSONRenderer does for serializer output
+(Decimals as strings, UTC datetimes ending in 'Z'), several times faster,
+so views can hand it plain values() rows. Falls back to the stock
+renderer when orjson is not installed.
+"""
+import json
+from decimal import Decimal
+
+from django.utils.functional import Promise
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+_fallback_encoder = JSONEncoder()
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        # Same as COERCE_DECIMAL_TO_STRING: money stays exact on the wire
+        return str(obj)
+    if isinstance(obj, Promise):
+        return str(obj)
+    return _fallback_encoder.default(obj)
+
+
+def dumps(data, indent=False):
+    if orjson is None:
+        return json.dumps(data, default=_default, indent=2 if indent else None).encode()
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+    if indent:
+        options |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, default=_default, option=options)
+
+
+class ORJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        return dumps(data, indent=bool(self.get_indent(accepted_media_type, renderer_context)))
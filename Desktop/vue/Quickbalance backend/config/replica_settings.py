@@ -0,0 +1,31 @@
+"""
+Local settings with a stand-in read replica, for trying the replica
+routing (config/routers.py) without MySQL replication:
+
+    DJANGO_SETTINGS_MODULE=config.replica_settings python manage.py runserver
+
+'default' is the local SQLite database. 'replica' opens the same file
+read-only, so replica reads see every write and a write routed there by
+mistake fails. To see read-your-writes pinning at work, point it at a
+stale copy instead (REPLICA_SQLITE_NAME=replica.sqlite3 after copying
+db.sqlite3): reads show the copy except for users who just wrote.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+_replica_file = BASE_DIR / os.environ.get('REPLICA_SQLITE_NAME', 'db.sqlite3')
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{_replica_file}?mode=ro',
+        # Tests read the test primary through this alias
+        'TEST': {'MIRROR': 'default'},
+    },
+}
@@ -0,0 +1,224 @@
+"""
+Read-replica routing for search, stats and reporting traffic.
+
+Writes, and every read by default, go to the 'default' database. Reads
+inside a replica block go to settings.REPLICA_DATABASE_ALIAS instead,
+when that alias is configured. A block is opened by:
+
+- @read_from_replica on a view (GET/HEAD only, including a streamed body);
+- replica_reads() around reporting code, such as export_portfolio.
+
+Read-your-writes: ReplicaPinningMiddleware pins a user to the primary for
+REPLICA_PIN_SECONDS after any successful write request, so the screen a
+teller lands on after posting shows the posting even if the replica lags.
+A block that has itself written reads from the primary from then on, as
+do reads inside a transaction. Pins live in the cache; use a shared cache
+when running more than one process.
+
+Cached dashboard counters that are recounted from the replica can be off
+by the replication lag until they expire (see clients/stats.py).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import LazyObject, empty
+
+DEFAULT_REPLICA_ALIAS = 'replica'
+DEFAULT_PIN_SECONDS = 10
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica_block = ContextVar('replica_block', default=None)
+
+
+def replica_alias():
+    """The configured replica alias, or None when there is no replica"""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', DEFAULT_REPLICA_ALIAS)
+    return alias if alias in settings.DATABASES else None
+
+
+def pin_key(user_id):
+    return f'replica:pinned:{user_id}'
+
+
+def pin_user(user):
+    """Send this user's reads to the primary for REPLICA_PIN_SECONDS"""
+    cache.set(pin_key(user.pk), True, getattr(settings, 'REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS))
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and cache.get(pin_key(user.pk)))
+
+
+class _ReplicaBlock:
+    """Routing state of one replica block, shared with the threads it runs ORM calls on"""
+    __slots__ = ('request', 'wrote', 'pinned')
+
+    def __init__(self, request=None):
+        self.request = request
+        self.wrote = False
+        # Decided on the first read after the user has been authenticated
+        self.pinned = None if request is not None else False
+
+    def use_replica(self):
+        if self.wrote:
+            return False
+        if self.pinned is None:
+            user = getattr(self.request, 'user', None)
+            if user is None or _unresolved(user) or not user.is_authenticated:
+                # Not authenticated (yet), e.g. this is the session lookup:
+                # primary, and decide again on the next read
+                return False
+            # Reads made while checking the pin stay on the primary
+            self.pinned = True
+            self.pinned = is_pinned(user)
+        return not self.pinned
+
+
+def _unresolved(user):
+    # AuthenticationMiddleware's lazy user, not looked up yet
+    return isinstance(user, LazyObject) and user._wrapped is empty
+
+
+class ReplicaRouter:
+    """Routes reads in a replica block to the replica; everything else to default"""
+
+    def db_for_read(self, model, **hints):
+        block = _replica_block.get()
+        alias = replica_alias()
+        if block is None or alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias if block.use_replica() else None
+
+    def db_for_write(self, model, **hints):
+        block = _replica_block.get()
+        if block is not None:
+            block.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both aliases
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        return db != replica_alias()
+
+
+@contextmanager
+def replica_reads(request=None):
+    """Send the reads in this block to the replica.
+
+    With a request, reads stay on the primary if its user is pinned.
+    """
+    token = _replica_block.set(_ReplicaBlock(request))
+    try:
+        yield
+    finally:
+        _replica_block.reset(token)
+
+
+def read_from_replica(view):
+    """Route a view's GET/HEAD reads to the replica; works on sync and async views.
+
+    Apply it directly above the view function, under DRF's decorators.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return await view(request, *args, **kwargs)
+            block = _ReplicaBlock(request)
+            token = _replica_block.set(block)
+            try:
+                response = await view(request, *args, **kwargs)
+            finally:
+                _replica_block.reset(token)
+            return _stream_in_block(response, block)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return view(request, *args, **kwargs)
+            block = _ReplicaBlock(request)
+            token = _replica_block.set(block)
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                _replica_block.reset(token)
+            return _stream_in_block(response, block)
+    return wrapper
+
+
+def _stream_in_block(response, block):
+    # A streamed body is read after the view returns; keep routing it
+    if not getattr(response, 'streaming', False):
+        return response
+    if response.is_async:
+        response.streaming_content = _aiterate_in_block(response.streaming_content, block)
+    else:
+        response.streaming_content = _iterate_in_block(response.streaming_content, block)
+    return response
+
+
+def _iterate_in_block(content, block):
+    iterator = iter(content)
+    while True:
+        token = _replica_block.set(block)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _replica_block.reset(token)
+        yield chunk
+
+
+async def _aiterate_in_block(content, block):
+    iterator = aiter(content)
+    while True:
+        token = _replica_block.set(block)
+        try:
+            chunk = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        finally:
+            _replica_block.reset(token)
+        yield chunk
+
+
+class ReplicaPinningMiddleware:
+    """Pins users to the primary for a while after a successful write request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self._pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            # request.user may still be the lazy session lookup
+            await sync_to_async(self._pin)(request, response)
+        return response
+
+    def _pin(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400 or replica_alias() is None:
+            return
+        # DRF sets the authenticated (session or token) user back on the request
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_user(user)
@@ -0,0 +1,194 @@
+"""
+Concurrent-connection capacity of the WSGI and ASGI deployments.
+
+Simulated field officers on a slow mobile link call the client search,
+stats and detail endpoints in a closed loop: each sends its next request
+as soon as the previous response has fully arrived. Responses reach the
+client at ``bandwidth`` bytes per second, and whoever writes them is
+held for that long:
+
+- wsgi: config.wsgi with the sync views behind a pool of ``workers``
+  threads, as with sync gunicorn workers. A worker is busy for the view
+  and the whole transfer, so slow links use up the pool.
+- asgi: config.asgi with the async views on one event loop. The transfer
+  is awaited and the loop keeps serving other connections meanwhile.
+
+Both run in this process against a throwaway test database, so the
+results compare the two serving models rather than measure a server.
+"""
+import asyncio
+import io
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.test import Client as TestClient
+
+from clients.models import Client
+from loans.benchmarks import seed_clients
+
+DEFAULT_CONCURRENCY = [10, 50, 200]
+DEFAULT_DURATION = 10  # seconds per run
+DEFAULT_WORKERS = 4
+DEFAULT_BANDWIDTH = 32 * 1024  # bytes per second, a weak 3G link
+DEFAULT_CLIENTS = 10_000
+SERVERS = ['wsgi', 'asgi']
+HOST = 'localhost'
+
+
+def serving_cases(seed=0):
+    """Seed the data set; returns (session cookie, {server: paths})"""
+    seed_clients(DEFAULT_CLIENTS, seed)
+    officer = Client.objects.exclude(credit_officer=None).values_list('credit_officer', flat=True).first()
+    client_id = Client.objects.filter(credit_officer=officer).values_list('pk', flat=True).first()
+    browser = TestClient()
+    browser.force_login(get_user_model().objects.get(pk=officer))
+    cookie = f'{settings.SESSION_COOKIE_NAME}={browser.cookies[settings.SESSION_COOKIE_NAME].value}'
+    return cookie, {
+        'wsgi': ['/api/clients/search/?search=okello', '/api/clients/stats/', f'/api/clients/{client_id}/'],
+        'asgi': ['/api/clients/async/search/?search=okello', '/api/clients/async/stats/',
+                 f'/api/clients/async/{client_id}/'],
+    }
+
+
+class RequestResults:
+    """Latencies and failures collected from every simulated client"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+
+    def record(self, started, status):
+        with self._lock:
+            self.latencies.append(time.perf_counter() - started)
+            if status != 200:
+                self.errors += 1
+
+    def summary(self, server, concurrency, elapsed):
+        latencies = sorted(self.latencies)
+        return {
+            'server': server,
+            'concurrency': concurrency,
+            'requests': len(latencies),
+            'per_second': round(len(latencies) / elapsed, 1),
+            'median_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+            'errors': self.errors,
+        }
+
+
+def run_wsgi(paths, cookie, concurrency, duration, workers=DEFAULT_WORKERS, bandwidth=DEFAULT_BANDWIDTH):
+    application = get_wsgi_application()
+    results = RequestResults()
+
+    def serve(path):
+        # One sync worker: run the view, then write the response at link speed
+        statuses = []
+        body = application(wsgi_environ(path, cookie), lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            for chunk in body:
+                time.sleep(len(chunk) / bandwidth)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return int(statuses[0].split()[0])
+
+    def officer(number, pool, deadline):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            results.record(started, pool.submit(serve, paths[number % len(paths)]).result())
+            number += 1
+
+    started = time.perf_counter()
+    deadline = started + duration
+    with ThreadPoolExecutor(max_workers=workers) as pool, ThreadPoolExecutor(max_workers=concurrency) as officers:
+        for future in [officers.submit(officer, number, pool, deadline) for number in range(concurrency)]:
+            future.result()
+    return results.summary('wsgi', concurrency, time.perf_counter() - started)
+
+
+def run_asgi(paths, cookie, concurrency, duration, bandwidth=DEFAULT_BANDWIDTH):
+    return asyncio.run(_run_asgi(paths, cookie, concurrency, duration, bandwidth))
+
+
+async def _run_asgi(paths, cookie, concurrency, duration, bandwidth):
+    application = get_asgi_application()
+    results = RequestResults()
+
+    async def request(path):
+        url = urlsplit(path)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': url.path, 'raw_path': url.path.encode(),
+            'query_string': url.query.encode(), 'root_path': '',
+            'headers': [(b'host', HOST.encode()), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 0), 'server': (HOST, 80),
+        }
+        sent = False
+        statuses = []
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # The client stays connected until the response is done
+            await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+            elif message.get('body'):
+                await asyncio.sleep(len(message['body']) / bandwidth)
+
+        await application(scope, receive, send)
+        return statuses[0]
+
+    async def officer(number, deadline):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            results.record(started, await request(paths[number % len(paths)]))
+            number += 1
+
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(officer(number, deadline) for number in range(concurrency)))
+    return results.summary('asgi', concurrency, time.perf_counter() - started)
+
+
+def wsgi_environ(path, cookie):
+    url = urlsplit(path)
+    return {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': url.path, 'QUERY_STRING': url.query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST, 'HTTP_COOKIE': cookie, 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': None,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+
+
+def run_serving(concurrency_levels=DEFAULT_CONCURRENCY, duration=DEFAULT_DURATION, workers=DEFAULT_WORKERS,
+                bandwidth=DEFAULT_BANDWIDTH, servers=SERVERS, seed=0, progress=None):
+    """Run each server at each concurrency level; returns the results in order.
+
+    ``progress`` is called with each result as it completes.
+    """
+    cookie, paths = serving_cases(seed)
+    results = []
+    for concurrency in sorted(concurrency_levels):
+        for server in servers:
+            if server == 'wsgi':
+                result = run_wsgi(paths['wsgi'], cookie, concurrency, duration, workers, bandwidth)
+            else:
+                result = run_asgi(paths['asgi'], cookie, concurrency, duration, bandwidth)
+            results.append(result)
+            if progress:
+                progress(result)
+    return results
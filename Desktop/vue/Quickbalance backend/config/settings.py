@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,9 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'django_filters',
 
+    # Project-wide signal wiring (config/apps.py)
+    'config',
+
     # Your apps
     'clients',
     'loans',
@@ -50,11 +54,15 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    # First, so its timings cover the whole middleware stack (see config/metrics.py)
+    'config.metrics.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Keeps users on the primary for a while after they write (config/routers.py)
+    'config.routers.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -93,10 +101,53 @@ DATABASES = {
         'PORT': '3306',              
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'"
-        }
+        },
+        # Persistent connections: each worker thread keeps its connection
+        # for up to DB_CONN_MAX_AGE seconds instead of reconnecting on every
+        # request (0 = close after each request). Keep it well under MySQL's
+        # wait_timeout. Health checks ping a reused connection before the
+        # first query of a request and reconnect if it has gone away.
+        # Open/opened counts are on /metrics (config/metrics.py).
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replica (config/routers.py). Search, stats and report reads go to
+# the replica alias when it is configured, everything else to 'default'.
+# Set DB_REPLICA_HOST to add it; config/replica_settings.py is a local
+# stand-in. Users who wrote stay on the primary for REPLICA_PIN_SECONDS.
+
+DATABASE_ROUTERS = ['config.routers.ReplicaRouter']
+REPLICA_DATABASE_ALIAS = 'replica'
+REPLICA_PIN_SECONDS = 10
+
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES[REPLICA_DATABASE_ALIAS] = dict(
+        DATABASES['default'],
+        HOST=os.environ['DB_REPLICA_HOST'],
+        # Tests read the test primary through this alias
+        TEST={'MIRROR': 'default'},
+    )
+
+# Cache
+# Dashboard counters (clients/stats.py) live here. Point this at a shared
+# cache such as Redis or Memcached when running more than one worker
+# process, otherwise each process keeps its own counters.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Request metrics (config/metrics.py)
+# A statement run this many times in one request is logged as a likely N+1.
+# /metrics only answers these addresses; point the Prometheus scraper here.
+
+QUERY_METRICS_DUPLICATE_THRESHOLD = 5
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -128,6 +179,23 @@ REST_FRAMEWORK = {
 }
 
 
+# Order in which repayments settle outstanding loan buckets, per loan type.
+# Loan types without an entry use 'default'.
+LOAN_ALLOCATION_ORDER = {
+    'default': ['fines', 'fees', 'interest', 'principal'],
+}
+
+# How repayment schedules charge interest: 'flat' (interest_rate is a flat
+# percentage of principal for the loan) or 'declining' (annual rate on the
+# outstanding balance, PMT installments)
+LOAN_INTEREST_METHOD = 'flat'
+
+# Postings that lose a lock conflict (deadlock, lock wait timeout) are
+# retried this many times, backing off from this many seconds
+# (loans/concurrency.py)
+LOAN_POSTING_RETRIES = 5
+LOAN_POSTING_RETRY_BACKOFF = 0.02
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -16,8 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from config.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/clients/', include('clients.urls')), 
+    path('api/loans/', include('loans.urls')),
+    path('api/savings/', include('savings.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
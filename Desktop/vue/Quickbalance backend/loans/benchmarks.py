@@ -0,0 +1,355 @@
+"""
+Benchmarks for the hot paths.
+
+run_benchmarks builds a throwaway test database on the configured backend
+(SQLite locally, MySQL when that is what settings point at), grows it to
+each requested number of clients and times the paths below. Every case
+that writes runs inside a transaction that is rolled back, so each run
+sees the same data and results stay comparable between runs.
+compare_benchmarks diffs two result files and flags regressions.
+CASE_COMPARISONS pair cases within one run to check a claimed speedup or
+overhead against its goal.
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client as TestClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from clients import views as client_views
+from clients.listing import client_rows, encode_client_rows
+from clients.models import Client
+from clients.pagination import encode_cursor
+from clients.search import apply_search, build_search_document
+from clients.serializers import ClientSerializer
+from config.renderers import ORJSONRenderer
+from .models import Loan, LoanRenewal, LoanRepayment, LoanRepaymentSchedule
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_REPEAT = 20
+SEED_BATCH_SIZE = 5000
+# One loan (with a 12-installment schedule and some repayments) per this many clients
+CLIENTS_PER_LOAN = 10
+CLIENTS_PER_OFFICER = 500
+METRICS_MIDDLEWARE = 'config.metrics.QueryMetricsMiddleware'
+
+# (name, baseline case, candidate case, goal): the goal is the highest
+# candidate / baseline median ratio that meets the claim
+CASE_COMPARISONS = [
+    # QueryMetricsMiddleware is meant to stay on in production
+    ('metrics_middleware_overhead', 'client_search_http_no_metrics', 'client_search_http', 1.01),
+    # values() rows and orjson against the ClientSerializer path they replaced
+    ('client_list_page_rows_speedup', 'client_list_page_serializer', 'client_list_page_rows', 0.2),
+    ('client_search_page_rows_speedup', 'client_search_page_serializer', 'client_search_page_rows', 0.2),
+]
+
+_FIRST_NAMES = ['John', 'Mary', 'Peter', 'Grace', 'Joseph', 'Sarah', 'David', 'Ruth', 'Moses', 'Esther']
+_OTHER_NAMES = ['Okello', 'Nakato', 'Mugisha', 'Achieng', 'Kato', 'Namubiru', 'Otieno', 'Atim', 'Ssemwogerere']
+
+
+class _Rollback(Exception):
+    pass
+
+
+def seed_clients(target, seed=0, progress=None):
+    """Grow the benchmark data set to ``target`` clients with bulk_create.
+
+    bulk_create skips Client.save(), so search documents are built here.
+    Each batch draws from its own seeded generator, so the data is the same
+    whether the set was grown in one step or several.
+    """
+    rng = random.Random(f'{seed}:officers')
+    User = get_user_model()
+    existing = Client.objects.count()
+    officers_needed = max(1, -(-target // CLIENTS_PER_OFFICER))
+    officer_count = User.objects.filter(username__startswith='bench_officer_').count()
+    User.objects.bulk_create([
+        User(username=f'bench_officer_{number}', first_name=rng.choice(_FIRST_NAMES), last_name=rng.choice(_OTHER_NAMES))
+        for number in range(officer_count, officers_needed)
+    ])
+    officers = list(User.objects.filter(username__startswith='bench_officer_').order_by('pk'))
+    now = timezone.now()
+
+    for start in range(existing, target, SEED_BATCH_SIZE):
+        numbers = range(start, min(start + SEED_BATCH_SIZE, target))
+        rng = random.Random(f'{seed}:{start}')
+        clients = []
+        for number in numbers:
+            officer = officers[number // CLIENTS_PER_OFFICER % len(officers)]
+            client = Client(
+                first_name=rng.choice(_FIRST_NAMES), other_names=rng.choice(_OTHER_NAMES),
+                phone=f'07{number:08d}', other_phoneNos=f'B{number}',
+                national_id=f'CM{number:010d}', passport_number=f'BP{number:08d}',
+                email=f'client{number}@example.com', occupation='Trader',
+                credit_officer=officer, created_at=now - timedelta(minutes=number),
+            )
+            client.search_document = build_search_document(client, officer)
+            clients.append(client)
+        Client.objects.bulk_create(clients)
+        _seed_loans([client for number, client in zip(numbers, clients) if number % CLIENTS_PER_LOAN == 0], rng)
+        if progress:
+            progress(numbers[-1] + 1)
+
+
+def _seed_loans(clients, rng):
+    today = timezone.now().date()
+    loans = []
+    for client in clients:
+        principal = Decimal(rng.randrange(500, 20000, 50))
+        rate = Decimal(rng.choice([10, 12, 15, 18]))
+        total = principal + principal * rate / 100
+        loans.append(Loan(
+            client_id=client.pk, loan_type=rng.choice(Loan.LOAN_TYPE_CHOICES)[0],
+            principal_amount=principal, interest_rate=rate, loan_terms=12,
+            repayment_frequency='monthly', status='active',
+            total_loan_amount=total, current_balance=total,
+            start_date=today - timedelta(days=rng.randrange(30, 300)),
+        ))
+    # bulk_create only sets pks on backends that return them (not MySQL)
+    if clients and clients[0].pk is None:
+        ids = dict(Client.objects.filter(phone__in=[c.phone for c in clients]).values_list('phone', 'pk'))
+        for loan, client in zip(loans, clients):
+            loan.client_id = ids[client.phone]
+    Loan.objects.bulk_create(loans)
+    if loans and loans[0].pk is None:
+        loans = list(Loan.objects.filter(client_id__in=[loan.client_id for loan in loans]))
+
+    schedules, repayments = [], []
+    for loan in loans:
+        rows = loan.build_repayment_schedule(start_date=loan.start_date)
+        paid = 0
+        for row in rows:
+            if row.due_date < today and rng.random() < 0.8:
+                row.is_paid = True
+                paid += 1
+        schedules += rows
+        # Contracted interest is charged up front, as in generator.py
+        loan.total_interest_charged = sum(row.interest_amount for row in rows)
+        loan.total_loan_amount = loan.principal_amount + loan.total_interest_charged
+        counters = {
+            field: Decimal(str(getattr(loan, field))) if field != 'loan_type' else loan.loan_type
+            for field in Loan.allocation_counter_fields()
+        }
+        for number in range(paid):
+            allocation = Loan.split_payment(counters, rows[number].total_amount_due)
+            for bucket, allocated in allocation.items():
+                counters[Loan.ALLOCATION_BUCKETS[bucket][1]] += allocated
+            repayments.append(LoanRepayment(
+                loan_id=loan.pk, payment_date=rows[number].due_date, amount_paid=rows[number].total_amount_due,
+                payment_mode='mobile_money', receipt_number=f'BENCH-{loan.pk}-{number}',
+                **{f'{bucket}_paid': allocated for bucket, allocated in allocation.items()},
+            ))
+        # The running totals, as update_loan_balances() would compute them
+        for _, paid_field in Loan.ALLOCATION_BUCKETS.values():
+            setattr(loan, paid_field, counters[paid_field])
+        loan.total_amount_paid = sum(row.total_amount_due for row in rows[:paid])
+        loan.current_balance = loan.total_loan_amount - loan.total_amount_paid
+    Loan.objects.bulk_update(loans, ['total_loan_amount', *Loan.RUNNING_TOTAL_FIELDS])
+    LoanRepaymentSchedule.objects.bulk_create(schedules)
+    LoanRepayment.objects.bulk_create(repayments)
+
+
+def _time(*functions, repeat):
+    """Time each function; several are run in turn, so drift hits them alike"""
+    for function in functions:
+        function()  # warm-up
+    timings = [[] for _ in functions]
+    for number in range(repeat):
+        # Alternate the order too, so neither always runs first
+        order = list(zip(functions, timings))
+        for function, runs in order if number % 2 == 0 else reversed(order):
+            started = time.perf_counter()
+            function()
+            runs.append((time.perf_counter() - started) * 1000)
+    results = []
+    for function, runs in zip(functions, timings):
+        # The log is capped (9000 under DEBUG) and stops growing once full
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            function()
+        runs.sort()
+        results.append({
+            'runs': repeat,
+            'min_ms': round(runs[0], 3),
+            'median_ms': round(statistics.median(runs), 3),
+            'p95_ms': round(runs[min(len(runs) - 1, int(len(runs) * 0.95))], 3),
+            'queries': len(queries),
+        })
+    return results
+
+
+def _rolled_back(function):
+    def run():
+        try:
+            with transaction.atomic():
+                function()
+                raise _Rollback
+        except _Rollback:
+            pass
+    return run
+
+
+def _view(view, user, path, **kwargs):
+    factory = APIRequestFactory()
+
+    def run():
+        request = factory.get(path)
+        force_authenticate(request, user=user)
+        response = view(request, **kwargs)
+        response.render()
+        assert response.status_code == 200, response.content[:200]
+    return run
+
+
+def _request(user, path, middleware):
+    """GET ``path`` through the whole request handler with this middleware stack"""
+    # localhost is allowed with DEBUG on, as in config/serving.py
+    browser = TestClient(HTTP_HOST='localhost')
+    browser.force_login(user)
+    with override_settings(MIDDLEWARE=middleware):
+        # Built once on first use and kept afterwards
+        browser.handler.load_middleware()
+
+    def run():
+        response = browser.get(path)
+        assert response.status_code == 200, response.content[:200]
+    return run
+
+
+def _page(queryset, rows):
+    """Read and render one full page of clients, from values() rows or through ClientSerializer"""
+    queryset = queryset[:client_views.MAX_PAGE_SIZE]
+
+    def run():
+        if rows:
+            return ORJSONRenderer().render({'results': encode_client_rows(client_rows(queryset))})
+        else:
+            # all(): a fresh queryset, so no run reuses another's cached rows
+            return JSONRenderer().render({'results': ClientSerializer(queryset.all(), many=True).data})
+    return run
+
+
+def benchmark_cases(rng):
+    """(name, callable) pairs for the current data set"""
+    client_count = Client.objects.count()
+    officer = Client.objects.exclude(credit_officer=None).values_list('credit_officer', flat=True).first()
+    user = get_user_model().objects.get(pk=officer)
+    # One of the first few loans with repayments; small seeds may have fewer than ten
+    paid_loans = Loan.objects.filter(repayments__isnull=False).distinct().order_by('pk')
+    paid_count = paid_loans.count()
+    if not paid_count:
+        raise ValueError("The seeded data has no loans with repayments to benchmark")
+    loan = paid_loans[rng.randrange(min(10, paid_count))]
+    schedule = loan.repayment_schedule.filter(is_paid=False).order_by('due_date').first()
+    deep_client = Client.objects.order_by('-created_at', '-id')[int(client_count * 0.9)]
+    deep_page = max(1, int(client_count * 0.9) // 15)
+    cursor = encode_cursor('-created_at', deep_client)
+    newest = Client.objects.order_by('-created_at')
+    matches = apply_search(Client.objects.all(), 'okello').order_by('-created_at')
+
+    def repayment_save():
+        LoanRepayment(
+            loan=loan, schedule=schedule, payment_date=timezone.now().date(), amount_paid=Decimal('50.00'),
+            payment_mode='cash', receipt_number='BENCH-SAVE',
+        ).save()
+
+    def renewal():
+        # Renewal rewrites the loan, so start from a fresh copy each run
+        renewed = Loan.objects.get(pk=loan.pk)
+        renewal = LoanRenewal(
+            loan=renewed, renewal_type='full', new_principal_amount=renewed.current_balance,
+            new_interest_rate=renewed.interest_rate, new_loan_term=12,
+            new_due_date=timezone.now().date(), reason='benchmark', terms_accepted=True,
+        )
+        renewal.calculate_renewal_terms()
+        renewal.save()
+
+    def stats_cold():
+        cache.clear()
+        _view(client_views.client_stats, user, '/api/clients/stats/')()
+
+    return [
+        ('client_search_term', _view(client_views.client_search, user, '/api/clients/search/?search=okello')),
+        ('client_search_no_term', _view(client_views.client_search, user, '/api/clients/search/')),
+        ('client_list_deep_page', _view(client_views.client_list_create, user, f'/api/clients/?page={deep_page}')),
+        ('client_list_deep_cursor', _view(client_views.client_list_create, user, f'/api/clients/?cursor={cursor}')),
+        ('loan_repayment_save', _rolled_back(repayment_save)),
+        ('loan_update_balances', _rolled_back(loan.update_loan_balances)),
+        ('loan_renewal_schedule', _rolled_back(renewal)),
+        ('client_stats_cold', stats_cold),
+        ('client_stats_warm', _view(client_views.client_stats, user, '/api/clients/stats/')),
+        ('client_search_http', _request(user, '/api/clients/search/?search=okello', settings.MIDDLEWARE)),
+        ('client_search_http_no_metrics', _request(
+            user, '/api/clients/search/?search=okello',
+            [middleware for middleware in settings.MIDDLEWARE if middleware != METRICS_MIDDLEWARE],
+        )),
+        ('client_list_page_rows', _page(newest, rows=True)),
+        ('client_list_page_serializer', _page(newest, rows=False)),
+        ('client_search_page_rows', _page(matches, rows=True)),
+        ('client_search_page_serializer', _page(matches, rows=False)),
+    ]
+
+
+def run_benchmarks(sizes, repeat=DEFAULT_REPEAT, only=None, seed=0, seeded=None, timed=None):
+    """Seed up to each size in turn and time every case; returns the results dict.
+
+    ``seeded`` is called with the client count as seeding progresses and
+    ``timed`` with (size, case, result) after each case.
+    """
+    # Compared cases are timed together (see _time)
+    partners = {}
+    for _, baseline, candidate, _ in CASE_COMPARISONS:
+        partners[baseline], partners[candidate] = candidate, baseline
+
+    results = {}
+    for size in sorted(sizes):
+        seed_clients(size, seed, seeded)
+        cases = dict(benchmark_cases(random.Random(seed)))
+        timings = results[str(size)] = {}
+        for name in cases:
+            if only and name not in only or name in timings:
+                continue
+            names = [name]
+            if partners.get(name) in cases and (not only or partners[name] in only):
+                names.append(partners[name])
+            for timed_name, result in zip(names, _time(*(cases[case] for case in names), repeat=repeat)):
+                timings[timed_name] = result
+                if timed:
+                    timed(size, timed_name, result)
+    return results
+
+
+def compare_cases(results):
+    """Rows of (size, comparison, baseline ms, candidate ms, ratio, goal met) for one run's results"""
+    rows = []
+    for size, cases in results.items():
+        for name, baseline, candidate, goal in CASE_COMPARISONS:
+            if baseline not in cases or candidate not in cases:
+                continue
+            before, after = cases[baseline]['median_ms'], cases[candidate]['median_ms']
+            ratio = after / before if before else 0
+            rows.append((size, name, before, after, round(ratio, 3), ratio <= goal))
+    return rows
+
+
+def compare_results(baseline, current, threshold):
+    """Rows of (size, case, baseline ms, current ms, change %, regressed) by median"""
+    rows = []
+    for size, cases in current.get('results', {}).items():
+        for name, result in cases.items():
+            before = baseline.get('results', {}).get(size, {}).get(name)
+            if not before:
+                continue
+            change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0
+            rows.append((size, name, before['median_ms'], result['median_ms'], round(change, 1), change > threshold))
+    return rows
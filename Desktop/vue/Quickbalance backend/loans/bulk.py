@@ -0,0 +1,167 @@
+"""
+Batch posting of loan repayments.
+
+Settlement files (mobile money, bank) carry thousands of repayments. Rows
+are validated up front, then written with bulk_create in chunked
+transactions. Allocation runs in memory against the loan counters, which
+are locked and read once per chunk, and each affected loan and schedule
+is updated once per chunk instead of once per row. A chunk that loses a
+lock conflict to a concurrent posting is rolled back and retried.
+"""
+import csv
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .concurrency import run_with_retry
+from .models import Loan, LoanRepayment, LoanRepaymentSchedule, PortfolioAgingSummary
+from .serializers import LoanRepaymentImportSerializer
+
+DEFAULT_CHUNK_SIZE = 1000
+IMPORT_FORMATS = ['csv', 'json']
+
+
+def parse_repayment_rows(stream, fmt):
+    """Read raw repayment rows from a text stream in CSV or JSON format"""
+    if fmt == 'csv':
+        # Blank cells mean "not provided" rather than an empty value
+        return [
+            {key: value for key, value in row.items() if key and value not in ('', None)}
+            for row in csv.DictReader(stream)
+        ]
+    if fmt == 'json':
+        rows = json.load(stream)
+        if isinstance(rows, dict):
+            rows = rows.get('repayments', [])
+        if not isinstance(rows, list):
+            raise ValueError("JSON batch must be a list of repayments")
+        return rows
+    raise ValueError(f"Unsupported format '{fmt}', expected one of {IMPORT_FORMATS}")
+
+
+def validate_repayment_rows(rows):
+    """Validate a batch, returning (valid rows, errors).
+
+    Errors are reported per row number (1-based). Loan and schedule ids are
+    checked with one query each for the whole batch.
+    """
+    valid, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        serializer = LoanRepaymentImportSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            errors.append({'row': number, 'errors': serializer.errors})
+
+    loan_ids = {data['loan'] for _, data in valid}
+    schedule_ids = {data['schedule'] for _, data in valid if data.get('schedule')}
+    known_loans = set(Loan.objects.filter(pk__in=loan_ids).values_list('pk', flat=True))
+    known_schedules = dict(
+        LoanRepaymentSchedule.objects.filter(pk__in=schedule_ids).values_list('pk', 'loan_id')
+    )
+
+    checked = []
+    for number, data in valid:
+        if data['loan'] not in known_loans:
+            errors.append({'row': number, 'errors': {'loan': ["Loan does not exist"]}})
+        elif data.get('schedule') and known_schedules.get(data['schedule']) != data['loan']:
+            errors.append({'row': number, 'errors': {'schedule': ["Schedule does not belong to this loan"]}})
+        else:
+            checked.append(data)
+
+    errors.sort(key=lambda error: error['row'])
+    return checked, errors
+
+
+def ingest_repayments(rows, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Post validated repayment rows in chunked transactions.
+
+    Rows whose receipt_number is already on file (or repeated earlier in the
+    batch) are skipped, so re-running an import is safe. ``progress`` is
+    called with the running summary after each chunk.
+    """
+    summary = {'created': 0, 'duplicates': 0, 'loans_updated': 0}
+    seen_receipts = set()
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        created, duplicates, loans_updated, seen_receipts = run_with_retry(_ingest_chunk, chunk, seen_receipts)
+        summary['created'] += created
+        summary['duplicates'] += duplicates
+        summary['loans_updated'] += loans_updated
+        if progress:
+            progress(dict(summary, processed=min(start + chunk_size, len(rows)), total=len(rows)))
+
+    return summary
+
+
+def _ingest_chunk(chunk, seen_receipts):
+    # Receipts are only marked as seen once the chunk commits
+    seen_receipts = set(seen_receipts)
+    # One locked read of the allocation counters for every loan in the
+    # chunk, taken before anything else is read
+    counters = Loan.lock_counters({data['loan'] for data in chunk})
+
+    receipts = [data['receipt_number'] for data in chunk]
+    on_file = set(
+        LoanRepayment.objects.filter(receipt_number__in=receipts).values_list('receipt_number', flat=True)
+    )
+    new_rows = []
+    for data in chunk:
+        receipt = data['receipt_number']
+        if receipt in on_file or receipt in seen_receipts:
+            continue
+        seen_receipts.add(receipt)
+        new_rows.append(data)
+    duplicates = len(chunk) - len(new_rows)
+    if not new_rows:
+        return 0, duplicates, 0, seen_receipts
+
+    schedule_ids = {data['schedule'] for data in new_rows if data.get('schedule')}
+    due_dates = dict(
+        LoanRepaymentSchedule.objects.filter(pk__in=schedule_ids).values_list('pk', 'due_date')
+    )
+
+    today = timezone.now().date()
+    repayments = []
+    deltas = defaultdict(lambda: defaultdict(Decimal))
+    for data in new_rows:
+        loan_counters = counters[data['loan']]
+        allocation = Loan.split_payment(loan_counters, data['amount_paid'])
+        payment_date = data.get('payment_date') or today
+        schedule_id = data.get('schedule')
+
+        repayments.append(LoanRepayment(
+            loan_id=data['loan'],
+            schedule_id=schedule_id,
+            payment_date=payment_date,
+            amount_paid=data['amount_paid'],
+            payment_mode=data['payment_mode'],
+            receipt_number=data['receipt_number'],
+            notes=data.get('notes', ''),
+            principal_paid=allocation['principal'],
+            interest_paid=allocation['interest'],
+            fees_paid=allocation['fees'],
+            fines_paid=allocation['fines'],
+            is_late=bool(schedule_id and payment_date > due_dates[schedule_id]),
+        ))
+
+        # Later rows for the same loan allocate against the updated counters
+        loan_deltas = deltas[data['loan']]
+        loan_deltas['paid'] += data['amount_paid']
+        for bucket, amount in allocation.items():
+            _, paid_field = Loan.ALLOCATION_BUCKETS[bucket]
+            loan_counters[paid_field] += amount
+            loan_deltas[f'{bucket}_paid'] += amount
+
+    LoanRepayment.objects.bulk_create(repayments)
+
+    for loan_id, loan_deltas in deltas.items():
+        Loan.objects.filter(pk=loan_id).update(**Loan.balance_delta_updates(**loan_deltas))
+    for schedule in LoanRepaymentSchedule.objects.filter(pk__in=schedule_ids):
+        schedule.update_payment_status(refresh_aging=False)
+    PortfolioAgingSummary.refresh_loans(list(deltas))
+
+    return len(repayments), duplicates, len(deltas), seen_receipts
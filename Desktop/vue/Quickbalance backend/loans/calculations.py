@@ -0,0 +1,223 @@
+"""
+Loan amortization maths.
+
+Mirrors the PMT / amortization helpers in the frontend's
+financialCalculations.js, but works in Decimal so every installment is
+rounded to the cent and the installments add up exactly to the totals.
+"""
+import calendar
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from itertools import accumulate, count
+from operator import add
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+PERIODS_PER_YEAR = {
+    'daily': 365,
+    'weekly': 52,
+    'monthly': 12,
+}
+
+# 'flat': interest_rate is a flat percentage of principal over the whole
+#         loan (as in Loan.calculate_total_loan_amount), spread evenly.
+# 'declining': interest_rate is a nominal annual rate charged on the
+#         outstanding balance each period (PMT formula).
+INTEREST_METHODS = ['flat', 'declining']
+
+# Distinct amortizations kept by _amortize(), keyed without the start date
+QUOTE_CACHE_SIZE = 2048
+
+
+def to_cents(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def add_months(start, months):
+    """Add calendar months, clamping to the last day of shorter months"""
+    month_index = start.month - 1 + months
+    year = start.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return start.replace(year=year, month=month, day=day)
+
+
+def installment_due_date(start, frequency, number):
+    """Due date of the given (1-based) installment"""
+    if frequency == 'daily':
+        return start + timedelta(days=number)
+    if frequency == 'weekly':
+        return start + timedelta(weeks=number)
+    if frequency == 'monthly':
+        return add_months(start, number)
+    raise ValueError(f"Unknown repayment frequency '{frequency}'")
+
+
+def period_rate(annual_rate, frequency):
+    """Per-installment rate as a fraction for a nominal annual percentage"""
+    return Decimal(annual_rate) / 100 / PERIODS_PER_YEAR[frequency]
+
+
+def calculate_payment(principal, annual_rate, periods, frequency='monthly'):
+    """Level installment for a declining-balance loan (PMT formula)"""
+    principal = Decimal(principal)
+    if periods <= 0:
+        raise ValueError("Number of periods must be positive")
+    rate = period_rate(annual_rate, frequency)
+    if rate == 0:
+        return to_cents(principal / periods)
+    growth = (1 + rate) ** periods
+    return to_cents(principal * rate * growth / (growth - 1))
+
+
+def amortization_schedule(principal, annual_rate, periods, frequency, start_date, method='flat'):
+    """Compute the full installment plan.
+
+    Returns a list of dicts with period, due_date, principal, interest,
+    payment and balance. Rounding differences are absorbed by the final
+    installment so principal repaid equals the amount borrowed.
+    """
+    _check_terms(periods, frequency, method)
+    rows, _, _ = _amortize(to_cents(principal), Decimal(annual_rate), int(periods), frequency, method)
+    return _dated_rows(rows, start_date, frequency)
+
+
+def _dated_rows(rows, start_date, frequency):
+    due_dates = _due_dates(start_date, frequency, len(rows))
+    return [
+        {
+            'period': number,
+            'due_date': due_date,
+            'principal': principal_paid,
+            'interest': interest,
+            'payment': payment,
+            'balance': balance,
+        }
+        for number, due_date, (principal_paid, interest, payment, balance) in zip(count(1), due_dates, rows)
+    ]
+
+
+@lru_cache(maxsize=QUOTE_CACHE_SIZE)
+def _due_dates(start_date, frequency, periods):
+    # Shared by every scenario in a batch that starts on the same day
+    return tuple(installment_due_date(start_date, frequency, number) for number in range(1, periods + 1))
+
+
+def _check_terms(periods, frequency, method):
+    if method not in INTEREST_METHODS:
+        raise ValueError(f"Unknown interest method '{method}'")
+    if frequency not in PERIODS_PER_YEAR:
+        raise ValueError(f"Unknown repayment frequency '{frequency}'")
+    if int(periods) <= 0:
+        raise ValueError("Number of periods must be positive")
+
+
+@lru_cache(maxsize=QUOTE_CACHE_SIZE)
+def _amortize(principal, annual_rate, periods, frequency, method):
+    """Installment amounts, independent of the dates they fall due.
+
+    Returns ((principal, interest, payment, balance) per installment,
+    total interest, effective annual rate or None).
+    """
+    if method == 'flat':
+        total_interest = to_cents(principal * annual_rate / 100)
+        principals = _spread(principal, to_cents(principal / periods), periods)
+        interests = _spread(total_interest, to_cents(total_interest / periods), periods)
+        effective_rate = None
+    else:
+        principals, interests = _declining_balance(principal, annual_rate, periods, frequency)
+        total_interest = sum(interests)
+        # Only meaningful when the rate is charged on the declining balance
+        effective_rate = effective_annual_rate(annual_rate, PERIODS_PER_YEAR[frequency])
+    balances = [principal - repaid for repaid in accumulate(principals)]
+    rows = tuple(zip(principals, interests, map(add, principals, interests), balances))
+    return rows, total_interest, effective_rate
+
+
+def _spread(total, part, periods):
+    """``part`` per installment until ``total`` runs out; the last takes the rest.
+
+    Closed form of the running balance: before installment n,
+    max(total - part * (n - 1), 0) is left.
+    """
+    left = [max(total - part * number, ZERO) for number in range(periods)]
+    return [min(part, amount) for amount in left[:-1]] + [left[-1]]
+
+
+def _declining_balance(principal, annual_rate, periods, frequency):
+    # Each period's interest is on the balance left by the rounded
+    # installments before it, so this stays a running pass
+    rate = period_rate(annual_rate, frequency)
+    payment = calculate_payment(principal, annual_rate, periods, frequency)
+    balance, principals, interests = principal, [], []
+    for number in range(1, periods + 1):
+        interest = to_cents(balance * rate)
+        principal_paid = balance if number == periods else min(payment - interest, balance)
+        balance -= principal_paid
+        principals.append(principal_paid)
+        interests.append(interest)
+    return principals, interests
+
+
+def effective_annual_rate(nominal_rate, compounding_periods):
+    """Effective annual rate (percent) of a nominal annual rate"""
+    rate = Decimal(nominal_rate) / 100
+    return to_cents(((1 + rate / compounding_periods) ** compounding_periods - 1) * 100)
+
+
+def compound_amount(principal, annual_rate, months, compounding_frequency=12):
+    """Principal plus interest compounded ``compounding_frequency`` times a year"""
+    rate = Decimal(annual_rate) / 100 / compounding_frequency
+    return to_cents(Decimal(principal) * (1 + rate) ** (Decimal(compounding_frequency) * months / 12))
+
+
+def simple_interest(principal, annual_rate, years):
+    return to_cents(Decimal(principal) * Decimal(annual_rate) * Decimal(years) / 100)
+
+
+def present_value(future_value, rate, periods):
+    return to_cents(Decimal(future_value) / (1 + Decimal(rate) / 100) ** periods)
+
+
+def future_value(present_value, rate, periods):
+    return to_cents(Decimal(present_value) * (1 + Decimal(rate) / 100) ** periods)
+
+
+def quote_loans(scenarios, include_schedule=False):
+    """Price a batch of loan scenarios: installment, totals and dates.
+
+    ``scenarios`` are dicts of principal, annual_rate, periods, frequency,
+    method and start_date. The amounts are memoized without the dates, so
+    a scenario quoted for another start date (or yesterday) is served from
+    memory and each distinct scenario in the batch is amortized once.
+    Returns one summary dict per scenario, with the dated schedule when
+    ``include_schedule`` is set.
+    """
+    quotes = []
+    for scenario in scenarios:
+        frequency, method, start_date = scenario['frequency'], scenario['method'], scenario['start_date']
+        _check_terms(scenario['periods'], frequency, method)
+        # 1000, 1000.0 and 1000.00 must share a cache entry; rates are stored
+        # to the cent on Loan, so quotes use the same precision
+        principal, annual_rate = to_cents(scenario['principal']), to_cents(scenario['annual_rate'])
+        periods = int(scenario['periods'])
+        rows, total_interest, effective_rate = _amortize(principal, annual_rate, periods, frequency, method)
+        quote = {
+            'principal': principal,
+            'annual_rate': annual_rate,
+            'periods': periods,
+            'frequency': frequency,
+            'method': method,
+            'installment': rows[0][2],
+            'total_interest': total_interest,
+            'total_payable': principal + total_interest,
+            'effective_annual_rate': effective_rate,
+            'first_due_date': installment_due_date(start_date, frequency, 1),
+            'maturity_date': installment_due_date(start_date, frequency, periods),
+        }
+        if include_schedule:
+            quote['schedule'] = _dated_rows(rows, start_date, frequency)
+        quotes.append(quote)
+    return quotes
@@ -0,0 +1,67 @@
+"""
+Retrying postings that lose a lock conflict.
+
+Every posting locks its loan rows (in id order) before reading the
+counters it allocates against, so two tellers posting to the same loan
+queue behind each other instead of overwriting each other's totals. The
+database can still abort one side of a conflict: a deadlock with some
+other statement, a lock wait timeout, a serialization failure, or
+SQLite's "database is locked" when two connections want to write. The
+whole transaction has been rolled back by then, so it is safe to run it
+again from the start.
+
+SQLite locks the whole database when a transaction first writes, and two
+transactions that have both read cannot both upgrade; under steady load
+set OPTIONS['transaction_mode'] = 'IMMEDIATE' so writers queue instead.
+
+Only the outermost transaction can be retried. Inside someone else's
+atomic block the error is re-raised for the owner of that block to handle.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+DEFAULT_ATTEMPTS = 5
+# Seconds before the first retry, doubled (with jitter) for each one after
+DEFAULT_BACKOFF = 0.02
+
+MYSQL_CONFLICT_CODES = (1205, 1213)  # lock wait timeout, deadlock
+POSTGRESQL_CONFLICT_CODES = ('40001', '40P01')  # serialization failure, deadlock
+SQLITE_CONFLICT_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_conflict(error):
+    """Whether a database error means the transaction lost a lock conflict"""
+    if not isinstance(error, OperationalError):
+        return False
+    cause = error.__cause__ or error
+    if error.args and error.args[0] in MYSQL_CONFLICT_CODES:
+        return True
+    if (getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)) in POSTGRESQL_CONFLICT_CODES:
+        return True
+    return str(error) in SQLITE_CONFLICT_MESSAGES
+
+
+def run_with_retry(func, *args, using=None, reset=None, **kwargs):
+    """Call ``func`` in a transaction, retrying it when it loses a lock conflict.
+
+    ``reset`` is called before each retry to undo in-memory changes the
+    failed attempt made. Attempts and backoff come from
+    settings.LOAN_POSTING_RETRIES and LOAN_POSTING_RETRY_BACKOFF.
+    """
+    attempts = getattr(settings, 'LOAN_POSTING_RETRIES', DEFAULT_ATTEMPTS)
+    backoff = getattr(settings, 'LOAN_POSTING_RETRY_BACKOFF', DEFAULT_BACKOFF)
+    retryable = not transaction.get_connection(using).in_atomic_block
+
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic(using=using):
+                return func(*args, **kwargs)
+        except OperationalError as error:
+            if not retryable or attempt == attempts or not is_conflict(error):
+                raise
+        if reset:
+            reset()
+        time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
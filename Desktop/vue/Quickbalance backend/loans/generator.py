@@ -0,0 +1,377 @@
+"""
+Synthetic loan book for load testing.
+
+generate_portfolio creates clients, then for each of them loans of every
+type and repayment frequency with their schedules, fees, fines and a
+repayment history (on time, late, partial or stopped) up to a cut-off
+date. Rows are written with bulk_create, so the per-row save() side
+effects (allocation, balance deltas, aging refresh, stats signals) never
+run: each loan's allocation and running totals are worked out in memory
+with Loan.split_payment while its history is built, and aging and the
+cached client counters are rebuilt once at the end.
+
+Clients are generated in batches that can run in parallel processes.
+Each batch draws from its own generator seeded with (seed, batch start),
+and every row's primary key comes from a fixed slot derived from its
+client's number, so the output is the same whatever the number of
+workers and no worker has to read back ids another one created.
+"""
+import random
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from clients.models import Client
+from clients.search import build_search_document
+from clients.stats import invalidate_counters
+from .calculations import to_cents
+from .models import (
+    Loan, LoanFeeCharge, LoanFineCharge, LoanRepayment, LoanRepaymentSchedule, PortfolioAgingSummary
+)
+
+DEFAULT_BATCH_SIZE = 1000
+CLIENTS_PER_OFFICER = 500
+OFFICER_PREFIX = 'gen_officer_'
+
+# Number of loans a client has -> weight
+LOANS_PER_CLIENT = {0: 10, 1: 55, 2: 25, 3: 10}
+MAX_LOANS_PER_CLIENT = max(LOANS_PER_CLIENT)
+
+# Frequency -> (weight, fewest installments, most installments)
+FREQUENCY_TERMS = {
+    'daily': (20, 30, 90),
+    'weekly': (30, 8, 52),
+    'monthly': (50, 3, 24),
+}
+MAX_INSTALLMENTS = max(most for _, _, most in FREQUENCY_TERMS.values())
+
+# Loan type -> (smallest, largest principal, step)
+PRINCIPAL_RANGES = {
+    'personal': (200, 5000, 50),
+    'business': (1000, 50000, 500),
+    'mortgage': (20000, 250000, 1000),
+    'school_fees': (300, 6000, 50),
+    'emergency': (100, 2000, 50),
+    'other': (200, 10000, 100),
+}
+INTEREST_RATES = [10, 12, 15, 18, 20, 24]
+
+# Repayment behaviour -> weight
+BEHAVIOURS = {'on_time': 70, 'late': 20, 'stops_paying': 10}
+# Share of loans still awaiting disbursement
+UNDISBURSED_SHARE = 0.05
+# How far back clients were registered
+HISTORY_DAYS = 3 * 365
+
+PROCESSING_FEE_RATE = Decimal('0.02')
+INSURANCE_FEE_RATE = Decimal('0.01')
+LATE_FINE_RATE = Decimal('0.05')
+DEFAULT_FINE_RATE = Decimal('0.10')
+# Days past due before a late payment fine is charged
+FINE_GRACE_DAYS = 7
+DEFAULT_AFTER_DAYS = 90
+
+# Id slots per loan for each child table; a loan never uses more
+FEE_SLOTS = 2
+FINE_SLOTS = MAX_INSTALLMENTS + 1
+REPAYMENT_SLOTS = 2 * MAX_INSTALLMENTS
+
+_FIRST_NAMES = [
+    'John', 'Mary', 'Peter', 'Grace', 'Joseph', 'Sarah', 'David', 'Ruth', 'Moses', 'Esther',
+    'Paul', 'Agnes', 'Samuel', 'Florence', 'Robert', 'Harriet', 'Isaac', 'Brenda', 'Denis', 'Juliet',
+]
+_OTHER_NAMES = [
+    'Okello', 'Nakato', 'Mugisha', 'Achieng', 'Kato', 'Namubiru', 'Otieno', 'Atim', 'Ssemwogerere',
+    'Byaruhanga', 'Nabirye', 'Tumusiime', 'Akello', 'Wasswa', 'Nansubuga', 'Odongo', 'Kyomuhendo',
+]
+_OCCUPATIONS = ['Trader', 'Farmer', 'Teacher', 'Boda boda rider', 'Tailor', 'Mechanic', 'Nurse', 'Shopkeeper']
+_COLLATERAL = ['Land title', 'Motorcycle logbook', 'Household items', 'Shop stock', 'Vehicle logbook']
+_PAYMENT_MODES = [mode for mode, _ in LoanRepayment.PAYMENT_MODE_CHOICES]
+
+_MODELS = [Client, Loan, LoanRepaymentSchedule, LoanFeeCharge, LoanFineCharge, LoanRepayment]
+
+
+def id_bases():
+    """Highest existing id per generated table; new rows are numbered after them"""
+    return {
+        model._meta.label: model.objects.aggregate(last=Max('pk'))['last'] or 0
+        for model in _MODELS
+    }
+
+
+def ensure_officers(clients):
+    """Create the credit officers ``clients`` generated clients are spread over; returns their ids"""
+    User = get_user_model()
+    needed = max(1, -(-clients // CLIENTS_PER_OFFICER))
+    existing = User.objects.filter(username__startswith=OFFICER_PREFIX).count()
+    rng = random.Random('officers')
+    names = [(rng.choice(_FIRST_NAMES), rng.choice(_OTHER_NAMES)) for _ in range(needed)]
+    User.objects.bulk_create([
+        User(username=f'{OFFICER_PREFIX}{number}', first_name=names[number][0], last_name=names[number][1])
+        for number in range(existing, needed)
+    ])
+    return list(
+        User.objects.filter(username__startswith=OFFICER_PREFIX).order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def batch_ranges(clients, batch_size=DEFAULT_BATCH_SIZE):
+    """(start, stop) client numbers of each batch"""
+    return [(start, min(start + batch_size, clients)) for start in range(0, clients, batch_size)]
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+class _Batch:
+    """The rows generated for one batch of clients, with their primary keys"""
+
+    def __init__(self, bases, as_of, method):
+        self.bases = bases
+        self.as_of = as_of
+        self.method = method
+        self.clients, self.loans, self.schedules = [], [], []
+        self.fees, self.fines, self.repayments = [], [], []
+
+    def _pk(self, model, slot):
+        return self.bases[model._meta.label] + slot + 1
+
+    def add_client(self, rng, number, officer):
+        pk = self._pk(Client, number)
+        # Loans start after the client was registered and their application
+        days_registered = rng.randrange(30, HISTORY_DAYS + 30)
+        born = self.as_of - timedelta(days=rng.randrange(20 * 365, 65 * 365))
+        client = Client(
+            pk=pk,
+            first_name=rng.choice(_FIRST_NAMES),
+            other_names=f'{rng.choice(_OTHER_NAMES)} {rng.choice(_OTHER_NAMES)}',
+            date_of_birth=born,
+            age=(self.as_of - born).days // 365,
+            gender=rng.choice('MF'),
+            marital_status=rng.choice('SMDW'),
+            # Unique per client; 09 is not a Ugandan mobile prefix, so these
+            # never clash with real numbers already on file
+            phone=f'09{pk:08d}',
+            other_phoneNos=f'GEN-{pk}',
+            national_id=f'GEN{pk:011d}',
+            passport_number=f'GP{pk:09d}',
+            email=f'client{pk}@example.com',
+            occupation=rng.choice(_OCCUPATIONS),
+            address=f'Plot {rng.randrange(1, 500)}, Kampala',
+            credit_officer_id=officer.pk,
+            created_at=timezone.make_aware(datetime.combine(
+                self.as_of - timedelta(days=days_registered),
+                time(rng.randrange(8, 18), rng.randrange(60)),
+            )),
+        )
+        client.search_document = build_search_document(client, officer)
+        self.clients.append(client)
+
+        for index in range(_weighted(rng, LOANS_PER_CLIENT)):
+            self.add_loan(rng, number * MAX_LOANS_PER_CLIENT + index, pk, days_registered - 16)
+
+    def add_loan(self, rng, slot, client_id, history_days):
+        loan_type = rng.choice(Loan.LOAN_TYPE_CHOICES)[0]
+        frequency = _weighted(rng, {name: weight for name, (weight, _, _) in FREQUENCY_TERMS.items()})
+        _, fewest, most = FREQUENCY_TERMS[frequency]
+        smallest, largest, step = PRINCIPAL_RANGES[loan_type]
+        loan = Loan(
+            pk=self._pk(Loan, slot),
+            client_id=client_id,
+            loan_type=loan_type,
+            principal_amount=Decimal(rng.randrange(smallest, largest + 1, step)),
+            loan_purpose=f'{dict(Loan.LOAN_TYPE_CHOICES)[loan_type]} (generated)',
+            loan_terms=rng.randint(fewest, most),
+            interest_rate=Decimal(rng.choice(INTEREST_RATES)),
+            repayment_frequency=frequency,
+        )
+        if loan_type in ('business', 'mortgage') or rng.random() < 0.3:
+            loan.collateral_description = rng.choice(_COLLATERAL)
+            loan.collateral_value = to_cents(loan.principal_amount * Decimal(rng.choice([1.2, 1.5, 2])))
+        if rng.random() < 0.5:
+            loan.guarantor_name = f'{rng.choice(_FIRST_NAMES)} {rng.choice(_OTHER_NAMES)}'
+            loan.guarantor_contact = f'07{rng.randrange(10 ** 8):08d}'
+        self.loans.append(loan)
+
+        if rng.random() < UNDISBURSED_SHARE:
+            loan.status = rng.choice(['pending', 'approved'])
+            loan.application_date = self.as_of - timedelta(days=rng.randrange(14))
+            if loan.status == 'approved':
+                loan.approval_date = loan.application_date
+            # As Loan.save() would have set them
+            loan.total_loan_amount, _ = loan.calculate_total_loan_amount()
+            loan.current_balance = loan.total_loan_amount
+            return
+
+        start = self.as_of - timedelta(days=rng.randrange(history_days))
+        loan.start_date = start
+        loan.approval_date = start - timedelta(days=rng.randrange(3))
+        loan.application_date = loan.approval_date - timedelta(days=rng.randrange(14))
+        schedule = loan.build_repayment_schedule(start_date=start, method=self.method)
+        for number, installment in enumerate(schedule):
+            installment.pk = self._pk(LoanRepaymentSchedule, slot * MAX_INSTALLMENTS + number)
+        self.schedules += schedule
+        loan.due_date = schedule[-1].due_date
+        loan.total_interest_charged = sum(installment.interest_amount for installment in schedule)
+        loan.total_loan_amount = loan.principal_amount + loan.total_interest_charged
+        # Contracted interest is already charged in full, so nightly
+        # accrual starts from the generation date
+        loan.interest_accrued_through = self.as_of
+        self._add_history(rng, loan, slot, schedule)
+
+    def _add_history(self, rng, loan, slot, schedule):
+        as_of = self.as_of
+        counters = {
+            field: Decimal(str(getattr(loan, field))) if field != 'loan_type' else loan.loan_type
+            for field in Loan.allocation_counter_fields()
+        }
+        fees, fines, repayments = [], [], []
+        paid_towards = defaultdict(Decimal)
+
+        def charge(model, rows, slots, **fields):
+            rows.append(model(pk=self._pk(model, slot * slots + len(rows)), loan_id=loan.pk, **fields))
+            counters[Loan.ALLOCATION_BUCKETS['fees' if model is LoanFeeCharge else 'fines'][0]] += fields['amount']
+
+        def pay(installment, day, amount):
+            allocation = Loan.split_payment(counters, amount)
+            for bucket, allocated in allocation.items():
+                counters[Loan.ALLOCATION_BUCKETS[bucket][1]] += allocated
+            repayments.append(LoanRepayment(
+                pk=self._pk(LoanRepayment, slot * REPAYMENT_SLOTS + len(repayments)),
+                loan_id=loan.pk, schedule_id=installment.pk, payment_date=day, amount_paid=amount,
+                payment_mode=rng.choice(_PAYMENT_MODES), is_late=day > installment.due_date,
+                **{f'{bucket}_paid': allocated for bucket, allocated in allocation.items()},
+            ))
+            repayments[-1].receipt_number = f'GEN-{repayments[-1].pk}'
+            # As update_payment_status() decides it
+            paid_towards[installment.pk] += amount
+            installment.is_paid = paid_towards[installment.pk] >= installment.total_amount_due
+
+        def outstanding_charges():
+            return sum(
+                counters[charged] - counters[paid]
+                for bucket, (charged, paid) in Loan.ALLOCATION_BUCKETS.items() if bucket in ('fees', 'fines')
+            )
+
+        if rng.random() < 0.8:
+            loan.processing_fee = to_cents(loan.principal_amount * PROCESSING_FEE_RATE)
+            charge(LoanFeeCharge, fees, FEE_SLOTS, fee_type='processing', amount=loan.processing_fee,
+                   charge_date=loan.start_date, description='Processing fee')
+        if rng.random() < 0.4:
+            loan.insurance_fee = to_cents(loan.principal_amount * INSURANCE_FEE_RATE)
+            charge(LoanFeeCharge, fees, FEE_SLOTS, fee_type='insurance', amount=loan.insurance_fee,
+                   charge_date=loan.start_date, description='Credit life insurance')
+
+        behaviour = _weighted(rng, BEHAVIOURS)
+        due = [installment for installment in schedule if installment.due_date <= as_of]
+        stops_after = rng.randrange(len(due) + 1) if behaviour == 'stops_paying' else len(schedule)
+
+        for number, installment in enumerate(due):
+            delay = 0
+            if behaviour == 'late' and rng.random() < 0.6:
+                delay = rng.randint(1, 40)
+            elif behaviour == 'on_time' and rng.random() < 0.05:
+                delay = rng.randint(1, FINE_GRACE_DAYS)
+            if number >= stops_after:
+                delay = (as_of - installment.due_date).days + 1
+
+            fine_date = installment.due_date + timedelta(days=FINE_GRACE_DAYS)
+            if delay > FINE_GRACE_DAYS and fine_date <= as_of:
+                charge(LoanFineCharge, fines, FINE_SLOTS, fine_type='late_payment',
+                       amount=to_cents(installment.total_amount_due * LATE_FINE_RATE), charge_date=fine_date,
+                       reason=f'Installment due {installment.due_date} paid late')
+
+            paid_on = installment.due_date + timedelta(days=delay)
+            if delay == 0:
+                paid_on -= timedelta(days=rng.randrange(4))
+            amount = installment.total_amount_due + outstanding_charges()
+            if delay and rng.random() < 0.3:
+                # Part first, the rest (if it is in yet) on the day the installment is settled
+                part_on = installment.due_date + timedelta(days=delay // 2)
+                if part_on > as_of:
+                    continue
+                part = to_cents(amount * Decimal(rng.randint(30, 70)) / 100)
+                pay(installment, part_on, part)
+                amount -= part
+            if paid_on <= as_of:
+                pay(installment, paid_on, amount)
+
+        unpaid = [installment for installment in schedule if not installment.is_paid]
+        days_overdue = (as_of - unpaid[0].due_date).days if unpaid else 0
+        if days_overdue > DEFAULT_AFTER_DAYS:
+            charge(LoanFineCharge, fines, FINE_SLOTS, fine_type='default',
+                   amount=to_cents(sum(installment.total_amount_due for installment in unpaid) * DEFAULT_FINE_RATE),
+                   charge_date=unpaid[0].due_date + timedelta(days=DEFAULT_AFTER_DAYS),
+                   reason='Loan in default')
+
+        if not unpaid:
+            loan.status = 'closed'
+        elif days_overdue > DEFAULT_AFTER_DAYS:
+            loan.status = 'defaulted'
+        elif days_overdue > 30:
+            loan.status = 'delinquent'
+        else:
+            loan.status = 'active'
+
+        # The running totals, as update_loan_balances() would compute them
+        for bucket, (charged_field, paid_field) in Loan.ALLOCATION_BUCKETS.items():
+            if bucket != 'principal':
+                setattr(loan, charged_field, counters[charged_field])
+            setattr(loan, paid_field, counters[paid_field])
+        loan.total_amount_paid = sum(repayment.amount_paid for repayment in repayments)
+        loan.current_balance = loan.total_loan_amount - loan.total_amount_paid
+
+        self.fees += fees
+        self.fines += fines
+        self.repayments += repayments
+
+    def save(self):
+        with transaction.atomic():
+            for rows in (self.clients, self.loans, self.schedules, self.fees, self.fines, self.repayments):
+                if rows:
+                    type(rows[0]).objects.bulk_create(rows, batch_size=DEFAULT_BATCH_SIZE)
+
+    def counts(self):
+        return {
+            'clients': len(self.clients),
+            'loans': len(self.loans),
+            'schedules': len(self.schedules),
+            'fees': len(self.fees),
+            'fines': len(self.fines),
+            'repayments': len(self.repayments),
+        }
+
+
+def generate_batch(start, stop, bases, officer_ids, seed, as_of, method=None):
+    """Generate and save clients ``start`` to ``stop`` (exclusive); returns row counts"""
+    rng = random.Random(f'{seed}:{start}')
+    officers = get_user_model().objects.in_bulk(officer_ids)
+    batch = _Batch(bases, as_of, method or getattr(settings, 'LOAN_INTEREST_METHOD', 'flat'))
+    for number in range(start, stop):
+        batch.add_client(rng, number, officers[officer_ids[number // CLIENTS_PER_OFFICER % len(officer_ids)]])
+    batch.save()
+    return batch.counts()
+
+
+def finish_generation(officer_ids, as_of):
+    """Bring derived data up to date once every batch is in.
+
+    Rows were created with explicit ids, so backends with sequences get
+    them moved past the new rows. Aging is rebuilt and the cached client
+    counters are dropped so they are recounted.
+    """
+    statements = connection.ops.sequence_reset_sql(no_style(), _MODELS)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+    PortfolioAgingSummary.refresh_all(as_of=as_of)
+    invalidate_counters(officer_ids)
@@ -0,0 +1,76 @@
+"""
+Loan list and detail rows.
+
+Every row is read in one query, whatever the page size. The client's name
+and officer come from a join, the next unpaid installment from correlated
+subqueries, and balances from the running totals kept on the loan.
+Rows are values() dicts shaped for ORJSONRenderer (see clients/listing.py).
+"""
+from django.db.models import CharField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Trim
+from django.utils import timezone
+
+from .calculations import to_cents
+from .models import Loan, LoanRepaymentSchedule
+
+LOAN_LIST_FIELDS = [
+    'id', 'client', 'loan_type', 'status', 'principal_amount', 'interest_rate',
+    'loan_terms', 'repayment_frequency', 'total_loan_amount', 'total_amount_paid',
+    'application_date', 'start_date', 'due_date',
+]
+LOAN_DETAIL_FIELDS = LOAN_LIST_FIELDS + [
+    'loan_purpose', 'approval_date', 'processing_fee', 'insurance_fee', 'other_fees',
+    'total_fees_charged', 'total_interest_charged', 'total_fines_charged',
+    'total_principal_paid', 'total_interest_paid', 'total_fees_paid', 'total_fines_paid',
+    'collateral_description', 'collateral_value',
+    'guarantor_name', 'guarantor_contact', 'guarantor_id_ref',
+]
+_ANNOTATED_FIELDS = [
+    'client_name', 'credit_officer', 'outstanding_balance',
+    'next_installment_id', 'next_installment_due_date', 'next_installment_amount',
+]
+
+
+def annotated_loans(queryset=None):
+    """Loans annotated with client name, officer, balance and next unpaid installment"""
+    queryset = Loan.objects.all() if queryset is None else queryset
+    next_unpaid = LoanRepaymentSchedule.objects.filter(
+        loan=OuterRef('pk'), is_paid=False
+    ).order_by('due_date', 'pk')
+    return queryset.annotate(
+        # Client.full_name is only set on save, so build it in SQL
+        client_name=Trim(Concat(
+            'client__first_name', Value(' '), Coalesce('client__other_names', Value('')),
+            output_field=CharField(),
+        )),
+        credit_officer=F('client__credit_officer'),
+        outstanding_balance=F('current_balance'),
+        next_installment_id=Subquery(next_unpaid.values('pk')[:1]),
+        next_installment_due_date=Subquery(next_unpaid.values('due_date')[:1]),
+        next_installment_amount=Subquery(next_unpaid.values('total_amount_due')[:1]),
+    )
+
+
+def loan_rows(queryset, fields=LOAN_LIST_FIELDS):
+    return annotated_loans(queryset).values(*fields, *_ANNOTATED_FIELDS)
+
+
+def encode_loan_row(row, as_of=None):
+    """Nest the next installment and add days overdue to a loan_rows() dict"""
+    as_of = as_of or timezone.now().date()
+    installment_id = row.pop('next_installment_id')
+    due_date = row.pop('next_installment_due_date')
+    amount = row.pop('next_installment_amount')
+
+    row['next_installment'] = None
+    row['days_overdue'] = 0
+    if installment_id is not None:
+        # Subquery values skip the column's scale on SQLite
+        row['next_installment'] = {'id': installment_id, 'due_date': due_date, 'amount_due': to_cents(amount)}
+        row['days_overdue'] = max((as_of - due_date).days, 0)
+    return row
+
+
+def encode_loan_rows(rows, as_of=None):
+    as_of = as_of or timezone.now().date()
+    return [encode_loan_row(row, as_of) for row in rows]
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from loans.query_plans import DEFAULT_MIN_ROWS, check_query_plans
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the queries behind each API endpoint and fail on full table scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', nargs='+', help="Check only these cases")
+        parser.add_argument('--min-rows', type=int, default=DEFAULT_MIN_ROWS,
+                            help="Ignore scans of tables smaller than this (optimizers scan them on purpose)")
+        parser.add_argument('--show-plans', action='store_true', help="Print the plan of every finding")
+
+    def handle(self, *args, **options):
+        failed = []
+        try:
+            for name, checked, findings in check_query_plans(options['only'], options['min_rows']):
+                if not findings:
+                    self.stdout.write(f"ok    {name} ({checked} statements)")
+                    continue
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f"FAIL  {name} ({checked} statements)"))
+                for table, rows, sql, plan in findings:
+                    size = f"{rows} rows" if rows is not None else "size unknown"
+                    self.stdout.write(f"      full scan of {table} ({size}): {sql[:200]}")
+                    if options['show_plans']:
+                        self.stdout.write(f"      {plan}")
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if failed:
+            raise CommandError(f"Full table scans in {len(failed)} cases: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS("No full table scans"))
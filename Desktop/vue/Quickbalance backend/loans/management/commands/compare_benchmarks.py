@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from loans.benchmarks import compare_results
+
+
+class Command(BaseCommand):
+    help = "Compare two run_benchmarks result files and fail on median regressions beyond a threshold"
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline', help="Earlier results file")
+        parser.add_argument('current', help="Newer results file")
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help="Percent slowdown of the median that counts as a regression")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+            with open(options['current']) as handle:
+                current = json.load(handle)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read results: {e}")
+
+        if baseline.get('meta', {}).get('vendor') != current.get('meta', {}).get('vendor'):
+            self.stdout.write(self.style.WARNING("Results come from different database backends"))
+
+        rows = compare_results(baseline, current, options['threshold'])
+        regressions = 0
+        for size, name, before, after, change, regressed in rows:
+            line = f"{size:>9} {name:<26} {before:>9.2f} -> {after:>9.2f} ms  {change:+7.1f}%"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + "  REGRESSION"))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{regressions} case(s) slower than the {options['threshold']}% threshold")
+        self.stdout.write(self.style.SUCCESS(f"No regressions across {len(rows)} case(s)"))
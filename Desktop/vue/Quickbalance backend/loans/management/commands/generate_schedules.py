@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from loans.calculations import INTEREST_METHODS
+from loans.models import Loan, LoanRepaymentSchedule, PortfolioAgingSummary
+
+DEFAULT_STATUSES = ['approved', 'disbursed', 'active', 'Renewal']
+SCHEDULE_FIELDS = [
+    'principal_amount', 'interest_rate', 'loan_terms', 'repayment_frequency',
+    'start_date', 'application_date',
+]
+
+
+class Command(BaseCommand):
+    help = "Generate repayment schedules in bulk for loans that have none, or rebuild untouched ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loan', type=int, action='append', dest='loan_ids', help="Only this loan (repeatable)")
+        parser.add_argument('--status', action='append', dest='statuses', help="Loan status to include (repeatable)")
+        parser.add_argument('--method', choices=INTEREST_METHODS, help="Interest method (defaults to settings)")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Also replace existing schedules that have no paid installments")
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        loans = Loan.objects.filter(status__in=options['statuses'] or DEFAULT_STATUSES)
+        if options['loan_ids']:
+            loans = loans.filter(pk__in=options['loan_ids'])
+        if options['rebuild']:
+            # Loans with paid installments keep their schedule; a fresh plan
+            # from the start date would duplicate what was already paid
+            loans = loans.exclude(repayment_schedule__is_paid=True)
+        else:
+            loans = loans.filter(repayment_schedule__isnull=True)
+
+        loan_ids = list(loans.order_by('pk').values_list('pk', flat=True).distinct())
+        if not loan_ids:
+            self.stdout.write("No loans need a schedule")
+            return
+
+        chunk_size = options['chunk_size']
+        if chunk_size <= 0:
+            raise CommandError("--chunk-size must be positive")
+
+        created = 0
+        for start in range(0, len(loan_ids), chunk_size):
+            chunk = loan_ids[start:start + chunk_size]
+            installments = []
+            for loan in Loan.objects.filter(pk__in=chunk).only(*SCHEDULE_FIELDS):
+                try:
+                    installments += loan.build_repayment_schedule(method=options['method'])
+                except ValueError as e:
+                    self.stderr.write(f"Loan #{loan.pk} skipped: {e}")
+
+            with transaction.atomic():
+                LoanRepaymentSchedule.objects.filter(loan_id__in=chunk, is_paid=False).delete()
+                LoanRepaymentSchedule.objects.bulk_create(installments, batch_size=1000)
+                Loan.bump_versions(chunk)
+                PortfolioAgingSummary.refresh_loans(chunk)
+            created += len(installments)
+            self.stdout.write(f"{min(start + chunk_size, len(loan_ids))}/{len(loan_ids)} loans scheduled")
+
+        self.stdout.write(self.style.SUCCESS(f"Created {created} installments for {len(loan_ids)} loans"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from loans.bulk import (
+    DEFAULT_CHUNK_SIZE, IMPORT_FORMATS, ingest_repayments, parse_repayment_rows, validate_repayment_rows
+)
+
+
+class Command(BaseCommand):
+    help = "Import a CSV or JSON batch of loan repayments (e.g. a mobile money or bank settlement file)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to the settlement file")
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="File format (defaults to the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Validate the file without posting anything")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt not in IMPORT_FORMATS:
+            raise CommandError(f"Cannot tell the format of {path}, pass --format")
+
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                rows = parse_repayment_rows(stream, fmt)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {path}: {e}")
+
+        valid_rows, errors = validate_repayment_rows(rows)
+        for error in errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        if errors:
+            raise CommandError(f"{len(errors)} of {len(rows)} rows are invalid, nothing was imported")
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{len(rows)} rows are valid"))
+            return
+
+        def progress(summary):
+            self.stdout.write(f"{summary['processed']}/{summary['total']} rows processed")
+
+        summary = ingest_repayments(valid_rows, chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['created']} repayments across {summary['loans_updated']} loan updates, "
+            f"skipped {summary['duplicates']} duplicate receipts"
+        ))
@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from loans.models import PortfolioAgingSummary
+
+
+class Command(BaseCommand):
+    help = "Move loans whose installments fell overdue into their new aging buckets (run nightly)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Age the portfolio as of this date (YYYY-MM-DD, defaults to today)")
+        parser.add_argument('--rebuild', action='store_true', help="Discard the summary and rebuild it from scratch")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            as_of = date.fromisoformat(options['date']) if options['date'] else timezone.now().date()
+        except ValueError:
+            raise CommandError("--date must be in YYYY-MM-DD format")
+        if options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size must be positive")
+
+        refreshed = PortfolioAgingSummary.refresh_all(
+            as_of=as_of, rebuild=options['rebuild'], chunk_size=options['chunk_size']
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Aged {refreshed} loans as of {as_of}"))
@@ -0,0 +1,64 @@
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from loans.models import Loan, LoanRenewal
+from loans.renewals import DEFAULT_CHUNK_SIZE, RENEWABLE_STATUSES, renew_loans
+
+
+class Command(BaseCommand):
+    help = "Renew many loans with the same terms (e.g. the annual rollover)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, nargs='+', help="Ids of the loans to renew")
+        parser.add_argument('--status', nargs='+', choices=RENEWABLE_STATUSES,
+                            help="Renew every loan in these statuses")
+        parser.add_argument('--due-before', help="Only loans maturing before this date (YYYY-MM-DD)")
+        parser.add_argument('--renewal-type', choices=[choice for choice, _ in LoanRenewal.RENEWAL_TYPE_CHOICES],
+                            default='full')
+        parser.add_argument('--date', help="Renewal date (YYYY-MM-DD, defaults to today)")
+        parser.add_argument('--rate', help="New interest rate for partial and extended renewals")
+        parser.add_argument('--term', type=int, help="New term for partial and extended renewals")
+        parser.add_argument('--reason', required=True)
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if not (options['loans'] or options['status'] or options['due_before']):
+            raise CommandError("Pass --loans, --status or --due-before")
+        if options['chunk_size'] <= 0 or (options['term'] is not None and options['term'] <= 0):
+            raise CommandError("--chunk-size and --term must be positive")
+        try:
+            renewal_date = date.fromisoformat(options['date']) if options['date'] else None
+            due_before = date.fromisoformat(options['due_before']) if options['due_before'] else None
+            rate = Decimal(options['rate']) if options['rate'] else None
+        except (ValueError, InvalidOperation):
+            raise CommandError("Dates must be YYYY-MM-DD and --rate a number")
+
+        # Explicit ids go through as given, so unknown or closed ones are reported
+        loan_ids = options['loans']
+        if options['status'] or due_before:
+            loans = Loan.objects.all()
+            if loan_ids:
+                loans = loans.filter(pk__in=loan_ids)
+            if options['status']:
+                loans = loans.filter(status__in=options['status'])
+            if due_before:
+                loans = loans.filter(due_date__lt=due_before)
+            loan_ids = list(loans.values_list('pk', flat=True))
+
+        def progress(summary):
+            self.stdout.write(f"{summary['processed']}/{summary['total']} loans processed, {summary['renewed']} renewed")
+
+        started = time.monotonic()
+        summary = renew_loans(
+            loan_ids, renewal_type=options['renewal_type'], renewal_date=renewal_date, new_interest_rate=rate,
+            new_loan_term=options['term'], reason=options['reason'], chunk_size=options['chunk_size'],
+            progress=progress,
+        )
+        elapsed = time.monotonic() - started
+
+        for reason in ('locked', 'not_renewable', 'not_found'):
+            if summary[reason]:
+                self.stdout.write(f"Skipped ({reason.replace('_', ' ')}): {summary[reason]}")
+        self.stdout.write(self.style.SUCCESS(f"Renewed {summary['renewed']} loans in {elapsed:.1f}s"))
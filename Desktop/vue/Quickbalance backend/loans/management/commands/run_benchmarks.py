@@ -0,0 +1,93 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from loans.benchmarks import CASE_COMPARISONS, DEFAULT_REPEAT, DEFAULT_SIZES, compare_cases, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Time the hot paths on a throwaway database seeded to each size and save the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                            help="Comma-separated client counts to seed and benchmark")
+        parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Timed runs per case")
+        parser.add_argument('--only', help="Comma-separated case names to run (default: all)")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the generated data")
+        parser.add_argument('--output', help="Results file (default: benchmark-<vendor>-<timestamp>.json)")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Keep the seeded test database for the next run (seeding 1M clients is slow)")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers")
+        if not sizes or min(sizes) <= 0 or options['repeat'] <= 0:
+            raise CommandError("--sizes and --repeat must be positive")
+        only = set(options['only'].split(',')) if options['only'] else None
+
+        started = timezone.now()
+        output = options['output'] or f"benchmark-{connection.vendor}-{started:%Y%m%d-%H%M%S}.json"
+
+        # Never touch the real database: benchmark a test database built
+        # from the models (as the test runner would) and drop it afterwards
+        connection.settings_dict.setdefault('TEST', {})['MIGRATE'] = False
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = run_benchmarks(
+                sizes, options['repeat'], only, options['seed'],
+                seeded=self._seeded,
+                timed=self._report,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        document = {
+            'meta': {
+                'created_at': started.isoformat(),
+                'vendor': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'sizes': sizes,
+                'repeat': options['repeat'],
+                'seed': options['seed'],
+            },
+            'results': results,
+            'comparisons': [
+                dict(zip(['size', 'name', 'baseline_ms', 'candidate_ms', 'ratio', 'goal_met'], row))
+                for row in compare_cases(results)
+            ],
+        }
+        self._report_comparisons(document['comparisons'])
+        with open(output, 'w') as handle:
+            json.dump(document, handle, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    def _seeded(self, count):
+        self._seeding = True
+        self.stdout.write(f"  seeded {count} clients", ending='\r')
+        self.stdout.flush()
+
+    def _report(self, size, name, result):
+        if getattr(self, '_seeding', False):
+            self._seeding = False
+            self.stdout.write('')
+        self.stdout.write(
+            f"{size:>9} {name:<30} median {result['median_ms']:>9.2f} ms  "
+            f"p95 {result['p95_ms']:>9.2f} ms  {result['queries']:>3} queries"
+        )
+
+    def _report_comparisons(self, comparisons):
+        goals = {name: goal for name, _, _, goal in CASE_COMPARISONS}
+        for row in comparisons:
+            line = (
+                f"{row['size']:>9} {row['name']:<30} {row['baseline_ms']:>9.2f} -> {row['candidate_ms']:>9.2f} ms  "
+                f"x{row['ratio']:.3f} (goal x{goals[row['name']]})"
+            )
+            self.stdout.write(line if row['goal_met'] else self.style.WARNING(line + "  GOAL MISSED"))
@@ -0,0 +1,68 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from loans.stress import DEFAULT_PAYMENTS, DEFAULT_THREADS, SCENARIOS, run_stress
+
+
+class Command(BaseCommand):
+    help = "Post repayments from many threads at once and check throughput and that no payment is lost"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', default=','.join(map(str, DEFAULT_THREADS)),
+                            help="Comma-separated thread counts to run")
+        parser.add_argument('--payments', type=int, default=DEFAULT_PAYMENTS, help="Repayments per thread")
+        parser.add_argument('--scenario', choices=SCENARIOS, action='append',
+                            help="Run only this scenario (repeatable; default: all)")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the generated loans")
+
+    def handle(self, *args, **options):
+        try:
+            thread_counts = [int(threads) for threads in options['threads'].split(',') if threads]
+        except ValueError:
+            raise CommandError("--threads must be comma-separated integers")
+        if not thread_counts or min(thread_counts) <= 0 or options['payments'] <= 0:
+            raise CommandError("--threads and --payments must be positive")
+
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        test_settings['MIGRATE'] = False
+        if connection.vendor == 'sqlite':
+            self.stdout.write("SQLite allows a single writer; expect no scaling across loans")
+            # Writers queue for the lock up front instead of failing on the
+            # read-to-write upgrade when two of them collide
+            connection.settings_dict['OPTIONS'].setdefault('transaction_mode', 'IMMEDIATE')
+            if not test_settings.get('NAME'):
+                # Threads need a database file they can all open, not a private in-memory one
+                test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'stress_repayments.sqlite3')
+
+        self._baselines = {}
+        # Never touch the real database (see run_benchmarks)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = run_stress(
+                thread_counts, options['payments'], options['scenario'] or SCENARIOS, options['seed'],
+                progress=self._report,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        failed = [result for result in results if result['mismatches']]
+        for result in failed:
+            for loan_id, field, stored, expected in result['mismatches']:
+                self.stderr.write(
+                    f"{result['scenario']} x{result['threads']}: loan {loan_id} {field} is {stored}, expected {expected}"
+                )
+        if failed:
+            raise CommandError("Concurrent postings left inconsistent totals")
+        self.stdout.write(self.style.SUCCESS("All totals match the payments posted"))
+
+    def _report(self, result):
+        # Scaling is measured against the smallest thread count of the scenario
+        baseline = self._baselines.setdefault(result['scenario'], result)
+        scaling = result['per_second'] / baseline['per_second']
+        self.stdout.write(
+            f"{result['scenario']:<16} {result['threads']:>3} threads {result['payments']:>7} payments "
+            f"{result['per_second']:>9.1f}/s  x{scaling:.2f} vs {baseline['threads']} thread(s)  "
+            f"{'ok' if not result['mismatches'] else 'TOTALS WRONG'}"
+        )
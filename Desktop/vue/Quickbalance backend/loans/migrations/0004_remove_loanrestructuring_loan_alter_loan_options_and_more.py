@@ -0,0 +1,356 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:55
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+import loans.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_alter_client_date_of_birth'),
+        ('loans', '0003_remove_loan_created_at'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='loanrestructuring',
+            name='loan',
+        ),
+        migrations.AlterModelOptions(
+            name='loan',
+            options={'ordering': ['-application_date']},
+        ),
+        migrations.AlterModelOptions(
+            name='loanrepaymentschedule',
+            options={'ordering': ['due_date']},
+        ),
+        migrations.RemoveField(
+            model_name='loan',
+            name='amount_given',
+        ),
+        migrations.RemoveField(
+            model_name='loan',
+            name='amount_paid',
+        ),
+        migrations.RemoveField(
+            model_name='loan',
+            name='balance',
+        ),
+        migrations.RemoveField(
+            model_name='loan',
+            name='collateral_ownership_proof',
+        ),
+        migrations.RemoveField(
+            model_name='loan',
+            name='collateral_type',
+        ),
+        migrations.RemoveField(
+            model_name='loan',
+            name='guarantor_id_number',
+        ),
+        migrations.RemoveField(
+            model_name='loan',
+            name='loan_amount_requested',
+        ),
+        migrations.RemoveField(
+            model_name='loan',
+            name='loan_term',
+        ),
+        migrations.RemoveField(
+            model_name='loan',
+            name='total_amount',
+        ),
+        migrations.RemoveField(
+            model_name='loanclosure',
+            name='remarks',
+        ),
+        migrations.RemoveField(
+            model_name='loanclosure',
+            name='settlement_date',
+        ),
+        migrations.RemoveField(
+            model_name='loanrepayment',
+            name='penalty_applied',
+        ),
+        migrations.RemoveField(
+            model_name='loanrepaymentschedule',
+            name='amount_due',
+        ),
+        migrations.RemoveField(
+            model_name='loanrepaymentschedule',
+            name='installment_number',
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='application_date',
+            field=models.DateField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='approval_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='collateral_description',
+            field=models.TextField(blank=True, help_text='Description of collateral provided'),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='current_balance',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='guarantor_id_ref',
+            field=models.CharField(blank=True, help_text='ID number or reference for guarantor', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='insurance_fee',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='loan_terms',
+            field=models.PositiveIntegerField(default=1, help_text='Loan term period'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='other_fees',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='principal_amount',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Original loan amount before fees/interest', max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='processing_fee',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending Approval'), ('approved', 'Approved'), ('disbursed', 'Disbursed'), ('Renewal', 'Renewal'), ('active', 'Active'), ('delinquent', 'Delinquent'), ('restructured', 'Restructured'), ('closed', 'Closed'), ('defaulted', 'Defaulted')], default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='total_amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='total_fees_charged',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='total_fines_charged',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='total_interest_charged',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='total_loan_amount',
+            field=models.DecimalField(decimal_places=2, default=0.0, help_text='Principal + interest', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loanclosure',
+            name='closure_date',
+            field=models.DateField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='loanclosure',
+            name='final_settlement_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='loanclosure',
+            name='notes',
+            field=models.TextField(blank=True, help_text='Closure notes or comments'),
+        ),
+        migrations.AddField(
+            model_name='loanclosure',
+            name='settlement_type',
+            field=models.CharField(choices=[('full', 'Full Settlement'), ('partial', 'Partial Settlement'), ('write_off', 'Write Off')], default='full', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='loanrepayment',
+            name='fees_paid',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='loanrepayment',
+            name='fines_paid',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='loanrepayment',
+            name='interest_paid',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='loanrepayment',
+            name='notes',
+            field=models.TextField(blank=True, help_text='Any notes about this payment'),
+        ),
+        migrations.AddField(
+            model_name='loanrepayment',
+            name='principal_paid',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='loanrepayment',
+            name='receipt_number',
+            field=models.CharField(blank=True, help_text='Payment receipt reference', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='loanrepaymentschedule',
+            name='fees_amount',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loanrepaymentschedule',
+            name='interest_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='loanrepaymentschedule',
+            name='principal_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='loanrepaymentschedule',
+            name='total_amount_due',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='client',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='loans', to='clients.client'),
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='collateral_value',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Estimated value of collateral', max_digits=12, null=True, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='due_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='guarantor_contact',
+            field=models.CharField(blank=True, default='', max_length=50),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='guarantor_name',
+            field=models.CharField(blank=True, default='', max_length=200),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='interest_rate',
+            field=models.DecimalField(decimal_places=2, help_text='percentage rate (%)', max_digits=5, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='loan_purpose',
+            field=models.TextField(blank=True, default=''),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='loan_type',
+            field=models.CharField(choices=[('personal', 'Personal Loan'), ('business', 'Business Loan'), ('mortgage', 'Mortgage'), ('school_fees', 'School Fees Loan'), ('emergency', 'Emergency loan'), ('other', 'Other')], max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='start_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='loanrepayment',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='loanrepayment',
+            name='loan',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='repayments', to='loans.loan'),
+        ),
+        migrations.AlterField(
+            model_name='loanrepayment',
+            name='payment_mode',
+            field=models.CharField(choices=[('cash', 'Cash'), ('MOMO', ' MOMO Cash'), ('bank', 'Bank Transfer'), ('mobile_money', 'Mobile Money')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='LoanFeeCharge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fee_type', models.CharField(choices=[('processing', 'Processing Fee'), ('insurance', 'Insurance Fee'), ('service', 'Service Fee'), ('other', 'Other Fee')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0)])),
+                ('charge_date', models.DateField(default=django.utils.timezone.now)),
+                ('description', models.TextField(blank=True)),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_charges', to='loans.loan')),
+            ],
+            bases=(loans.models.LoanBalanceMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='LoanFineCharge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fine_type', models.CharField(choices=[('late_payment', 'Late Payment Fine'), ('default', 'Default Fine'), ('other', 'Other Fine')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0)])),
+                ('charge_date', models.DateField(default=django.utils.timezone.now)),
+                ('reason', models.TextField(blank=True)),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fine_charges', to='loans.loan')),
+            ],
+            bases=(loans.models.LoanBalanceMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='LoanRenewal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('renewal_date', models.DateField(default=django.utils.timezone.now)),
+                ('renewal_type', models.CharField(choices=[('full', 'Full Renewal'), ('partial', 'Partial Renewal'), ('extended', 'Extended Term Only')], default='full', max_length=20)),
+                ('new_principal_amount', models.DecimalField(decimal_places=2, help_text='Principal amount for renewed loan (usually the outstanding balance)', max_digits=12, validators=[django.core.validators.MinValueValidator(0)])),
+                ('new_interest_rate', models.DecimalField(decimal_places=2, help_text='Interest rate for renewed loan period', max_digits=5)),
+                ('new_loan_term', models.PositiveIntegerField(help_text='Renewed loan term period')),
+                ('new_due_date', models.DateField(help_text='New due date after renewal')),
+                ('reason', models.TextField(help_text='Reason for renewal')),
+                ('terms_accepted', models.BooleanField(default=False, help_text='Client has accepted new terms')),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renewals', to='loans.loan')),
+            ],
+            options={
+                'verbose_name': 'Loan Renewal',
+                'verbose_name_plural': 'Loan Renewals',
+                'ordering': ['-renewal_date'],
+            },
+        ),
+        migrations.DeleteModel(
+            name='LoanDisbursement',
+        ),
+        migrations.DeleteModel(
+            name='LoanRestructuring',
+        ),
+    ]
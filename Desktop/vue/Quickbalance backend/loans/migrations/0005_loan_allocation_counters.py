@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:55
+
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_paid_counters(apps, schema_editor):
+    Loan = apps.get_model('loans', 'Loan')
+    LoanRepayment = apps.get_model('loans', 'LoanRepayment')
+
+    def paid(field):
+        total = (
+            LoanRepayment.objects.filter(loan=OuterRef('pk'))
+            .values('loan')
+            .annotate(total=Sum(field))
+            .values('total')
+        )
+        return Coalesce(Subquery(total), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+    Loan.objects.update(
+        total_principal_paid=paid('principal_paid'),
+        total_interest_paid=paid('interest_paid'),
+        total_fees_paid=paid('fees_paid'),
+        total_fines_paid=paid('fines_paid'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0004_remove_loanrestructuring_loan_alter_loan_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='total_fees_paid',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='total_fines_paid',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='total_interest_paid',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='total_principal_paid',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_paid_counters, migrations.RunPython.noop),
+    ]
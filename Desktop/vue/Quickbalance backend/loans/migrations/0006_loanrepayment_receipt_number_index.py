@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0005_loan_allocation_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loanrepayment',
+            name='receipt_number',
+            field=models.CharField(blank=True, db_index=True, help_text='Payment receipt reference', max_length=50),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0006_loanrepayment_receipt_number_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='interest_accrued_through',
+            field=models.DateField(blank=True, help_text='Date up to which daily interest has been accrued', null=True),
+        ),
+    ]
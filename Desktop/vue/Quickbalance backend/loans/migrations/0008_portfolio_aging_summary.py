@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0007_loan_interest_accrued_through'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanAgingState',
+            fields=[
+                ('loan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='aging_state', serialize=False, to='loans.loan')),
+                ('loan_type', models.CharField(max_length=50)),
+                ('status', models.CharField(max_length=20)),
+                ('credit_officer_id', models.BigIntegerField(blank=True, null=True)),
+                ('bucket', models.CharField(choices=[('current', 'Current'), ('1_30', '1-30 days'), ('31_60', '31-60 days'), ('61_90', '61-90 days'), ('over_90', 'Over 90 days')], max_length=10)),
+                ('outstanding_balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('oldest_unpaid_due_date', models.DateField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PortfolioAgingSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('loan_type', models.CharField(choices=[('personal', 'Personal Loan'), ('business', 'Business Loan'), ('mortgage', 'Mortgage'), ('school_fees', 'School Fees Loan'), ('emergency', 'Emergency loan'), ('other', 'Other')], max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending Approval'), ('approved', 'Approved'), ('disbursed', 'Disbursed'), ('Renewal', 'Renewal'), ('active', 'Active'), ('delinquent', 'Delinquent'), ('restructured', 'Restructured'), ('closed', 'Closed'), ('defaulted', 'Defaulted')], max_length=20)),
+                ('bucket', models.CharField(choices=[('current', 'Current'), ('1_30', '1-30 days'), ('31_60', '31-60 days'), ('61_90', '61-90 days'), ('over_90', 'Over 90 days')], max_length=10)),
+                ('loan_count', models.IntegerField(default=0)),
+                ('outstanding_balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=16)),
+                ('credit_officer', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['loan_type', 'status', 'credit_officer', 'bucket'], name='loans_portf_loan_ty_861330_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0006_client_officer_created_index'),
+        ('loans', '0008_portfolio_aging_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['status', 'due_date'], name='loans_loan_status_196efd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['application_date', 'id'], name='loans_loan_applica_99006c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanfeecharge',
+            index=models.Index(fields=['loan', 'charge_date'], name='loans_loanf_loan_id_33ae11_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanfinecharge',
+            index=models.Index(fields=['loan', 'charge_date'], name='loans_loanf_loan_id_6a314a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanrepayment',
+            index=models.Index(fields=['loan', 'payment_date'], name='loans_loanr_loan_id_10bc77_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanrepaymentschedule',
+            index=models.Index(fields=['loan', 'is_paid', 'due_date'], name='loans_loanr_loan_id_9bf200_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:05
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    # Concurrent refreshes could insert the same key twice; fold each
+    # repeated key into its oldest row before the constraint is added
+    PortfolioAgingSummary = apps.get_model('loans', 'PortfolioAgingSummary')
+    key = ['loan_type', 'status', 'credit_officer', 'bucket']
+    repeated = (
+        PortfolioAgingSummary.objects.values(*key)
+        .annotate(rows=Count('pk'), keep=Min('pk'), loan_count_total=Sum('loan_count'),
+                  balance_total=Sum('outstanding_balance'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for group in repeated:
+        rows = PortfolioAgingSummary.objects.filter(**{field: group[field] for field in key})
+        rows.filter(pk=group['keep']).update(
+            loan_count=group['loan_count_total'], outstanding_balance=group['balance_total'],
+        )
+        rows.exclude(pk=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0010_loan_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='portfolioagingsummary',
+            constraint=models.UniqueConstraint(models.F('loan_type'), models.F('status'), django.db.models.functions.comparison.Coalesce('credit_officer', models.Value(0)), models.F('bucket'), name='portfolio_aging_summary_key'),
+        ),
+    ]
@@ -1,9 +1,15 @@
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from clients.models import Client
-from datetime import timedelta
+from collections import defaultdict
+from datetime import datetime, timedelta
+from .calculations import amortization_schedule
+from .concurrency import run_with_retry
 
 class Loan(models.Model):
     LOAN_TYPE_CHOICES = [
@@ -32,6 +38,34 @@ class Loan(models.Model):
         ('closed', 'Closed'),
         ('defaulted', 'Defaulted'),
     ]
+
+    # Order in which a repayment settles outstanding buckets. Override per
+    # loan type with settings.LOAN_ALLOCATION_ORDER.
+    DEFAULT_ALLOCATION_ORDER = ['fines', 'fees', 'interest', 'principal']
+
+    # Bucket -> (charged field, paid field) counters kept on the loan
+    ALLOCATION_BUCKETS = {
+        'fines': ('total_fines_charged', 'total_fines_paid'),
+        'fees': ('total_fees_charged', 'total_fees_paid'),
+        'interest': ('total_interest_charged', 'total_interest_paid'),
+        'principal': ('principal_amount', 'total_principal_paid'),
+    }
+
+    # apply_balance_delta() argument -> running total it moves
+    BALANCE_DELTA_FIELDS = {
+        'paid': 'total_amount_paid',
+        'fees': 'total_fees_charged',
+        'fines': 'total_fines_charged',
+        'interest': 'total_interest_charged',
+        'principal_paid': 'total_principal_paid',
+        'interest_paid': 'total_interest_paid',
+        'fees_paid': 'total_fees_paid',
+        'fines_paid': 'total_fines_paid',
+    }
+
+    # Moved only by balance deltas and update_loan_balances(); a plain save()
+    # of a stale instance must not write them back over concurrent postings
+    RUNNING_TOTAL_FIELDS = [*BALANCE_DELTA_FIELDS.values(), 'current_balance']
     
     client = models.ForeignKey(Client, on_delete=models.PROTECT, related_name="loans")
     
@@ -107,6 +141,36 @@ class Loan(models.Model):
         default=0.00
     )
 
+    # Paid-to-date per allocation bucket (updated after each repayment)
+    total_principal_paid = models.DecimalField(
+        max_digits=12, 
+        decimal_places=2, 
+        default=0.00
+    )
+    total_interest_paid = models.DecimalField(
+        max_digits=12, 
+        decimal_places=2, 
+        default=0.00
+    )
+    total_fees_paid = models.DecimalField(
+        max_digits=12, 
+        decimal_places=2, 
+        default=0.00
+    )
+    total_fines_paid = models.DecimalField(
+        max_digits=12, 
+        decimal_places=2, 
+        default=0.00
+    )
+    interest_accrued_through = models.DateField(
+        blank=True, 
+        null=True,
+        help_text="Date up to which daily interest has been accrued"
+    )
+    # Bumped by every write to the loan, its balances or its schedule;
+    # detail and list ETags are built from it (config/etags.py)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
     # Collateral (optional)
     collateral_description = models.TextField(blank=True, help_text="Description of collateral provided")
     collateral_value = models.DecimalField(
@@ -134,6 +198,13 @@ class Loan(models.Model):
 
     class Meta:
         ordering = ['-application_date']
+        indexes = [
+            # Loan list filtered by status and maturity range; overdue and
+            # accrual runs select by status
+            models.Index(fields=['status', 'due_date']),
+            # Unfiltered loan list, newest applications first
+            models.Index(fields=['application_date', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.client.full_name} - {self.loan_type} Loan (${self.principal_amount})"
@@ -145,36 +216,337 @@ class Loan(models.Model):
         return self.principal_amount + interest_amount  , total_fees
 
     def update_loan_balances(self):
-        """Update all calculated balances based on transactions"""
-        # Get all related transactions
-        disbursements = self.disbursements.aggregate(total=models.Sum('amount'))['total'] or 0
-        repayments = self.repayments.aggregate(total=models.Sum('amount_paid'))['total'] or 0
+        """Recompute all calculated balances from the full transaction history.
+
+        Posting goes through apply_balance_delta(); this is only needed to
+        reconcile a loan whose running totals have drifted. The loan row is
+        locked first, so no posting lands between the sums and the write.
+        """
+        run_with_retry(self._reconcile_balances)
+
+    def _reconcile_balances(self):
+        self.total_loan_amount = (
+            Loan.objects.select_for_update().filter(pk=self.pk).values_list('total_loan_amount', flat=True).get()
+        )
+        repayments = self.repayments.aggregate(
+            total=models.Sum('amount_paid'),
+            principal=models.Sum('principal_paid'),
+            interest=models.Sum('interest_paid'),
+            fees=models.Sum('fees_paid'),
+            fines=models.Sum('fines_paid'),
+        )
         fees = self.fee_charges.aggregate(total=models.Sum('amount'))['total'] or 0
         fines = self.fine_charges.aggregate(total=models.Sum('amount'))['total'] or 0
         
         # Update fields
         self.total_fees_charged = fees
         self.total_fines_charged = fines
-        self.total_amount_paid = repayments
-        self.current_balance = self.total_loan_amount - repayments
+        self.total_amount_paid = repayments['total'] or 0
+        self.total_principal_paid = repayments['principal'] or 0
+        self.total_interest_paid = repayments['interest'] or 0
+        self.total_fees_paid = repayments['fees'] or 0
+        self.total_fines_paid = repayments['fines'] or 0
+        self.current_balance = self.total_loan_amount - self.total_amount_paid
         
         self.save(update_fields=[
             'total_fees_charged', 
             'total_fines_charged', 
             'total_amount_paid', 
+            'total_principal_paid',
+            'total_interest_paid',
+            'total_fees_paid',
+            'total_fines_paid',
             'current_balance'
         ])
 
+    @classmethod
+    def balance_delta_updates(cls, **deltas):
+        """Build the F() expressions that apply a transaction delta to a loan"""
+        updates = {}
+        for name, delta in deltas.items():
+            if delta:
+                field = cls.BALANCE_DELTA_FIELDS[name]
+                updates[field] = F(field) + delta
+        if deltas.get('paid'):
+            updates['current_balance'] = F('current_balance') - deltas['paid']
+        if updates:
+            updates['version'] = F('version') + 1
+        return updates
+
+    def apply_balance_delta(self, **deltas):
+        """Apply a transaction to the running balances with one atomic UPDATE.
+
+        Takes amounts keyed as in BALANCE_DELTA_FIELDS. Deltas may be
+        negative to reverse or correct an earlier posting.
+        """
+        updates = self.balance_delta_updates(**deltas)
+        if not updates:
+            return
+        Loan.objects.filter(pk=self.pk).update(**updates)
+        self.refresh_from_db(fields=list(updates))
+
+    @classmethod
+    def bump_versions(cls, loan_ids):
+        """Mark loans changed, for writes that do not go through the loan row (schedules)"""
+        cls.objects.filter(pk__in=loan_ids).update(version=F('version') + 1)
+
+    @classmethod
+    def get_allocation_order(cls, loan_type):
+        orders = getattr(settings, 'LOAN_ALLOCATION_ORDER', {})
+        return orders.get(loan_type) or orders.get('default') or cls.DEFAULT_ALLOCATION_ORDER
+
+    @classmethod
+    def allocation_counter_fields(cls):
+        fields = ['loan_type']
+        for charged_field, paid_field in cls.ALLOCATION_BUCKETS.values():
+            fields += [charged_field, paid_field]
+        return fields
+
+    @classmethod
+    def split_payment(cls, counters, amount, credit=None):
+        """Split a payment across the allocation buckets.
+
+        ``counters`` holds a loan's allocation_counter_fields() values.
+        ``credit`` holds amounts already allocated per bucket by the
+        repayment being re-allocated; they count as outstanding again.
+        Anything left over goes to principal.
+        """
+        credit = credit or {}
+        allocation = {bucket: Decimal('0') for bucket in cls.ALLOCATION_BUCKETS}
+        remaining = Decimal(str(amount))
+        for bucket in cls.get_allocation_order(counters['loan_type']):
+            if remaining <= 0:
+                break
+            charged_field, paid_field = cls.ALLOCATION_BUCKETS[bucket]
+            outstanding = counters[charged_field] - counters[paid_field] + credit.get(bucket, 0)
+            if outstanding > 0:
+                allocation[bucket] = min(remaining, outstanding)
+                remaining -= allocation[bucket]
+        allocation['principal'] += remaining
+        return allocation
+
+    @classmethod
+    def lock_counters(cls, loan_ids):
+        """Lock the loans and read their allocation counters, keyed by id.
+
+        Rows are locked in id order so concurrent postings touching several
+        loans cannot deadlock on each other. Must run inside a transaction;
+        the locks are held until it ends.
+        """
+        return {
+            row.pop('pk'): row
+            for row in cls.objects.select_for_update()
+            .filter(pk__in=loan_ids)
+            .order_by('pk')
+            .values('pk', *cls.allocation_counter_fields())
+        }
+
+    def allocate_payment(self, amount, credit=None):
+        """Split a payment using a single locked read of the loan's counters.
+
+        Must run inside a transaction so the lock is held until the
+        allocation has been posted.
+        """
+        counters = self.lock_counters([self.pk])[self.pk]
+        return self.split_payment(counters, amount, credit=credit)
+
+    def build_repayment_schedule(self, start_date=None, principal=None, interest_rate=None,
+                                 periods=None, method=None):
+        """Compute the installment plan in memory as unsaved schedule rows.
+
+        Defaults to the loan's own terms and repayment frequency; renewals
+        pass their new terms. ``method`` is 'flat' or 'declining' and
+        defaults to settings.LOAN_INTEREST_METHOD.
+        """
+        start_date = start_date or self.start_date or self.application_date
+        if isinstance(start_date, datetime):
+            start_date = start_date.date()
+        plan = amortization_schedule(
+            self.principal_amount if principal is None else principal,
+            self.interest_rate if interest_rate is None else interest_rate,
+            periods or self.loan_terms,
+            self.repayment_frequency,
+            start_date,
+            method=method or getattr(settings, 'LOAN_INTEREST_METHOD', 'flat'),
+        )
+        return [
+            LoanRepaymentSchedule(
+                loan=self,
+                due_date=installment['due_date'],
+                principal_amount=installment['principal'],
+                interest_amount=installment['interest'],
+                total_amount_due=installment['payment'],
+            )
+            for installment in plan
+        ]
+
+    def regenerate_repayment_schedule(self, **terms):
+        """Replace the unpaid installments with a freshly computed plan"""
+        installments = self.build_repayment_schedule(**terms)
+        with transaction.atomic():
+            self.repayment_schedule.filter(is_paid=False).delete()
+            installments = LoanRepaymentSchedule.objects.bulk_create(installments)
+            Loan.bump_versions([self.pk])
+            PortfolioAgingSummary.refresh_loans([self.pk])
+        return installments
+
     def save(self, *args, **kwargs):
+        updating = not self._state.adding and not kwargs.get('force_insert')
         # Calculate total loan amount if not set
         if not self.total_loan_amount or self.pk is None:
-            self.total_loan_amount = self.calculate_total_loan_amount()
+            self.total_loan_amount, _ = self.calculate_total_loan_amount()
             self.current_balance = self.total_loan_amount
-            
+        elif updating and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.RUNNING_TOTAL_FIELDS
+            ]
+        if updating:
+            # Incremented in SQL, so concurrent writes never share a version
+            self.version = F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+
         super().save(*args, **kwargs)
+        if updating:
+            self.refresh_from_db(fields=['version'])
+        PortfolioAgingSummary.refresh_loans([self.pk])
+
+
+class LoanPostingQuerySet(models.QuerySet):
+    """QuerySet for LoanBalanceMixin models.
+
+    delete() goes row by row through the model's delete(), so every
+    deleted row reverses its posting; a bulk DELETE would leave the loans'
+    running totals counting rows that no longer exist.
+    """
+
+    def delete(self):
+        if self.query.is_sliced:
+            raise TypeError("Cannot use 'limit' or 'offset' with delete().")
+        return run_with_retry(self._delete_rows, using=self.db)
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def _delete_rows(self):
+        deleted, per_model = 0, defaultdict(int)
+        # By loan, so the loan locks are taken in the same order everywhere
+        for row in self.order_by('loan_id', 'pk'):
+            count, counts = row.delete()
+            deleted += count
+            for label, label_count in counts.items():
+                per_model[label] += label_count
+        return deleted, dict(per_model)
+
+
+class LoanBalanceMixin:
+    """Posts a transaction row's amounts to its loan's running balances.
+
+    Subclasses map their amount fields to the apply_balance_delta() argument
+    each one feeds. Edits post the difference and deletes post a reversal,
+    so the cost does not depend on how many transactions the loan has.
+    Postings lock their loan rows first and are retried when they lose a
+    lock conflict (see concurrency.py). Use LoanPostingQuerySet as the
+    manager so queryset deletes reverse their postings too.
+    """
+    balance_fields = {}
+
+    # (loan_id, {delta name: amount}) as last written to the database
+    _posted = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'loan_id' in field_names and all(field in field_names for field in cls.balance_fields):
+            instance._posted = instance._balance_snapshot()
+        return instance
+
+    def _balance_snapshot(self):
+        return (self.loan_id, {
+            name: Decimal(str(getattr(self, field) or 0))
+            for field, name in self.balance_fields.items()
+        })
+
+    def _post_balance_delta(self, reverse=False):
+        posted = self._posted
+        current = None if reverse else self._balance_snapshot()
 
+        # Net the reversal of the old posting against the new one per loan
+        deltas = {}
+        if posted:
+            loan_deltas = deltas.setdefault(posted[0], {})
+            for name, amount in posted[1].items():
+                loan_deltas[name] = loan_deltas.get(name, 0) - amount
+        if current:
+            loan_deltas = deltas.setdefault(current[0], {})
+            for name, amount in current[1].items():
+                loan_deltas[name] = loan_deltas.get(name, 0) + amount
 
-class LoanFeeCharge(models.Model):
+        for loan_id, loan_deltas in deltas.items():
+            loan_deltas = {name: delta for name, delta in loan_deltas.items() if delta}
+            if not loan_deltas:
+                continue
+            if loan_id == self.loan_id:
+                self.loan.apply_balance_delta(**loan_deltas)
+            else:
+                Loan.objects.filter(pk=loan_id).update(**Loan.balance_delta_updates(**loan_deltas))
+        self._posted = current
+
+    def _load_posted(self):
+        """Read what a stored row posted when the instance did not load it.
+
+        Instances loaded with only()/defer(), or built with the pk of an
+        existing row, would otherwise post their full amounts again.
+        """
+        if self._posted is not None or self.pk is None:
+            return
+        stored = type(self)._base_manager.filter(pk=self.pk).values('loan_id', *self.balance_fields).first()
+        if stored is not None:
+            self._posted = (stored['loan_id'], {
+                name: Decimal(str(stored[field] or 0))
+                for field, name in self.balance_fields.items()
+            })
+
+    def _lock_loans(self):
+        """Lock the loan(s) this row posts to, before the row itself is written.
+
+        Taking the loan lock first stops the row's foreign key check from
+        deadlocking against a concurrent posting to the same loan.
+        """
+        self._load_posted()
+        loan_ids = {self.loan_id}
+        if self._posted:
+            loan_ids.add(self._posted[0])
+        return Loan.lock_counters(loan_ids)
+
+    def _retry_reset(self):
+        """Undo, before a retry, what a rolled-back attempt changed in memory"""
+        initial = (self.pk, self._state.adding, self._posted)
+
+        def reset():
+            self.pk, self._state.adding, self._posted = initial
+        return reset
+
+    def delete(self, *args, **kwargs):
+        return run_with_retry(self._reverse, *args, reset=self._retry_reset(), **kwargs)
+
+    def _reverse(self, *args, **kwargs):
+        # The follow-up may need fields that cannot be loaded once the row is gone
+        deferred = self.get_deferred_fields()
+        if deferred:
+            self.refresh_from_db(fields=deferred)
+        loan_ids = list(self._lock_loans())
+        result = super().delete(*args, **kwargs)
+        self._post_balance_delta(reverse=True)
+        self._after_posting(loan_ids)
+        return result
+
+    def _after_posting(self, loan_ids):
+        """Follow-up once a save or delete has been posted to ``loan_ids``"""
+
+
+class LoanFeeCharge(LoanBalanceMixin, models.Model):
     FEE_TYPE_CHOICES = [
         ('processing', 'Processing Fee'),
         ('insurance', 'Insurance Fee'),
@@ -182,38 +554,66 @@ class LoanFeeCharge(models.Model):
         ('other', 'Other Fee'),
     ]
     
+    balance_fields = {'amount': 'fees'}
+
     loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name="fee_charges")
     fee_type = models.CharField(max_length=20, choices=FEE_TYPE_CHOICES)
     amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
     charge_date = models.DateField(default=timezone.now)
     description = models.TextField(blank=True)
+
+    objects = LoanPostingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # A loan's charges in date order (statements)
+            models.Index(fields=['loan', 'charge_date']),
+        ]
     
     def save(self, *args, **kwargs):
+        run_with_retry(self._post, *args, reset=self._retry_reset(), **kwargs)
+
+    def _post(self, *args, **kwargs):
+        self._lock_loans()
         super().save(*args, **kwargs)
-        # Update loan balances after fee charge
-        self.loan.update_loan_balances()
+        # Post the fee (or the change to it) to the loan balances
+        self._post_balance_delta()
     
     def __str__(self):
         return f"{self.fee_type} fee of ${self.amount} for Loan #{self.loan.id}"
 
 
-class LoanFineCharge(models.Model):
+class LoanFineCharge(LoanBalanceMixin, models.Model):
     FINE_TYPE_CHOICES = [
         ('late_payment', 'Late Payment Fine'),
         ('default', 'Default Fine'),
         ('other', 'Other Fine'),
     ]
     
+    balance_fields = {'amount': 'fines'}
+
     loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name="fine_charges")
     fine_type = models.CharField(max_length=20, choices=FINE_TYPE_CHOICES)
     amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
     charge_date = models.DateField(default=timezone.now)
     reason = models.TextField(blank=True)
+
+    objects = LoanPostingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # A loan's charges in date order (statements)
+            models.Index(fields=['loan', 'charge_date']),
+        ]
     
     def save(self, *args, **kwargs):
+        run_with_retry(self._post, *args, reset=self._retry_reset(), **kwargs)
+
+    def _post(self, *args, **kwargs):
+        self._lock_loans()
         super().save(*args, **kwargs)
-        # Update loan balances after fine charge
-        self.loan.update_loan_balances()
+        # Post the fine (or the change to it) to the loan balances
+        self._post_balance_delta()
     
     def __str__(self):
         return f"{self.fine_type} fine of ${self.amount} for Loan #{self.loan.id}"
@@ -230,6 +630,10 @@ class LoanRepaymentSchedule(models.Model):
     
     class Meta:
         ordering = ['due_date']
+        indexes = [
+            # Next / oldest unpaid installment of a loan (loan list, aging)
+            models.Index(fields=['loan', 'is_paid', 'due_date']),
+        ]
 
     def save(self, *args, **kwargs):
         # Calculate total amount due
@@ -240,14 +644,20 @@ class LoanRepaymentSchedule(models.Model):
     def __str__(self):
         return f"Payment due {self.due_date} for Loan #{self.loan.id}"
 
-    def update_payment_status(self):
+    def update_payment_status(self, refresh_aging=True):
         """Update is_paid status based on actual payments"""
         total_paid = self.payments.aggregate(total=models.Sum('amount_paid'))['total'] or 0
+        was_paid = self.is_paid
         self.is_paid = total_paid >= self.total_amount_due
-        self.save()
+        self.save(update_fields=['is_paid'])
+        if self.is_paid != was_paid:
+            # The loan's next installment moved
+            Loan.bump_versions([self.loan_id])
+            if refresh_aging:
+                PortfolioAgingSummary.refresh_loans([self.loan_id])
 
 
-class LoanRepayment(models.Model):
+class LoanRepayment(LoanBalanceMixin, models.Model):
     PAYMENT_MODE_CHOICES = [
         ('cash', 'Cash'),
         ('MOMO', ' MOMO Cash'),
@@ -262,6 +672,14 @@ class LoanRepayment(models.Model):
         ('fines', 'Fines'),
     ]
 
+    balance_fields = {
+        'amount_paid': 'paid',
+        'principal_paid': 'principal_paid',
+        'interest_paid': 'interest_paid',
+        'fees_paid': 'fees_paid',
+        'fines_paid': 'fines_paid',
+    }
+
     loan = models.ForeignKey(Loan, on_delete=models.PROTECT, related_name="repayments")
     schedule = models.ForeignKey(
         LoanRepaymentSchedule,
@@ -277,7 +695,12 @@ class LoanRepayment(models.Model):
         validators=[MinValueValidator(0)]
     )
     payment_mode = models.CharField(max_length=20, choices=PAYMENT_MODE_CHOICES)
-    receipt_number = models.CharField(max_length=50, blank=True, help_text="Payment receipt reference")
+    receipt_number = models.CharField(
+        max_length=50, 
+        blank=True, 
+        db_index=True,
+        help_text="Payment receipt reference"
+    )
     
     # Payment allocation breakdown
     principal_paid = models.DecimalField(
@@ -309,37 +732,64 @@ class LoanRepayment(models.Model):
     is_late = models.BooleanField(default=False)
     notes = models.TextField(blank=True, help_text="Any notes about this payment")
 
+    objects = LoanPostingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # A loan's payments by date: last payment (accrual) and statements
+            models.Index(fields=['loan', 'payment_date']),
+        ]
+
     def save(self, *args, **kwargs):
         if self.schedule and self.payment_date > self.schedule.due_date:
             self.is_late = True
-        allocation_total = self.principal_paid + self.interest_paid + self.fees_paid + self.fines_paid
-        if allocation_total != self.amount_paid:
-            remaining = self.amount_paid
-            if remaining > 0 and self.loan.total_fines_charged > self.loan.fine_charges.aggregate(
-                paid=models.Sum('repayments__fines_paid'))['paid'] or 0:
-                self.fines_paid = min(remaining, self.loan.total_fines_charged - 
-                                     (self.loan.fine_charges.aggregate(paid=models.Sum('repayments__fines_paid'))['paid'] or 0))
-                remaining -= self.fines_paid
-            if remaining > 0 and self.loan.total_fees_charged > self.loan.fee_charges.aggregate(
-                paid=models.Sum('repayments__fees_paid'))['paid'] or 0:
-                self.fees_paid = min(remaining, self.loan.total_fees_charged - 
-                                    (self.loan.fee_charges.aggregate(paid=models.Sum('repayments__fees_paid'))['paid'] or 0))
-                remaining -= self.fees_paid
-            if remaining > 0 and self.loan.total_interest_charged > self.loan.repayments.aggregate(
-                paid=models.Sum('interest_paid'))['paid'] or 0:
-                self.interest_paid = min(remaining, self.loan.total_interest_charged - 
-                                        (self.loan.repayments.aggregate(paid=models.Sum('interest_paid'))['paid'] or 0))
-                remaining -= self.interest_paid
-            self.principal_paid = remaining
-        
+
+        run_with_retry(self._post, *args, reset=self._retry_reset(), **kwargs)
+
+    def _retry_reset(self):
+        # A retry allocates again unless the caller handed in the split
+        reset_posting = super()._retry_reset()
+        allocation = self._allocation()
+
+        def reset():
+            reset_posting()
+            for bucket, amount in allocation.items():
+                setattr(self, f'{bucket}_paid', amount)
+        return reset
+
+    def _allocation(self):
+        return {bucket: getattr(self, f'{bucket}_paid') for bucket in Loan.ALLOCATION_BUCKETS}
+
+    def _post(self, *args, **kwargs):
+        # The allocation and the schedule status below are read-then-write;
+        # the loan lock keeps other postings out until this one commits
+        locked = self._lock_loans()
+        counters = locked[self.loan_id]
+
+        allocation_total = sum(Decimal(str(amount or 0)) for amount in self._allocation().values())
+        if allocation_total != Decimal(str(self.amount_paid)):
+            # Amounts this row already holds are outstanding again
+            credit = {}
+            if self._posted and self._posted[0] == self.loan_id:
+                credit = {
+                    bucket: self._posted[1][f'{bucket}_paid']
+                    for bucket in Loan.ALLOCATION_BUCKETS
+                }
+            allocation = Loan.split_payment(counters, self.amount_paid, credit=credit)
+            for bucket, amount in allocation.items():
+                setattr(self, f'{bucket}_paid', amount)
+
         super().save(*args, **kwargs)
-        
-        # Update schedule payment status
+
+        # Post the payment (or the change to it) to the loan balances
+        self._post_balance_delta()
+        self._after_posting(list(locked))
+
+    def _after_posting(self, loan_ids):
+        # Schedule payment status first; aging reads it and the balance
         if self.schedule:
-            self.schedule.update_payment_status()
-        
-        # Update loan balances
-        self.loan.update_loan_balances()
+            self.schedule.update_payment_status(refresh_aging=False)
+        PortfolioAgingSummary.refresh_loans(loan_ids)
 
     def __str__(self):
         return f"Payment of ${self.amount_paid} for Loan #{self.loan.id} on {self.payment_date}"
@@ -377,6 +827,9 @@ class LoanRenewal(models.Model):
         ('partial', 'Partial Renewal'),
         ('extended', 'Extended Term Only'),
     ]
+
+    # Loan fields a renewal rewrites
+    RENEWED_LOAN_FIELDS = ['interest_rate', 'loan_terms', 'due_date', 'status', 'total_loan_amount', 'current_balance']
     
     loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name="renewals")
     renewal_date = models.DateField(default=timezone.now)
@@ -407,61 +860,255 @@ class LoanRenewal(models.Model):
         return f"Renewal #{self.id} for Loan #{self.loan.id} on {self.renewal_date}"
     
     def calculate_renewal_terms(self):
-        current_balance = self.loan.current_balance
-        new_interest_rate = self.loan.interest_rate
-        self.new_principal_amount = current_balance 
-        self.total_renewal_amount = self.new_principal_amount + new_interest_rate
-
-        # Set new due date (extend by the same term or new term)
-        if self.renewal_type == 'full':
-            self.new_due_date = self.renewal_date + timedelta(days=self.loan.loan_terms)
-            self.new_loan_terms = self.loan.loan_terms
-            self.new_interest_rate = self.loan.interest_rate
-        else:
-            # For partial or extended renewals, use the provided values
-            self.new_due_date = self.renewal_date + timedelta(days=self.new_loan_term)
-        
-        # Update the main loan with new terms if terms are accepted
-        if self.terms_accepted:
+        if not self.terms_accepted:
+            self.compute_terms()
+            return
+        with transaction.atomic():
+            # Renew from the loan's current balance, locked until the new terms are posted
+            self.loan = Loan.objects.select_for_update().get(pk=self.loan_id)
+            self.compute_terms()
             self._update_loan_terms()
-    
-    def _update_loan_terms(self):
-        """Update the main loan with the renewed terms"""
-        self.loan.current_balance = self.new_principal_amount
-        self.loan.interest_rate = self.new_interest_rate
-        self.loan.loan_terms = self.new_loan_terms
-        self.loan.due_date = self.new_due_date
-        self.loan.status = 'Renewal'  # Reset status to Renewal
+
+    def compute_terms(self):
+        """Fill in the new principal, rate, term and due date from the loan"""
+        if isinstance(self.renewal_date, datetime):
+            self.renewal_date = self.renewal_date.date()
+        self.new_principal_amount = self.loan.current_balance
+        self.total_renewal_amount = self.new_principal_amount + self.loan.interest_rate
+
+        # Full renewals repeat the current rate and term; partial or
+        # extended renewals use the provided values (0% is a rate, not a gap)
+        if self.renewal_type == 'full' or self.new_loan_term is None:
+            self.new_loan_term = self.loan.loan_terms
+        if self.renewal_type == 'full' or self.new_interest_rate is None:
+            self.new_interest_rate = self.loan.interest_rate
+        self.new_due_date = self.renewal_date + timedelta(days=self.new_loan_term)
+
+    def apply_to_loan(self):
+        """Move the computed terms onto self.loan in memory.
+
+        Returns the new schedule as unsaved rows; the caller saves the loan
+        (RENEWED_LOAN_FIELDS) and replaces its unpaid installments.
+        """
+        loan = self.loan
+        loan.interest_rate = self.new_interest_rate
+        loan.loan_terms = self.new_loan_term
+        loan.due_date = self.new_due_date
+        loan.status = 'Renewal'
         # Recalculate total loan amount
-        self.loan.total_loan_amount = self.loan.calculate_total_loan_amount()
-        self.loan.current_balance = self.loan.total_loan_amount
-        
-        # Reset repayment schedule
-        self._create_new_repayment_schedule()
-        
-        self.loan.save()
-    
-    def _create_new_repayment_schedule(self):
-        """Create a new repayment schedule for the renewed loan"""
+        loan.total_loan_amount, _ = loan.calculate_total_loan_amount()
+        loan.current_balance = loan.total_loan_amount
+        return loan.build_repayment_schedule(
+            start_date=self.renewal_date,
+            principal=self.new_principal_amount,
+            interest_rate=self.new_interest_rate,
+            periods=self.new_loan_term,
+        )
+
+    def _update_loan_terms(self):
+        """Update the main loan with the renewed terms and reset its schedule"""
+        installments = self.apply_to_loan()
         self.loan.repayment_schedule.filter(is_paid=False).delete()
-        monthly_payment = self.new_principal_amount / self.new_loan_term
-        
-        for i in range(self.new_loan_term):
-            due_date = self.renewal_date + timedelta(days=30 * (i + 1))
-            
-            LoanRepaymentSchedule.objects.create(
-                loan=self.loan,
-                due_date=due_date,
-                principal_amount=monthly_payment,
-                interest_amount=0,  # Would need interest calculation logic
-                total_amount_due=monthly_payment,
-                is_paid=False
-            )
-    
+        LoanRepaymentSchedule.objects.bulk_create(installments)
+        self.loan.save(update_fields=self.RENEWED_LOAN_FIELDS)
+
     def get_renewal_summary(self):
         return {
             'new_principal': self.new_principal_amount,
             'new_interest_rate': f"{self.new_interest_rate}%",
             'new_term': f"{self.new_loan_term} months",
             'new_due_date': self.new_due_date,
-        }
\ No newline at end of file
+        }
+
+
+class PortfolioAgingSummary(models.Model):
+    """Outstanding portfolio by aging bucket, kept up to date incrementally.
+
+    One row per (loan type, status, credit officer, bucket) holding the
+    number of loans and their outstanding balance, so portfolio-at-risk
+    reports read a handful of rows whatever the size of the loan book.
+    LoanAgingState records where each loan is currently counted.
+    """
+    # (bucket, label, min days overdue, max days overdue)
+    AGING_BUCKETS = [
+        ('current', 'Current', 0, 0),
+        ('1_30', '1-30 days', 1, 30),
+        ('31_60', '31-60 days', 31, 60),
+        ('61_90', '61-90 days', 61, 90),
+        ('over_90', 'Over 90 days', 91, None),
+    ]
+    BUCKET_CHOICES = [(bucket, label) for bucket, label, _, _ in AGING_BUCKETS]
+
+    # Loans that still carry an outstanding balance
+    OUTSTANDING_STATUSES = ['disbursed', 'Renewal', 'active', 'delinquent', 'restructured', 'defaulted']
+
+    loan_type = models.CharField(max_length=50, choices=Loan.LOAN_TYPE_CHOICES)
+    status = models.CharField(max_length=20, choices=Loan.LOAN_STATUS_CHOICES)
+    # Not a constraint: counts stay put until the next refresh moves them
+    credit_officer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        blank=True,
+        null=True,
+        related_name="+"
+    )
+    bucket = models.CharField(max_length=10, choices=BUCKET_CHOICES)
+    loan_count = models.IntegerField(default=0)
+    outstanding_balance = models.DecimalField(max_digits=16, decimal_places=2, default=0.00)
+
+    class Meta:
+        constraints = [
+            # One row per key, also for loans without an officer (a plain
+            # unique constraint would let NULL officers repeat)
+            models.UniqueConstraint(
+                'loan_type', 'status', Coalesce('credit_officer', Value(0)), 'bucket',
+                name='portfolio_aging_summary_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['loan_type', 'status', 'credit_officer', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.loan_type}/{self.status} {self.bucket}: {self.loan_count} loans"
+
+    @classmethod
+    def bucket_for(cls, days_overdue):
+        for bucket, _, low, high in cls.AGING_BUCKETS:
+            if days_overdue >= low and (high is None or days_overdue <= high):
+                return bucket
+
+    @classmethod
+    def refresh_all(cls, as_of=None, rebuild=False, chunk_size=2000):
+        """Re-bucket every outstanding (or previously counted) loan in id chunks.
+
+        ``rebuild`` discards the summary first. Returns the number of loans aged.
+        """
+        if rebuild:
+            cls.objects.all().delete()
+            LoanAgingState.objects.all().delete()
+
+        loans = Loan.objects.filter(
+            models.Q(status__in=cls.OUTSTANDING_STATUSES) | models.Q(aging_state__isnull=False)
+        ).order_by('pk')
+        refreshed, last_id = 0, 0
+        while True:
+            loan_ids = list(loans.filter(pk__gt=last_id).values_list('pk', flat=True)[:chunk_size])
+            if not loan_ids:
+                return refreshed
+            cls.refresh_loans(loan_ids, as_of=as_of)
+            refreshed += len(loan_ids)
+            last_id = loan_ids[-1]
+
+    @classmethod
+    def refresh_loans(cls, loan_ids, as_of=None):
+        """Re-bucket the given loans and move their counts in the summary.
+
+        Reads the loans (with their oldest unpaid installment) and their
+        current aging state in two queries, then only touches summary rows
+        for loans whose bucket, grouping or balance actually changed.
+        """
+        loan_ids = [pk for pk in loan_ids if pk is not None]
+        if not loan_ids:
+            return
+        as_of = as_of or timezone.now().date()
+
+        oldest_unpaid = (
+            LoanRepaymentSchedule.objects.filter(loan=OuterRef('pk'), is_paid=False)
+            .order_by('due_date')
+            .values('due_date')[:1]
+        )
+        loans = (
+            Loan.objects.filter(pk__in=loan_ids)
+            .annotate(oldest_unpaid_due=Subquery(oldest_unpaid))
+            .values_list('pk', 'loan_type', 'status', 'client__credit_officer_id',
+                         'current_balance', 'oldest_unpaid_due')
+        )
+
+        with transaction.atomic():
+            states = LoanAgingState.objects.select_for_update().in_bulk(loan_ids)
+            deltas = defaultdict(lambda: [0, Decimal('0')])
+            new_states, changed_states, closed_states = [], [], []
+
+            for pk, loan_type, status, officer_id, balance, oldest_due in loans:
+                state = states.get(pk)
+                key = None
+                if status in cls.OUTSTANDING_STATUSES:
+                    days_overdue = max((as_of - oldest_due).days, 0) if oldest_due else 0
+                    key = (loan_type, status, officer_id, cls.bucket_for(days_overdue))
+
+                if state and state.key == key and state.outstanding_balance == balance:
+                    continue
+                if state and state.key:
+                    deltas[state.key][0] -= 1
+                    deltas[state.key][1] -= state.outstanding_balance
+                if key:
+                    deltas[key][0] += 1
+                    deltas[key][1] += balance
+
+                if key is None:
+                    if state:
+                        closed_states.append(pk)
+                    continue
+                fields = dict(
+                    loan_type=key[0], status=key[1], credit_officer_id=key[2], bucket=key[3],
+                    outstanding_balance=balance, oldest_unpaid_due_date=oldest_due,
+                )
+                if state:
+                    for name, value in fields.items():
+                        setattr(state, name, value)
+                    changed_states.append(state)
+                else:
+                    new_states.append(LoanAgingState(loan_id=pk, **fields))
+
+            for key, (count, balance) in deltas.items():
+                if count or balance:
+                    cls._add_to_row(key, count, balance)
+
+            LoanAgingState.objects.bulk_create(new_states)
+            LoanAgingState.objects.bulk_update(changed_states, [
+                'loan_type', 'status', 'credit_officer_id', 'bucket',
+                'outstanding_balance', 'oldest_unpaid_due_date',
+            ])
+            LoanAgingState.objects.filter(pk__in=closed_states).delete()
+
+
+    @classmethod
+    def _add_to_row(cls, key, count, balance):
+        """Add to a summary row's counts, creating the row if it is missing.
+
+        Two refreshes can both find a key missing; the unique key makes the
+        second insert fail, and that one adds to the row the first created.
+        """
+        loan_type, status, officer_id, bucket = key
+        rows = cls.objects.filter(loan_type=loan_type, status=status, credit_officer_id=officer_id, bucket=bucket)
+        increments = dict(loan_count=F('loan_count') + count, outstanding_balance=F('outstanding_balance') + balance)
+        if rows.update(**increments):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    loan_type=loan_type, status=status, credit_officer_id=officer_id, bucket=bucket,
+                    loan_count=count, outstanding_balance=balance,
+                )
+        except IntegrityError:
+            rows.update(**increments)
+
+
+class LoanAgingState(models.Model):
+    """Where a loan is currently counted in PortfolioAgingSummary"""
+    loan = models.OneToOneField(Loan, on_delete=models.CASCADE, primary_key=True, related_name="aging_state")
+    loan_type = models.CharField(max_length=50)
+    status = models.CharField(max_length=20)
+    credit_officer_id = models.BigIntegerField(blank=True, null=True)
+    bucket = models.CharField(max_length=10, choices=PortfolioAgingSummary.BUCKET_CHOICES)
+    outstanding_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    oldest_unpaid_due_date = models.DateField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Loan #{self.loan_id} in {self.bucket}"
+
+    @property
+    def key(self):
+        return (self.loan_type, self.status, self.credit_officer_id, self.bucket)
@@ -0,0 +1,75 @@
+"""
+Minimal streaming PDF writer for plain-text reports.
+
+Writes one page at a time, so a report of any length is produced with
+memory proportional to a single page. Text is set in Courier (one of the
+standard PDF fonts, so nothing is embedded), which keeps fixed-width
+columns aligned. Only Latin-1 text is supported; other characters are
+replaced with '?'.
+"""
+PAGE_WIDTH = 595   # A4, in points
+PAGE_HEIGHT = 842
+MARGIN = 40
+FONT_SIZE = 8
+LEADING = 11
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+_CATALOG, _PAGES, _FONT = 1, 2, 3
+
+
+def _escape(text):
+    text = str(text).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return text.encode('latin-1', 'replace')
+
+
+def _page_content(lines):
+    parts = [b'BT /F1 %d Tf %d TL %d %d Td' % (FONT_SIZE, LEADING, MARGIN, PAGE_HEIGHT - MARGIN)]
+    for line in lines:
+        parts.append(b'(' + _escape(line) + b") '")
+    parts.append(b'ET')
+    return b'\n'.join(parts)
+
+
+def stream_pdf(pages):
+    """Yield the bytes of a PDF with one page per item of ``pages``.
+
+    Each page is a list of text lines, at most LINES_PER_PAGE long.
+    """
+    offsets = {}
+    position = 0
+
+    def emit(number, body):
+        nonlocal position
+        offsets[number] = position
+        chunk = b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        position += len(chunk)
+        return chunk
+
+    header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    position = len(header)
+    yield header
+    yield emit(_CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % _PAGES)
+    yield emit(_FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>')
+
+    page_ids = []
+    next_id = _FONT + 1
+    for lines in pages:
+        content = _page_content(lines)
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        yield emit(content_id, b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+        yield emit(page_id, (
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>'
+        ) % (_PAGES, PAGE_WIDTH, PAGE_HEIGHT, _FONT, content_id))
+        page_ids.append(page_id)
+
+    # The page tree is only known once every page has been written
+    kids = b' '.join(b'%d 0 R' % page_id for page_id in page_ids)
+    yield emit(_PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(page_ids)))
+
+    xref_position = position
+    xref = [b'xref\n0 %d\n' % next_id, b'0000000000 65535 f \n']
+    xref += [b'%010d 00000 n \n' % offsets[number] for number in range(1, next_id)]
+    yield b''.join(xref)
+    yield b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%EOF\n' % (next_id, _CATALOG, xref_position)
@@ -0,0 +1,204 @@
+"""
+Query plan checks for the API endpoints.
+
+Each case calls a view the way a client would and records every statement
+it runs; each distinct statement is then run again under EXPLAIN on the
+configured database. A plan that reads a whole table (SQLite "SCAN t"
+without an index, MySQL access type ALL, PostgreSQL "Seq Scan") is a
+finding, unless the table is smaller than the caller's threshold, where
+optimizers scan on purpose, or the case reads that table in full by
+design. Writes run inside a transaction that is rolled back.
+
+Plans depend on the data, so run this against a realistically sized
+database (see generate_portfolio), not an empty one.
+"""
+import json
+import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from clients import views as client_views
+from clients.models import Client
+from clients.pagination import encode_cursor
+from . import views as loan_views
+from .models import Loan
+
+DEFAULT_MIN_ROWS = 1000
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+_SQLITE_SCAN = re.compile(r'^SCAN (\S+)(.*)$')
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _Recorder:
+    """Execute wrapper keeping each distinct statement with its first parameters"""
+
+    def __init__(self):
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+            self.statements.setdefault(sql, params)
+        return execute(sql, params, many, context)
+
+
+def plan_cases():
+    """The user to call as, and (name, method, view, path, view kwargs, body,
+    tables read in full by design) per case"""
+    loan = Loan.objects.filter(repayments__isnull=False).order_by('pk').values(
+        'pk', 'client_id', 'client__credit_officer_id'
+    ).first()
+    if loan is None:
+        raise ValueError("No loans with repayments to check against; load data first (generate_portfolio)")
+    client = Client.objects.filter(pk=loan['client_id']).values(
+        'id', 'first_name', 'phone', 'created_at'
+    ).get()
+    officer = loan['client__credit_officer_id']
+    User = get_user_model()
+    user = User.objects.filter(pk=officer).first() or User(pk=0, username='query-plan-check')
+    cursor = encode_cursor('-created_at', client)
+    today = timezone.now().date()
+    repayment = [{
+        'loan': loan['pk'], 'amount_paid': '10.00', 'payment_date': today.isoformat(),
+        'payment_mode': 'cash', 'receipt_number': 'PLAN-CHECK',
+    }]
+
+    return user, [
+        ('client_list', 'get', client_views.client_list_create, '/api/clients/', {}, None, ()),
+        ('client_list_officer', 'get', client_views.client_list_create,
+         f'/api/clients/?credit_officer={officer}', {}, None, ()),
+        ('client_list_cursor', 'get', client_views.client_list_create, f'/api/clients/?cursor={cursor}', {}, None, ()),
+        ('client_list_officer_cursor', 'get', client_views.client_list_create,
+         f'/api/clients/?credit_officer={officer}&cursor={cursor}', {}, None, ()),
+        ('client_search_name', 'get', client_views.client_search,
+         f'/api/clients/search/?search={client["first_name"]}', {}, None, ()),
+        ('client_search_phone', 'get', client_views.client_search,
+         f'/api/clients/search/?search={client["phone"][:6]}', {}, None, ()),
+        ('client_stats', 'get', client_views.client_stats, '/api/clients/stats/', {}, None, ()),
+        ('client_detail', 'get', client_views.client_detail, f'/api/clients/{client["id"]}/',
+         {'pk': client['id']}, None, ()),
+        ('loan_list', 'get', loan_views.loan_list, '/api/loans/', {}, None, ()),
+        ('loan_list_status_due', 'get', loan_views.loan_list,
+         f'/api/loans/?status=active&due_date_after={today}&due_date_before={today + timedelta(days=30)}',
+         {}, None, ()),
+        ('loan_list_client', 'get', loan_views.loan_list, f'/api/loans/?client={client["id"]}', {}, None, ()),
+        ('loan_list_officer', 'get', loan_views.loan_list, f'/api/loans/?credit_officer={officer}', {}, None, ()),
+        ('loan_detail', 'get', loan_views.loan_detail, f'/api/loans/{loan["pk"]}/', {'pk': loan['pk']}, None, ()),
+        ('loan_statement', 'get', loan_views.loan_statement, f'/api/loans/{loan["pk"]}/statement/',
+         {'pk': loan['pk']}, None, ()),
+        ('client_statement', 'get', loan_views.client_statement, f'/api/loans/clients/{client["id"]}/statement/',
+         {'client_id': client['id']}, None, ()),
+        # The summary is read whole by design; it is a handful of rows per officer
+        ('portfolio_at_risk', 'get', loan_views.portfolio_at_risk, '/api/loans/portfolio-at-risk/', {}, None,
+         ('loans_portfolioagingsummary',)),
+        ('portfolio_export', 'get', loan_views.portfolio_export, f'/api/loans/export/?end_id={loan["pk"]}',
+         {}, None, ()),
+        ('repayment_bulk_create', 'post', loan_views.repayment_bulk_create, '/api/loans/repayments/bulk/',
+         {}, repayment, ()),
+    ]
+
+
+def capture_statements(view, method, path, user, kwargs=None, body=None):
+    """Run one request (rolled back) and return {sql: params} of what it executed"""
+    build = getattr(APIRequestFactory(), method)
+    request = build(path) if body is None else build(path, body, format='json')
+    force_authenticate(request, user=user)
+    recorder = _Recorder()
+    cache.clear()
+    try:
+        with connection.execute_wrapper(recorder), transaction.atomic():
+            response = view(request, **(kwargs or {}))
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            raise _Rollback
+    except _Rollback:
+        pass
+    return recorder.statements
+
+
+def explain(sql, params):
+    """The plan of one statement as the backend reports it"""
+    vendor = connection.vendor
+    prefix = connection.ops.explain_query_prefix('JSON' if vendor in ('mysql', 'postgresql') else None)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        rows = cursor.fetchall()
+    if vendor == 'sqlite':
+        return [row[-1] for row in rows]
+    plan = rows[0][0]
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def full_scans(plan):
+    """Tables a plan (from explain()) reads in full, without an index"""
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        scans = []
+        for detail in plan:
+            match = _SQLITE_SCAN.match(detail)
+            # "USING (COVERING) INDEX" and virtual tables (FTS) are index reads
+            if match and not match.group(1).startswith('(') and 'USING' not in match.group(2) \
+                    and 'VIRTUAL TABLE' not in match.group(2):
+                scans.append(match.group(1))
+        return scans
+    if vendor == 'mysql':
+        return [node['table_name'] for node in _walk(plan) if node.get('access_type') == 'ALL']
+    if vendor == 'postgresql':
+        return [node['Relation Name'] for node in _walk(plan) if node.get('Node Type') == 'Seq Scan']
+    raise ValueError(f"Query plan checks are not supported on {connection.display_name}")
+
+
+def _walk(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def _table_rows(table, counts):
+    if table not in counts:
+        if table in connection.introspection.table_names():
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                counts[table] = cursor.fetchone()[0]
+        else:
+            # An alias we cannot size; treat it as large
+            counts[table] = None
+    return counts[table]
+
+
+def check_query_plans(only=None, min_rows=DEFAULT_MIN_ROWS):
+    """Yield (case, statements checked, findings) per case.
+
+    Findings are (table, rows or None, sql, plan) for full scans of tables
+    with at least ``min_rows`` rows.
+    """
+    user, cases = plan_cases()
+    counts = {}
+
+    for name, method, view, path, kwargs, body, scanned_by_design in cases:
+        if only and name not in only:
+            continue
+        statements = capture_statements(view, method, path, user, kwargs, body)
+        findings = []
+        for sql, params in statements.items():
+            plan = explain(sql, params)
+            for table in full_scans(plan):
+                if table in scanned_by_design:
+                    continue
+                rows = _table_rows(table, counts)
+                if rows is None or rows >= min_rows:
+                    findings.append((table, rows, sql, plan))
+        yield name, len(statements), findings
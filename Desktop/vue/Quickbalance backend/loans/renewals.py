@@ -0,0 +1,98 @@
+"""
+Bulk loan renewals (the annual rollover).
+
+Loans are renewed in chunked transactions. Each chunk locks its loans
+with select_for_update(skip_locked=True), so loans another request is
+busy with (a repayment being posted, say) are skipped and reported
+rather than waited on, and can be retried. New terms and schedules are
+computed in memory with the same LoanRenewal logic as a single renewal,
+then written with one delete of the unpaid installments, bulk_create of
+the new ones and the renewal records, a bulk_update of the loans and
+one aging refresh per chunk.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Loan, LoanRenewal, LoanRepaymentSchedule, PortfolioAgingSummary
+
+DEFAULT_CHUNK_SIZE = 500
+# Loans with a balance to roll over
+RENEWABLE_STATUSES = PortfolioAgingSummary.OUTSTANDING_STATUSES
+
+
+def renew_loans(loan_ids, renewal_type='full', renewal_date=None, new_interest_rate=None, new_loan_term=None,
+                reason='', chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Renew the given loans with the same terms.
+
+    Partial and extended renewals use ``new_interest_rate`` and
+    ``new_loan_term``, falling back to each loan's own. Returns a summary
+    with the renewed count and the ids that were skipped, by reason.
+    ``progress`` is called with the running summary after each chunk.
+    """
+    loan_ids = sorted(set(loan_ids))
+    renewal_date = renewal_date or timezone.now().date()
+    summary = {'renewed': 0, 'locked': [], 'not_renewable': [], 'not_found': []}
+    terms = dict(
+        renewal_type=renewal_type, renewal_date=renewal_date, new_interest_rate=new_interest_rate,
+        new_loan_term=new_loan_term, reason=reason,
+    )
+
+    for start in range(0, len(loan_ids), chunk_size):
+        chunk = loan_ids[start:start + chunk_size]
+        with transaction.atomic():
+            renewed, locked, not_renewable, not_found = _renew_chunk(chunk, terms)
+        summary['renewed'] += renewed
+        summary['locked'] += locked
+        summary['not_renewable'] += not_renewable
+        summary['not_found'] += not_found
+        if progress:
+            progress(dict(summary, processed=min(start + chunk_size, len(loan_ids)), total=len(loan_ids)))
+
+    return summary
+
+
+def _renew_chunk(chunk, terms):
+    loans = Loan.objects.filter(pk__in=chunk).order_by('pk')
+    if connection.features.has_select_for_update_skip_locked:
+        loans = loans.select_for_update(skip_locked=True)
+    else:
+        loans = loans.select_for_update()
+    loans = list(loans)
+
+    # Ids missing from the locked read are either locked elsewhere or gone
+    missing = set(chunk) - {loan.pk for loan in loans}
+    existing = set(Loan.objects.filter(pk__in=missing).values_list('pk', flat=True)) if missing else set()
+    locked = sorted(existing)
+    not_found = sorted(missing - existing)
+
+    renewals, installments, renewed, not_renewable = [], [], [], []
+    for loan in loans:
+        if loan.status not in RENEWABLE_STATUSES:
+            not_renewable.append(loan.pk)
+            continue
+        renewal = LoanRenewal(
+            loan=loan,
+            renewal_type=terms['renewal_type'],
+            renewal_date=terms['renewal_date'],
+            new_interest_rate=terms['new_interest_rate'],
+            new_loan_term=terms['new_loan_term'],
+            reason=terms['reason'],
+            terms_accepted=True,
+        )
+        renewal.compute_terms()
+        installments += renewal.apply_to_loan()
+        renewals.append(renewal)
+        renewed.append(loan)
+
+    if renewed:
+        renewed_ids = [loan.pk for loan in renewed]
+        LoanRepaymentSchedule.objects.filter(loan_id__in=renewed_ids, is_paid=False).delete()
+        LoanRepaymentSchedule.objects.bulk_create(installments)
+        for loan in renewed:
+            loan.version = F('version') + 1
+        Loan.objects.bulk_update(renewed, [*LoanRenewal.RENEWED_LOAN_FIELDS, 'version'])
+        LoanRenewal.objects.bulk_create(renewals)
+        PortfolioAgingSummary.refresh_loans(renewed_ids)
+
+    return len(renewed), locked, not_renewable, not_found
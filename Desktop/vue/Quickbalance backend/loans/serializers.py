@@ -0,0 +1,44 @@
+# serializers.py
+from decimal import Decimal
+from django.conf import settings
+from rest_framework import serializers
+from .calculations import INTEREST_METHODS, PERIODS_PER_YEAR
+from .models import LoanRenewal, LoanRepayment
+
+
+class LoanRepaymentImportSerializer(serializers.Serializer):
+    # Loans and schedules are plain ids here; bulk imports check they exist
+    # with one query per batch instead of one per row
+    loan = serializers.IntegerField(min_value=1)
+    schedule = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    payment_date = serializers.DateField(required=False)
+    amount_paid = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    payment_mode = serializers.ChoiceField(choices=LoanRepayment.PAYMENT_MODE_CHOICES)
+    receipt_number = serializers.CharField(max_length=50)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class LoanQuoteSerializer(serializers.Serializer):
+    # One pricing scenario for the quote endpoint
+    principal = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    annual_rate = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=Decimal('0'))
+    periods = serializers.IntegerField(min_value=1, max_value=1200)
+    frequency = serializers.ChoiceField(choices=list(PERIODS_PER_YEAR), default='monthly')
+    method = serializers.ChoiceField(choices=INTEREST_METHODS, required=False)
+    start_date = serializers.DateField(required=False)
+
+    def validate(self, data):
+        data.setdefault('method', getattr(settings, 'LOAN_INTEREST_METHOD', 'flat'))
+        return data
+
+
+class LoanBulkRenewalSerializer(serializers.Serializer):
+    # One set of renewal terms applied to many loans (the annual rollover)
+    loans = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    renewal_type = serializers.ChoiceField(choices=LoanRenewal.RENEWAL_TYPE_CHOICES, default='full')
+    renewal_date = serializers.DateField(required=False)
+    new_interest_rate = serializers.DecimalField(
+        max_digits=5, decimal_places=2, min_value=Decimal('0'), required=False
+    )
+    new_loan_term = serializers.IntegerField(min_value=1, required=False)
+    reason = serializers.CharField()
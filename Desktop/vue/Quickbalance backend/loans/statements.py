@@ -0,0 +1,153 @@
+"""
+Loan and client statements.
+
+A statement lists the disbursement, then every fee, fine and repayment in
+date order with a running balance. The three transaction tables are read
+in keyset chunks of (date, id) and merged lazily, so a statement is
+produced with memory bounded by the chunk size however long the history
+is. Output is streamed as CSV or as a paged PDF (see pdf.py).
+"""
+import csv
+import heapq
+from decimal import Decimal
+
+from django.db.models import Q
+
+from . import pdf
+from .models import Loan, LoanFeeCharge, LoanFineCharge, LoanRepayment
+
+DEFAULT_CHUNK_SIZE = 500
+STATEMENT_FORMATS = ['csv', 'pdf']
+STATEMENT_COLUMNS = ['date', 'type', 'reference', 'description', 'debit', 'credit', 'balance']
+
+# On the same day charges are listed before the repayments that settle them
+_DISBURSEMENT, _FEE, _FINE, _REPAYMENT = range(4)
+
+_PDF_ROW = '{:<10} {:<10} {:<14} {:<28} {:>12} {:>12} {:>13}'
+
+
+def _chunked(queryset, date_field, chunk_size):
+    """Iterate a queryset in (date, id) order, one bounded query per chunk"""
+    queryset = queryset.order_by(date_field, 'pk')
+    after = Q()
+    while True:
+        chunk = list(queryset.filter(after)[:chunk_size].iterator(chunk_size=chunk_size))
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last_date, last_id = chunk[-1][0], chunk[-1][1]
+        after = Q(**{f'{date_field}__gt': last_date}) | Q(**{date_field: last_date, 'pk__gt': last_id})
+
+
+def _repayments(loan_id, chunk_size):
+    rows = LoanRepayment.objects.filter(loan_id=loan_id).values_list(
+        'payment_date', 'pk', 'amount_paid', 'receipt_number', 'payment_mode'
+    )
+    modes = dict(LoanRepayment.PAYMENT_MODE_CHOICES)
+    for day, pk, amount, receipt, mode in _chunked(rows, 'payment_date', chunk_size):
+        yield day, _REPAYMENT, pk, 'repayment', receipt, f"Repayment ({modes.get(mode, mode).strip()})", None, amount
+
+
+def _fees(loan_id, chunk_size):
+    rows = LoanFeeCharge.objects.filter(loan_id=loan_id).values_list(
+        'charge_date', 'pk', 'amount', 'fee_type', 'description'
+    )
+    types = dict(LoanFeeCharge.FEE_TYPE_CHOICES)
+    for day, pk, amount, fee_type, description in _chunked(rows, 'charge_date', chunk_size):
+        yield day, _FEE, pk, 'fee', f'FEE-{pk}', description or types.get(fee_type, fee_type), amount, None
+
+
+def _fines(loan_id, chunk_size):
+    rows = LoanFineCharge.objects.filter(loan_id=loan_id).values_list(
+        'charge_date', 'pk', 'amount', 'fine_type', 'reason'
+    )
+    types = dict(LoanFineCharge.FINE_TYPE_CHOICES)
+    for day, pk, amount, fine_type, reason in _chunked(rows, 'charge_date', chunk_size):
+        yield day, _FINE, pk, 'fine', f'FINE-{pk}', reason or types.get(fine_type, fine_type), amount, None
+
+
+def statement_entries(loan, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield statement rows as dicts keyed by STATEMENT_COLUMNS.
+
+    The balance starts from the amount disbursed (principal plus contracted
+    interest), rises with fees and fines and falls with repayments.
+    """
+    balance = loan.total_loan_amount or Decimal('0')
+    yield {
+        'date': loan.start_date or loan.application_date,
+        'type': 'disbursement',
+        'reference': f'LOAN-{loan.pk}',
+        'description': f"{loan.get_loan_type_display()} disbursed (principal {loan.principal_amount} + interest)",
+        'debit': balance,
+        'credit': None,
+        'balance': balance,
+    }
+
+    merged = heapq.merge(
+        _fees(loan.pk, chunk_size), _fines(loan.pk, chunk_size), _repayments(loan.pk, chunk_size),
+        key=lambda entry: entry[:3],
+    )
+    for day, _, _, kind, reference, description, debit, credit in merged:
+        balance += (debit or 0) - (credit or 0)
+        yield {
+            'date': day,
+            'type': kind,
+            'reference': reference,
+            'description': description,
+            'debit': debit,
+            'credit': credit,
+            'balance': balance,
+        }
+
+
+def client_statement_entries(client, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Statement rows for every loan of a client, loan by loan, with a 'loan' column"""
+    loans = Loan.objects.filter(client=client).order_by('application_date', 'pk')
+    for loan in loans.iterator(chunk_size=chunk_size):
+        for entry in statement_entries(loan, chunk_size):
+            yield dict(entry, loan=loan.pk)
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(entries, columns=STATEMENT_COLUMNS):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for entry in entries:
+        yield writer.writerow(['' if entry[column] is None else entry[column] for column in columns])
+
+
+def _pdf_pages(title, entries):
+    header = [title, '', _PDF_ROW.format('Date', 'Type', 'Reference', 'Description', 'Debit', 'Credit', 'Balance'), '-' * 104]
+    body_lines = pdf.LINES_PER_PAGE - len(header) - 2
+    page_number = 0
+    lines = []
+    loan_id = None
+
+    for entry in entries:
+        if entry.get('loan', loan_id) != loan_id:
+            loan_id = entry['loan']
+            lines.append(f'Loan #{loan_id}')
+        lines.append(_PDF_ROW.format(
+            str(entry['date']), entry['type'][:10], str(entry['reference'])[:14],
+            str(entry['description'])[:28],
+            '' if entry['debit'] is None else entry['debit'],
+            '' if entry['credit'] is None else entry['credit'],
+            entry['balance'],
+        ))
+        if len(lines) >= body_lines:
+            page_number += 1
+            yield header + lines[:body_lines] + ['', f'Page {page_number}']
+            lines = lines[body_lines:]
+
+    if lines or not page_number:
+        yield header + lines + ['', f'Page {page_number + 1}']
+
+
+def stream_pdf(title, entries):
+    return pdf.stream_pdf(_pdf_pages(title, entries))
@@ -0,0 +1,127 @@
+"""
+Concurrent repayment posting stress test.
+
+Each thread plays a teller posting repayments one at a time through
+LoanRepayment.save(), the path the tellers use. Two scenarios are timed
+for each thread count:
+
+- different loans: every thread posts to its own loan. Nothing is shared
+  but the tables, so throughput should grow with the thread count on a
+  server database. SQLite takes one writer at a time and cannot scale.
+- same loan: every thread posts to one loan. Postings queue on the loan's
+  row lock, so throughput stays flat, but no payment may be lost.
+
+After each run every loan's running totals must match both the payments
+posted and a recomputation from its history (update_loan_balances()),
+and each installment's is_paid must match the payments against it.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.db import connection, models
+from django.utils import timezone
+
+from .benchmarks import CLIENTS_PER_LOAN, seed_clients
+from .models import Loan, LoanRepayment, LoanRepaymentSchedule
+
+DEFAULT_THREADS = [1, 2, 4, 8]
+DEFAULT_PAYMENTS = 200  # per thread
+PAYMENT_AMOUNT = Decimal('5.00')
+SCENARIOS = ['different_loans', 'same_loan']
+
+
+def prepare_loans(count, seed=0):
+    """Seed at least ``count`` loans and return their ids"""
+    seed_clients(count * CLIENTS_PER_LOAN, seed)
+    return list(Loan.objects.order_by('pk').values_list('pk', flat=True)[:count])
+
+
+def _teller(loan_id, payments, tag):
+    """Post ``payments`` repayments to a loan, spread over its installments"""
+    try:
+        loan = Loan.objects.get(pk=loan_id)
+        schedules = list(loan.repayment_schedule.order_by('due_date'))
+        today = timezone.now().date()
+        for number in range(payments):
+            LoanRepayment(
+                loan=loan, schedule=schedules[number % len(schedules)], payment_date=today,
+                amount_paid=PAYMENT_AMOUNT, payment_mode='cash', receipt_number=f'STRESS-{tag}-{number}',
+            ).save()
+    finally:
+        # Each thread has its own connection
+        connection.close()
+
+
+def run_scenario(loan_ids, scenario, threads, payments):
+    """Post from ``threads`` tellers at once; returns timings and any total mismatches"""
+    targets = [loan_ids[0]] * threads if scenario == 'same_loan' else loan_ids[:threads]
+    paid_before = dict(Loan.objects.filter(pk__in=targets).values_list('pk', 'total_amount_paid'))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [
+            pool.submit(_teller, loan_id, payments, f'{scenario}-{threads}-{number}')
+            for number, loan_id in enumerate(targets)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    expected = {loan_id: paid_before[loan_id] for loan_id in targets}
+    for loan_id in targets:
+        expected[loan_id] += PAYMENT_AMOUNT * payments
+    return {
+        'scenario': scenario,
+        'threads': threads,
+        'payments': threads * payments,
+        'seconds': round(elapsed, 3),
+        'per_second': round(threads * payments / elapsed, 1),
+        'mismatches': verify_loans(expected),
+    }
+
+
+def verify_loans(expected_paid):
+    """Check loans against the payments posted and their own history.
+
+    ``expected_paid`` maps loan ids to the total_amount_paid they should
+    hold. Returns (loan id, field, stored, expected) per mismatch.
+    """
+    mismatches = []
+    for loan in Loan.objects.filter(pk__in=expected_paid).order_by('pk'):
+        stored = {field: Decimal(str(getattr(loan, field))) for field in Loan.RUNNING_TOTAL_FIELDS}
+        if stored['total_amount_paid'] != expected_paid[loan.pk]:
+            mismatches.append((loan.pk, 'total_amount_paid', stored['total_amount_paid'], expected_paid[loan.pk]))
+        loan.update_loan_balances()
+        for field, value in stored.items():
+            recomputed = Decimal(str(getattr(loan, field)))
+            if value != recomputed:
+                mismatches.append((loan.pk, field, value, recomputed))
+
+    installments = (
+        LoanRepaymentSchedule.objects.filter(loan_id__in=expected_paid, payments__isnull=False)
+        .annotate(paid=models.Sum('payments__amount_paid'))
+        .order_by('pk')
+    )
+    for installment in installments:
+        if installment.is_paid != (installment.paid >= installment.total_amount_due):
+            mismatches.append((installment.loan_id, f'schedule {installment.pk} is_paid',
+                               installment.is_paid, not installment.is_paid))
+    return mismatches
+
+
+def run_stress(thread_counts=DEFAULT_THREADS, payments=DEFAULT_PAYMENTS, scenarios=SCENARIOS, seed=0,
+               progress=None):
+    """Run every scenario at every thread count; returns the results in order.
+
+    ``progress`` is called with each result as it completes.
+    """
+    loan_ids = prepare_loans(max(thread_counts), seed)
+    results = []
+    for scenario in scenarios:
+        for threads in sorted(thread_counts):
+            result = run_scenario(loan_ids, scenario, threads, payments)
+            results.append(result)
+            if progress:
+                progress(result)
+    return results
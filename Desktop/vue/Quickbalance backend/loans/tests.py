@@ -1,176 +1,655 @@
-from django.test import TestCase
-
-# Create your tests here.
-from django.db import models
-from django.utils import timezone
-from django.core.validators import MinValueValidator
+import io
+import json
+from datetime import date, timedelta
 from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import QuerySet, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from clients.models import Client
+from .benchmarks import _page, _time, compare_cases, seed_clients
+from .bulk import ingest_repayments, parse_repayment_rows, validate_repayment_rows
+from .calculations import _amortize, amortization_schedule, quote_loans
+from .concurrency import is_conflict, run_with_retry
+from .models import Loan, LoanAgingState, LoanFeeCharge, LoanFineCharge, LoanRepayment, PortfolioAgingSummary
+from .renewals import renew_loans
+
 
-class LoanRenewal(models.Model):
-    RENEWAL_TYPE_CHOICES = [
-        ('full', 'Full Renewal - Same Terms'),
-        ('partial', 'Partial Renewal - Adjusted Terms'),
-        ('extended', 'Extended Term Only'),
-    ]
-    
-    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name="renewals")
-    renewal_date = models.DateField(default=timezone.now)
-    renewal_type = models.CharField(max_length=20, choices=RENEWAL_TYPE_CHOICES, default='full')
-    # New terms after renewal
-    new_principal_amount = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2,
-        validators=[MinValueValidator(0)],
-        help_text="Principal amount for renewed loan (usually the outstanding balance)"
+def make_client(phone='0700000001', **fields):
+    return Client.objects.create(
+        first_name='Test', other_names='Client', phone=phone, other_phoneNos=f'x{phone}',
+        national_id=f'NID{phone}', passport_number=f'P{phone}', **fields
     )
-    new_interest_rate = models.DecimalField(
-        max_digits=5, 
-        decimal_places=2,
-        help_text="Interest rate for renewed loan period"
+
+
+def make_loan(client, **fields):
+    terms = dict(
+        loan_type='personal', principal_amount=Decimal('1000.00'), loan_terms=4,
+        interest_rate=Decimal('10.00'), repayment_frequency='monthly', status='active',
+        start_date=date(2024, 1, 1),
     )
-    new_loan_term = models.PositiveIntegerField(help_text="Renewed loan term in months")
-    new_due_date = models.DateField(help_text="New due date after renewal")
-    reason = models.TextField(help_text="Reason for renewal")
-    terms_accepted = models.BooleanField(default=False, help_text="Client has accepted new terms")
-    
-    
-    class Meta:
-        ordering = ['-renewal_date']
-        verbose_name = "Loan Renewal"
-        verbose_name_plural = "Loan Renewals"
-    
-    def __str__(self):
-        return f"Renewal #{self.id} for Loan #{self.loan.id} on {self.renewal_date}"
-    
-    def calculate_renewal_terms(self):
-        """Calculate the new terms for the renewed loan"""
-        # Get the current outstanding balance
-        current_balance = self.loan.current_balance
-        
-        # Calculate any accrued interest up to renewal date
-        accrued_interest = self._calculate_accrued_interest()
-        
-        # Set new principal to current balance + accrued interest + fees
-        self.new_principal_amount = current_balance + accrued_interest + self.renewal_fee + self.processing_fee
-        
-        # Store the capitalized interest
-        self.interest_capitalized = accrued_interest
-        
-        # Calculate total renewal amount
-        self.total_renewal_amount = self.new_principal_amount
-        
-        # Set new due date (extend by the same term or new term)
-        if self.renewal_type == 'full':
-            self.new_due_date = self.renewal_date + timedelta(days=30 * self.previous_loan_term)
-            self.new_loan_term = self.previous_loan_term
-            self.new_interest_rate = self.previous_interest_rate
-        else:
-            # For partial or extended renewals, use the provided values
-            self.new_due_date = self.renewal_date + timedelta(days=30 * self.new_loan_term)
-    
-    def _calculate_accrued_interest(self):
-        """Calculate interest accrued from last payment to renewal date"""
-        # Get the last payment date or loan start date
-        last_payment = self.loan.repayments.order_by('-payment_date').first()
-        start_date = last_payment.payment_date if last_payment else self.loan.start_date
-        
-        # Calculate days between last payment and renewal
-        days_elapsed = (self.renewal_date - start_date).days
-        
-        # Calculate daily interest rate
-        daily_rate = (self.loan.interest_rate / 100) / 365
-        
-        # Calculate accrued interest
-        accrued_interest = self.loan.current_balance * daily_rate * days_elapsed
-        
-        return Decimal(accrued_interest).quantize(Decimal('0.01'))
-    
-    def save(self, *args, **kwargs):
-        # Set previous loan state if not already set
-        if not self.pk:
-            self.previous_balance = self.loan.current_balance
-            self.previous_interest_rate = self.loan.interest_rate
-            self.previous_loan_term = self.loan.loan_term_months
-            self.previous_due_date = self.loan.due_date
-            
-            # Calculate renewal terms
-            self.calculate_renewal_terms()
-        
-        super().save(*args, **kwargs)
-        
-        # Charge renewal fees if applicable
-        self._charge_renewal_fees()
-        
-        # Update the main loan with new terms if terms are accepted
-        if self.terms_accepted:
-            self._update_loan_terms()
-    
-    def _charge_renewal_fees(self):
-        """Charge renewal and processing fees"""
-        fees_to_charge = []
-        
-        if self.renewal_fee > 0:
-            fees_to_charge.append(('renewal', self.renewal_fee, "Loan renewal fee"))
-        
-        if self.processing_fee > 0:
-            fees_to_charge.append(('processing', self.processing_fee, "Renewal processing fee"))
-        
-        for fee_type, amount, description in fees_to_charge:
-            LoanFeeCharge.objects.create(
-                loan=self.loan,
-                fee_type=fee_type,
-                amount=amount,
-                description=f"{description} for renewal on {self.renewal_date}"
-            )
-    
-    def _update_loan_terms(self):
-        """Update the main loan with the renewed terms"""
-        self.loan.principal_amount = self.new_principal_amount
-        self.loan.interest_rate = self.new_interest_rate
-        self.loan.loan_term_months = self.new_loan_term
-        self.loan.due_date = self.new_due_date
-        self.loan.status = 'active'  # Reset status to active
-        
-        # Recalculate total loan amount
-        self.loan.total_loan_amount = self.loan.calculate_total_loan_amount()
-        self.loan.current_balance = self.loan.total_loan_amount
-        
-        # Reset repayment schedule
-        self._create_new_repayment_schedule()
-        
+    terms.update(fields)
+    return Loan.objects.create(client=client, **terms)
+
+
+class LoanBalanceTestCase(TestCase):
+    def setUp(self):
+        self.client_record = make_client()
+        self.loan = make_loan(self.client_record)
+
+    def assertReconciles(self, *loans):
+        """Running totals match a full recount from the transaction rows"""
+        for loan in loans:
+            running = Loan.objects.filter(pk=loan.pk).values(*Loan.RUNNING_TOTAL_FIELDS).get()
+            loan.refresh_from_db()
+            loan.update_loan_balances()
+            recounted = Loan.objects.filter(pk=loan.pk).values(*Loan.RUNNING_TOTAL_FIELDS).get()
+            self.assertEqual(running, recounted)
+
+    def totals(self, loan=None):
+        return Loan.objects.filter(pk=(loan or self.loan).pk).values(*Loan.RUNNING_TOTAL_FIELDS).get()
+
+
+class BalancePostingTests(LoanBalanceTestCase):
+    def test_fee_create_edit_move_delete(self):
+        other = make_loan(make_client('0700000002'))
+        fee = LoanFeeCharge.objects.create(loan=self.loan, fee_type='service', amount=Decimal('36.00'))
+        self.assertEqual(self.totals()['total_fees_charged'], Decimal('36.00'))
+        self.assertReconciles(self.loan)
+
+        fee.amount = Decimal('40.00')
+        fee.save()
+        self.assertEqual(self.totals()['total_fees_charged'], Decimal('40.00'))
+        self.assertReconciles(self.loan)
+
+        fee.loan = other
+        fee.save()
+        self.assertEqual(self.totals()['total_fees_charged'], Decimal('0.00'))
+        self.assertEqual(self.totals(other)['total_fees_charged'], Decimal('40.00'))
+        self.assertReconciles(self.loan, other)
+
+        fee.delete()
+        self.assertEqual(self.totals(other)['total_fees_charged'], Decimal('0.00'))
+        self.assertReconciles(self.loan, other)
+
+    def test_fine_edit_posts_only_the_difference(self):
+        fine = LoanFineCharge.objects.create(loan=self.loan, fine_type='late_payment', amount=Decimal('10.00'))
+        version = Loan.objects.get(pk=self.loan.pk).version
+        fine.reason = 'no amount change'
+        fine.save()
+        self.assertEqual(Loan.objects.get(pk=self.loan.pk).version, version)
+        self.assertEqual(self.totals()['total_fines_charged'], Decimal('10.00'))
+        self.assertReconciles(self.loan)
+
+    def test_repayment_create_edit_move_delete(self):
+        other = make_loan(make_client('0700000002'))
+        repayment = LoanRepayment.objects.create(
+            loan=self.loan, amount_paid=Decimal('200.00'), payment_mode='cash', receipt_number='R1'
+        )
+        totals = self.totals()
+        self.assertEqual(totals['total_amount_paid'], Decimal('200.00'))
+        self.assertEqual(totals['current_balance'], self.loan.total_loan_amount - Decimal('200.00'))
+        self.assertReconciles(self.loan)
+
+        repayment.amount_paid = Decimal('150.00')
+        repayment.save()
+        self.assertEqual(self.totals()['total_amount_paid'], Decimal('150.00'))
+        self.assertReconciles(self.loan)
+
+        repayment.loan = other
+        repayment.save()
+        self.assertEqual(self.totals()['total_amount_paid'], Decimal('0.00'))
+        self.assertEqual(self.totals(other)['total_amount_paid'], Decimal('150.00'))
+        self.assertReconciles(self.loan, other)
+
+        repayment.delete()
+        self.assertEqual(self.totals(other)['total_amount_paid'], Decimal('0.00'))
+        self.assertReconciles(self.loan, other)
+
+    def test_stale_loan_save_keeps_posted_totals(self):
+        stale = Loan.objects.get(pk=self.loan.pk)
+        LoanRepayment.objects.create(loan=self.loan, amount_paid=Decimal('75.00'), payment_mode='cash', receipt_number='R1')
+        stale.loan_purpose = 'edited'
+        stale.save()
+        self.assertEqual(self.totals()['total_amount_paid'], Decimal('75.00'))
+        self.assertReconciles(self.loan)
+
+
+class AllocationTests(LoanBalanceTestCase):
+    def setUp(self):
+        super().setUp()
+        # 20 fines, 30 fees and 100 interest outstanding
+        LoanFineCharge.objects.create(loan=self.loan, fine_type='late_payment', amount=Decimal('20.00'))
+        LoanFeeCharge.objects.create(loan=self.loan, fee_type='service', amount=Decimal('30.00'))
+        Loan.objects.filter(pk=self.loan.pk).update(total_interest_charged=Decimal('100.00'))
+
+    def pay(self, amount, receipt='R1', **fields):
+        return LoanRepayment.objects.create(
+            loan=self.loan, amount_paid=Decimal(amount), payment_mode='cash', receipt_number=receipt, **fields
+        )
+
+    def split(self, repayment):
+        return [repayment.fines_paid, repayment.fees_paid, repayment.interest_paid, repayment.principal_paid]
+
+    def test_default_order_settles_fines_fees_interest_then_principal(self):
+        self.assertEqual(self.split(self.pay('40.00')), [Decimal('20.00'), Decimal('20.00'), 0, 0])
+        self.assertEqual(self.split(self.pay('200.00', 'R2')), [0, Decimal('10.00'), Decimal('100.00'), Decimal('90.00')])
+        totals = self.totals()
+        self.assertEqual(totals['total_fines_paid'], Decimal('20.00'))
+        self.assertEqual(totals['total_fees_paid'], Decimal('30.00'))
+        self.assertEqual(totals['total_interest_paid'], Decimal('100.00'))
+        self.assertEqual(totals['total_principal_paid'], Decimal('90.00'))
+
+    @override_settings(LOAN_ALLOCATION_ORDER={
+        'default': ['fines', 'fees', 'interest', 'principal'],
+        'personal': ['interest', 'principal', 'fees', 'fines'],
+    })
+    def test_order_per_loan_type(self):
+        self.assertEqual(self.split(self.pay('150.00')), [0, 0, Decimal('100.00'), Decimal('50.00')])
+
+    def test_overpayment_goes_to_principal(self):
+        counters = {field: Decimal('0') for field in Loan.allocation_counter_fields()[1:]}
+        allocation = Loan.split_payment(dict(counters, loan_type='personal'), Decimal('25.00'))
+        self.assertEqual(allocation, {
+            'fines': Decimal('0'), 'fees': Decimal('0'), 'interest': Decimal('0'), 'principal': Decimal('25.00'),
+        })
+
+    def test_editing_amount_reallocates_with_own_allocation_as_credit(self):
+        repayment = self.pay('40.00')
+        repayment.amount_paid = Decimal('60.00')
+        repayment.principal_paid = repayment.interest_paid = repayment.fees_paid = repayment.fines_paid = 0
+        repayment.save()
+        self.assertEqual(self.split(repayment), [Decimal('20.00'), Decimal('30.00'), Decimal('10.00'), 0])
+        self.assertReconciles(self.loan)
+
+    def test_split_given_by_caller_is_kept(self):
+        repayment = self.pay('50.00', principal_paid=Decimal('50.00'))
+        self.assertEqual(self.split(repayment), [0, 0, 0, Decimal('50.00')])
+        self.assertReconciles(self.loan)
+
+
+class BulkRepaymentImportTests(LoanBalanceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.installment = self.loan.regenerate_repayment_schedule()[0]
+
+    def row(self, receipt, amount='100.00', **fields):
+        return dict(loan=self.loan.pk, amount_paid=amount, payment_mode='cash', receipt_number=receipt,
+                    payment_date='2024-02-01', **fields)
+
+    def ingest(self, rows, **options):
+        valid, errors = validate_repayment_rows(rows)
+        self.assertEqual(errors, [])
+        return ingest_repayments(valid, **options)
+
+    def test_duplicate_receipts_in_batch_and_on_file_are_skipped(self):
+        LoanRepayment.objects.create(
+            loan=self.loan, amount_paid=Decimal('10.00'), payment_mode='cash', receipt_number='ON-FILE'
+        )
+        summary = self.ingest([self.row('A'), self.row('A'), self.row('ON-FILE'), self.row('B')])
+        self.assertEqual(summary, {'created': 2, 'duplicates': 2, 'loans_updated': 1})
+        self.assertEqual(LoanRepayment.objects.filter(receipt_number='A').count(), 1)
+        self.assertEqual(self.totals()['total_amount_paid'], Decimal('210.00'))
+        self.assertReconciles(self.loan)
+
+    def test_duplicates_across_chunks_and_reruns_are_skipped(self):
+        rows = [self.row('A'), self.row('B'), self.row('A'), self.row('C')]
+        summary = self.ingest(rows, chunk_size=2)
+        self.assertEqual(summary['created'], 3)
+        self.assertEqual(summary['duplicates'], 1)
+
+        rerun = self.ingest(rows, chunk_size=2)
+        self.assertEqual(rerun['created'], 0)
+        self.assertEqual(rerun['duplicates'], 4)
+        self.assertEqual(self.totals()['total_amount_paid'], Decimal('300.00'))
+
+    def test_rows_allocate_in_order_and_settle_the_schedule(self):
+        LoanFeeCharge.objects.create(loan=self.loan, fee_type='service', amount=Decimal('30.00'))
+        self.ingest([
+            self.row('A', '20.00'),
+            self.row('B', str(self.installment.total_amount_due), schedule=self.installment.pk),
+        ])
+        first, second = LoanRepayment.objects.order_by('pk')
+        self.assertEqual(first.fees_paid, Decimal('20.00'))
+        self.assertEqual(second.fees_paid, Decimal('10.00'))
+        self.installment.refresh_from_db()
+        self.assertTrue(self.installment.is_paid)
+        self.assertReconciles(self.loan)
+
+    def test_validation_reports_unknown_loans_and_foreign_schedules(self):
+        other = make_loan(make_client('0700000002'))
+        other_installment = other.regenerate_repayment_schedule()[0]
+        valid, errors = validate_repayment_rows([
+            self.row('A'),
+            dict(self.row('B'), loan=999999),
+            self.row('C', schedule=other_installment.pk),
+            dict(self.row('D'), amount_paid='-1'),
+        ])
+        self.assertEqual(len(valid), 1)
+        self.assertEqual([error['row'] for error in errors], [2, 3, 4])
+
+    def test_csv_blank_cells_are_not_provided(self):
+        stream = io.StringIO(
+            "loan,schedule,amount_paid,payment_mode,receipt_number,notes\n"
+            f"{self.loan.pk},,50.00,cash,CSV-1,\n"
+        )
+        rows = parse_repayment_rows(stream, 'csv')
+        self.assertEqual(rows, [{'loan': str(self.loan.pk), 'amount_paid': '50.00',
+                                 'payment_mode': 'cash', 'receipt_number': 'CSV-1'}])
+
+    def test_endpoint_rejects_the_batch_on_validation_errors(self):
+        api = APIClient()
+        api.force_authenticate(get_user_model().objects.create_user('teller', password='x'))
+        response = api.post('/api/loans/repayments/bulk/', [self.row('A'), dict(self.row('B'), loan=999999)], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(LoanRepayment.objects.exists())
+
+        response = api.post('/api/loans/repayments/bulk/', [self.row('A'), self.row('A')], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['duplicates'], 1)
+
+
+class DeferredPostingTests(LoanBalanceTestCase):
+    def test_saving_deferred_fee_does_not_post_again(self):
+        fee = LoanFeeCharge.objects.create(loan=self.loan, fee_type='service', amount=Decimal('36.00'))
+        deferred = LoanFeeCharge.objects.only('id', 'description').get(pk=fee.pk)
+        deferred.description = 'edited'
+        deferred.save()
+        self.assertEqual(self.totals()['total_fees_charged'], Decimal('36.00'))
+        self.assertReconciles(self.loan)
+
+    def test_saving_deferred_fine_with_new_amount_posts_the_difference(self):
+        fine = LoanFineCharge.objects.create(loan=self.loan, fine_type='other', amount=Decimal('20.00'))
+        deferred = LoanFineCharge.objects.defer('amount').get(pk=fine.pk)
+        deferred.amount = Decimal('25.00')
+        deferred.save()
+        self.assertEqual(self.totals()['total_fines_charged'], Decimal('25.00'))
+        self.assertReconciles(self.loan)
+
+    def test_saving_instance_built_with_existing_pk(self):
+        fee = LoanFeeCharge.objects.create(loan=self.loan, fee_type='service', amount=Decimal('36.00'))
+        LoanFeeCharge(pk=fee.pk, loan=self.loan, fee_type='service', amount=Decimal('40.00')).save()
+        self.assertEqual(self.totals()['total_fees_charged'], Decimal('40.00'))
+        self.assertReconciles(self.loan)
+
+    def test_deleting_deferred_repayment_reverses_it(self):
+        repayment = LoanRepayment.objects.create(
+            loan=self.loan, amount_paid=Decimal('100.00'), payment_mode='cash', receipt_number='R1'
+        )
+        LoanRepayment.objects.only('id').get(pk=repayment.pk).delete()
+        self.assertEqual(self.totals()['total_amount_paid'], Decimal('0.00'))
+        self.assertReconciles(self.loan)
+
+
+class DeletePostingTests(LoanBalanceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.installment = self.loan.regenerate_repayment_schedule()[0]
+
+    def pay_installment(self, receipt='R1'):
+        return LoanRepayment.objects.create(
+            loan=self.loan, schedule=self.installment, amount_paid=self.installment.total_amount_due,
+            payment_date=self.installment.due_date, payment_mode='cash', receipt_number=receipt,
+        )
+
+    def aging_balance(self):
+        return PortfolioAgingSummary.objects.aggregate(total=Sum('outstanding_balance'))['total']
+
+    def test_deleting_repayment_reopens_installment_and_refreshes_aging(self):
+        repayment = self.pay_installment()
+        self.installment.refresh_from_db()
+        self.assertTrue(self.installment.is_paid)
+
+        repayment.delete()
+        self.installment.refresh_from_db()
+        self.assertFalse(self.installment.is_paid)
+        self.loan.refresh_from_db()
+        self.assertEqual(LoanAgingState.objects.get(loan=self.loan).outstanding_balance, self.loan.current_balance)
+        self.assertEqual(self.aging_balance(), self.loan.current_balance)
+        self.assertReconciles(self.loan)
+
+    def test_queryset_delete_reverses_repayments(self):
+        self.pay_installment('R1')
+        LoanRepayment.objects.create(loan=self.loan, amount_paid=Decimal('50.00'), payment_mode='cash', receipt_number='R2')
+
+        deleted, per_model = LoanRepayment.objects.filter(loan=self.loan).delete()
+        self.assertEqual(deleted, 2)
+        self.assertEqual(per_model, {'loans.LoanRepayment': 2})
+        self.assertEqual(self.totals()['total_amount_paid'], Decimal('0.00'))
+        self.installment.refresh_from_db()
+        self.assertFalse(self.installment.is_paid)
+        self.loan.refresh_from_db()
+        self.assertEqual(self.aging_balance(), self.loan.current_balance)
+        self.assertReconciles(self.loan)
+
+    def test_queryset_delete_reverses_fees_and_fines_across_loans(self):
+        other = make_loan(make_client('0700000002'))
+        for loan in (self.loan, other):
+            LoanFeeCharge.objects.create(loan=loan, fee_type='service', amount=Decimal('36.00'))
+            LoanFineCharge.objects.create(loan=loan, fine_type='other', amount=Decimal('5.00'))
+
+        LoanFeeCharge.objects.all().delete()
+        self.loan.fine_charges.all().delete()
+        self.assertEqual(self.totals()['total_fees_charged'], Decimal('0.00'))
+        self.assertEqual(self.totals()['total_fines_charged'], Decimal('0.00'))
+        self.assertEqual(self.totals(other)['total_fines_charged'], Decimal('5.00'))
+        self.assertReconciles(self.loan, other)
+
+    def test_sliced_queryset_delete_is_refused(self):
+        with self.assertRaises(TypeError):
+            LoanFeeCharge.objects.all()[:1].delete()
+
+
+class PortfolioAgingTests(LoanBalanceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.installments = self.loan.regenerate_repayment_schedule()
+        self.first_due = self.installments[0].due_date
+
+    def summary(self):
+        return {
+            (row.status, row.bucket): (row.loan_count, row.outstanding_balance)
+            for row in PortfolioAgingSummary.objects.all()
+            if row.loan_count or row.outstanding_balance
+        }
+
+    def balance(self):
+        return Loan.objects.get(pk=self.loan.pk).current_balance
+
+    def test_loan_moves_bucket_as_installments_fall_overdue(self):
+        PortfolioAgingSummary.refresh_loans([self.loan.pk], as_of=self.first_due)
+        self.assertEqual(self.summary(), {('active', 'current'): (1, self.balance())})
+
+        PortfolioAgingSummary.refresh_loans([self.loan.pk], as_of=self.first_due + timedelta(days=45))
+        self.assertEqual(self.summary(), {('active', '31_60'): (1, self.balance())})
+        self.assertEqual(LoanAgingState.objects.get(loan=self.loan).oldest_unpaid_due_date, self.first_due)
+
+    def test_paying_the_oldest_installment_moves_the_loan(self):
+        as_of = self.first_due + timedelta(days=10)
+        PortfolioAgingSummary.refresh_loans([self.loan.pk], as_of=as_of)
+        self.assertIn(('active', '1_30'), self.summary())
+
+        LoanRepayment.objects.create(
+            loan=self.loan, schedule=self.installments[0], amount_paid=self.installments[0].total_amount_due,
+            payment_date=self.first_due, payment_mode='cash', receipt_number='R1',
+        )
+        PortfolioAgingSummary.refresh_loans([self.loan.pk], as_of=as_of)
+        self.assertEqual(self.summary(), {('active', 'current'): (1, self.balance())})
+
+    def test_closed_loans_leave_the_summary(self):
+        self.loan.status = 'closed'
         self.loan.save()
-    
-    def _create_new_repayment_schedule(self):
-        """Create a new repayment schedule for the renewed loan"""
-        # Delete existing unpaid schedule items
-        self.loan.repayment_schedule.filter(is_paid=False).delete()
-        
-        # Create new schedule based on repayment frequency
-        monthly_payment = self.new_principal_amount / self.new_loan_term
-        
-        for i in range(self.new_loan_term):
-            due_date = self.renewal_date + timedelta(days=30 * (i + 1))
-            
-            LoanRepaymentSchedule.objects.create(
-                loan=self.loan,
-                due_date=due_date,
-                principal_amount=monthly_payment,
-                interest_amount=0,  # Would need interest calculation logic
-                total_amount_due=monthly_payment,
-                is_paid=False
+        self.assertEqual(self.summary(), {})
+        self.assertFalse(LoanAgingState.objects.filter(loan=self.loan).exists())
+
+    def test_incremental_summary_matches_a_rebuild(self):
+        other = make_loan(make_client('0700000002'), loan_type='business', status='delinquent')
+        other.regenerate_repayment_schedule()
+        LoanRepayment.objects.create(loan=other, amount_paid=Decimal('60.00'), payment_mode='cash', receipt_number='R1')
+        as_of = self.first_due + timedelta(days=100)
+        PortfolioAgingSummary.refresh_all(as_of=as_of)
+        incremental = self.summary()
+
+        PortfolioAgingSummary.refresh_all(as_of=as_of, rebuild=True)
+        self.assertEqual(self.summary(), incremental)
+        self.assertEqual(incremental[('active', 'over_90')], (1, self.balance()))
+
+    def test_unchanged_loans_write_nothing(self):
+        PortfolioAgingSummary.refresh_loans([self.loan.pk], as_of=self.first_due)
+        with self.assertNumQueries(4):
+            # Loans, locked states, and the savepoint around them
+            PortfolioAgingSummary.refresh_loans([self.loan.pk], as_of=self.first_due)
+
+
+def lock_conflict():
+    return OperationalError('database is locked')
+
+
+@override_settings(LOAN_POSTING_RETRY_BACKOFF=0)
+class PostingRetryTests(TransactionTestCase):
+    def setUp(self):
+        self.loan = make_loan(make_client())
+
+    def failing(self, failures, error=lock_conflict):
+        calls = []
+
+        def func():
+            calls.append(True)
+            if len(calls) <= failures:
+                raise error()
+            return len(calls)
+        return func, calls
+
+    def test_conflict_errors(self):
+        self.assertTrue(is_conflict(lock_conflict()))
+        self.assertTrue(is_conflict(OperationalError(1213, 'Deadlock found')))
+        self.assertTrue(is_conflict(OperationalError(1205, 'Lock wait timeout exceeded')))
+        self.assertFalse(is_conflict(OperationalError(2006, 'MySQL server has gone away')))
+        self.assertFalse(is_conflict(ValueError('database is locked')))
+
+    def test_conflicts_are_retried_with_reset(self):
+        func, calls = self.failing(2)
+        resets = []
+        self.assertEqual(run_with_retry(func, reset=lambda: resets.append(True)), 3)
+        self.assertEqual(len(resets), 2)
+
+    @override_settings(LOAN_POSTING_RETRIES=3)
+    def test_gives_up_after_the_configured_attempts(self):
+        func, calls = self.failing(5)
+        with self.assertRaises(OperationalError):
+            run_with_retry(func)
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        func, calls = self.failing(1, error=lambda: OperationalError(2006, 'gone away'))
+        with self.assertRaises(OperationalError):
+            run_with_retry(func)
+        self.assertEqual(len(calls), 1)
+
+    def test_inside_an_outer_transaction_the_owner_handles_it(self):
+        func, calls = self.failing(1)
+        with self.assertRaises(OperationalError), transaction.atomic():
+            run_with_retry(func)
+        self.assertEqual(len(calls), 1)
+
+    def test_repayment_retried_after_a_conflict_posts_once(self):
+        LoanFeeCharge.objects.create(loan=self.loan, fee_type='service', amount=Decimal('30.00'))
+        real_lock = Loan.lock_counters.__func__
+        attempts = []
+
+        def conflict_once(cls, loan_ids):
+            attempts.append(True)
+            if len(attempts) == 1:
+                raise lock_conflict()
+            return real_lock(cls, loan_ids)
+
+        with mock.patch.object(Loan, 'lock_counters', classmethod(conflict_once)):
+            repayment = LoanRepayment.objects.create(
+                loan=self.loan, amount_paid=Decimal('50.00'), payment_mode='cash', receipt_number='R1'
             )
-    
-    def get_renewal_summary(self):
-        """Get a summary of the renewal changes"""
-        return {
-            'previous_balance': self.previous_balance,
-            'new_principal': self.new_principal_amount,
-            'interest_capitalized': self.interest_capitalized,
-            'fees_charged': self.renewal_fee + self.processing_fee,
-            'previous_interest_rate': f"{self.previous_interest_rate}%",
-            'new_interest_rate': f"{self.new_interest_rate}%",
-            'previous_term': f"{self.previous_loan_term} months",
-            'new_term': f"{self.new_loan_term} months",
-            'previous_due_date': self.previous_due_date,
-            'new_due_date': self.new_due_date,
-        }
\ No newline at end of file
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(LoanRepayment.objects.count(), 1)
+        self.assertEqual((repayment.fees_paid, repayment.principal_paid), (Decimal('30.00'), Decimal('20.00')))
+        loan = Loan.objects.get(pk=self.loan.pk)
+        self.assertEqual((loan.total_amount_paid, loan.total_fees_paid), (Decimal('50.00'), Decimal('30.00')))
+
+    def test_loans_are_locked_in_id_order(self):
+        other = make_loan(make_client('0700000002'))
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            Loan.lock_counters([other.pk, self.loan.pk])
+        [sql] = [query['sql'] for query in queries.captured_queries if 'FROM "loans_loan"' in query['sql']]
+        # By the selected pk column, ascending
+        self.assertRegex(sql, r'ORDER BY (1|"loans_loan"\."id") ASC')
+
+
+class AgingSummaryKeyTests(TestCase):
+    def add(self, officer_id=None, count=1, balance='10.00'):
+        PortfolioAgingSummary._add_to_row(('personal', 'active', officer_id, 'current'), count, Decimal(balance))
+
+    def test_key_is_unique_with_and_without_officer(self):
+        officer = get_user_model().objects.create_user('officer', password='x')
+        for officer_id in (None, officer.pk):
+            PortfolioAgingSummary.objects.create(
+                loan_type='personal', status='active', credit_officer_id=officer_id, bucket='current'
+            )
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                PortfolioAgingSummary.objects.create(
+                    loan_type='personal', status='active', credit_officer_id=officer_id, bucket='current'
+                )
+
+    def test_adds_to_existing_row(self):
+        self.add()
+        self.add(count=2, balance='5.00')
+        row = PortfolioAgingSummary.objects.get()
+        self.assertEqual((row.loan_count, row.outstanding_balance), (3, Decimal('15.00')))
+
+    def test_row_created_by_a_concurrent_refresh_is_added_to(self):
+        self.add()
+        real_update = QuerySet.update
+        missed = []
+
+        def miss_first_update(queryset, **kwargs):
+            # As if the other refresh inserted the row after this one looked
+            if not missed:
+                missed.append(True)
+                return 0
+            return real_update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=miss_first_update):
+            self.add(count=2, balance='5.00')
+        row = PortfolioAgingSummary.objects.get()
+        self.assertEqual((row.loan_count, row.outstanding_balance), (3, Decimal('15.00')))
+
+
+class PortfolioAtRiskViewTests(LoanBalanceTestCase):
+    def test_amounts_are_rendered_as_strings(self):
+        api = APIClient()
+        api.force_authenticate(get_user_model().objects.create_user('viewer', password='x'))
+        response = api.get('/api/loans/portfolio-at-risk/')
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report['loan_count'], 1)
+        self.loan.refresh_from_db()
+        self.assertEqual(report['outstanding_balance'], f"{self.loan.current_balance:.2f}")
+        self.assertEqual(report['buckets'][0]['outstanding_balance'], f"{self.loan.current_balance:.2f}")
+        self.assertIsInstance(report['par30']['ratio'], str)
+
+
+class BulkRenewalTests(LoanBalanceTestCase):
+    def test_zero_rate_is_kept(self):
+        summary = renew_loans([self.loan.pk], renewal_type='partial', new_interest_rate=Decimal('0'))
+        self.assertEqual(summary['renewed'], 1)
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.interest_rate, self.loan.loan_terms), (Decimal('0'), 4))
+        self.assertEqual(self.loan.renewals.get().new_interest_rate, Decimal('0'))
+
+    def test_missing_terms_fall_back_to_the_loan(self):
+        renew_loans([self.loan.pk], renewal_type='extended', new_loan_term=6)
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.interest_rate, self.loan.loan_terms), (Decimal('10.00'), 6))
+
+
+class LoanListingTests(LoanBalanceTestCase):
+    def test_next_installment_amount_has_two_places(self):
+        installment = self.loan.regenerate_repayment_schedule()[0]
+        api = APIClient()
+        api.force_authenticate(get_user_model().objects.create_user('viewer', password='x'))
+        expected = f"{installment.total_amount_due:.2f}"
+        listed = api.get('/api/loans/').json()['results'][0]
+        detail = api.get(f'/api/loans/{self.loan.pk}/').json()
+        self.assertEqual(listed['next_installment']['amount_due'], expected)
+        self.assertEqual(detail['next_installment']['amount_due'], expected)
+
+    def test_page_size_is_validated(self):
+        api = APIClient()
+        api.force_authenticate(get_user_model().objects.create_user('viewer', password='x'))
+        for page_size in ['0', '-5', 'ten']:
+            response = api.get('/api/loans/', {'page_size': page_size})
+            self.assertEqual(response.status_code, 400, page_size)
+            self.assertEqual(response.json(), {'error': 'page_size must be a positive integer'})
+        self.assertEqual(api.get('/api/loans/', {'page_size': '500'}).json()['page_size'], 50)
+
+
+class BenchmarkTests(LoanBalanceTestCase):
+    def setUp(self):
+        # The seeder numbers clients from the current count
+        pass
+
+    def test_seeded_loans_match_their_history(self):
+        seed_clients(200)
+        seeded = list(Loan.objects.all())
+        self.assertEqual(len(seeded), 20)
+        self.assertTrue(LoanRepayment.objects.exists())
+        self.assertReconciles(*seeded)
+
+    def test_case_comparisons_check_the_goal(self):
+        results = {'1000': {
+            'client_search_http_no_metrics': {'median_ms': 10.0},
+            'client_search_http': {'median_ms': 10.05},
+        }, '2000': {
+            'client_search_http_no_metrics': {'median_ms': 10.0},
+            'client_search_http': {'median_ms': 10.5},
+        }, '3000': {'client_search_http': {'median_ms': 10.0}}}
+        self.assertEqual(compare_cases(results), [
+            ('1000', 'metrics_middleware_overhead', 10.0, 10.05, 1.005, True),
+            ('2000', 'metrics_middleware_overhead', 10.0, 10.5, 1.05, False),
+        ])
+
+    def test_query_counts_survive_a_full_query_log(self):
+        connection.queries_log.extend([{'sql': '', 'time': '0'}] * connection.queries_log.maxlen)
+        [result] = _time(lambda: list(Client.objects.all()), repeat=1)
+        self.assertEqual(result['queries'], 1)
+
+    def test_page_cases_render_the_same_clients(self):
+        seed_clients(60)
+        Client.objects.filter(pk=Client.objects.order_by('pk').first().pk).update(credit_officer=None)
+        clients = Client.objects.order_by('pk')
+        self.assertEqual(json.loads(_page(clients, rows=True)()), json.loads(_page(clients, rows=False)()))
+
+
+class QuoteTests(TestCase):
+    def scenario(self, **fields):
+        terms = dict(principal=Decimal('1200'), annual_rate=Decimal('12'), periods=12, frequency='monthly',
+                     method='flat', start_date=date(2024, 1, 31))
+        terms.update(fields)
+        return terms
+
+    def test_installments_add_up_when_the_parts_run_out(self):
+        for method in ['flat', 'declining']:
+            schedule = amortization_schedule(Decimal('0.05'), Decimal('10'), 10, 'monthly', date(2024, 1, 31), method)
+            self.assertEqual(sum(row['principal'] for row in schedule), Decimal('0.05'))
+            self.assertEqual(schedule[-1]['balance'], Decimal('0'))
+            self.assertEqual(schedule[1]['due_date'], date(2024, 3, 31))
+
+    def test_other_start_dates_reuse_the_amounts(self):
+        _amortize.cache_clear()
+        first, later, same = quote_loans([
+            self.scenario(), self.scenario(start_date=date(2025, 6, 1)), self.scenario(principal='1200.00'),
+        ], include_schedule=True)
+        self.assertEqual(_amortize.cache_info().misses, 1)
+        self.assertEqual((first['installment'], first['total_interest']), (Decimal('112.00'), Decimal('144.00')))
+        self.assertEqual(first['maturity_date'], date(2025, 1, 31))
+        self.assertEqual(later['maturity_date'], date(2026, 6, 1))
+        self.assertEqual(later['schedule'][0]['due_date'], date(2025, 7, 1))
+        self.assertEqual([row['payment'] for row in later['schedule']], [row['payment'] for row in first['schedule']])
+        self.assertEqual(same, first)
+
+    def test_quote_endpoint(self):
+        api = APIClient()
+        api.force_authenticate(get_user_model().objects.create_user('officer', password='x'))
+        response = api.post('/api/loans/quote/', {'scenarios': [
+            {'principal': '1200', 'annual_rate': '12', 'periods': 12, 'method': 'declining'},
+            {'principal': '1200', 'annual_rate': '12', 'periods': 12, 'method': 'flat', 'start_date': '2024-01-31'},
+        ], 'include_schedule': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        declining, flat = response.json()['quotes']
+        self.assertEqual((declining['installment'], declining['effective_annual_rate']), ('106.62', '12.68'))
+        self.assertEqual((flat['total_payable'], flat['schedule'][-1]['balance']), ('1344.00', '0.00'))
+        self.assertEqual(flat['first_due_date'], '2024-02-29')
+        response = api.post('/api/loans/quote/', [{'principal': '0', 'annual_rate': '12', 'periods': 12}], format='json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,17 @@
+#endpoints
+from django.urls import path
+from . import views
+
+app_name = 'loans'
+
+urlpatterns = [
+    path('', views.loan_list, name='loan-list'),
+    path('quote/', views.loan_quote, name='loan-quote'),
+    path('export/', views.portfolio_export, name='portfolio-export'),
+    path('<int:pk>/', views.loan_detail, name='loan-detail'),
+    path('<int:pk>/statement/', views.loan_statement, name='loan-statement'),
+    path('clients/<int:client_id>/statement/', views.client_statement, name='client-statement'),
+    path('repayments/bulk/', views.repayment_bulk_create, name='repayment-bulk-create'),
+    path('renewals/bulk/', views.loan_bulk_renewal, name='loan-bulk-renewal'),
+    path('portfolio-at-risk/', views.portfolio_at_risk, name='portfolio-at-risk'),
+]
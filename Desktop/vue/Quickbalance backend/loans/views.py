@@ -1,3 +1,417 @@
-from django.shortcuts import render
+import io
+import logging
+from decimal import Decimal
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from clients.models import Client
+from config.etags import etag_matches, make_etag, not_modified, page_versions, rows_etag, with_etag
+from config.renderers import ORJSONRenderer
+from config.routers import read_from_replica
+from .export import STREAM_FORMATS, encode_chunks, export_chunks, gzip_stream, parse_columns
+from .calculations import quote_loans, to_cents
+from .bulk import IMPORT_FORMATS, ingest_repayments, parse_repayment_rows, validate_repayment_rows
+from .listing import LOAN_DETAIL_FIELDS, LOAN_LIST_FIELDS, encode_loan_row, encode_loan_rows, loan_rows
+from .models import Loan, PortfolioAgingSummary
+from .renewals import renew_loans
+from .serializers import LoanBulkRenewalSerializer, LoanQuoteSerializer
+from .statements import (
+    STATEMENT_COLUMNS, STATEMENT_FORMATS, client_statement_entries, statement_entries, stream_csv, stream_pdf,
+)
 
-# Create your views here.
+DEFAULT_PAGE_SIZE = 15
+MAX_PAGE_SIZE = 50
+MAX_QUOTE_SCENARIOS = 100
+MAX_BULK_RENEWALS = 10000
+# What a loan row's ETag covers besides its id: its own writes and its client's
+VERSION_FIELDS = ['version', 'client__version']
+
+logger = logging.getLogger(__name__)
+
+# PAR-n: share of the outstanding balance more than n days overdue
+PAR_THRESHOLDS = {'par1': 0, 'par30': 30, 'par90': 90}
+PAR_GROUPINGS = ['loan_type', 'status', 'credit_officer']
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, BrowsableAPIRenderer])
+@read_from_replica
+def loan_list(request):
+    # One query for the page of loans (plus the paginator's count)
+    try:
+        queryset = _apply_loan_filters(Loan.objects.all(), request)
+        queryset = queryset.order_by('-application_date', '-pk')
+
+        page = request.query_params.get('page', 1)
+        page_size = _parse_page_size(request)
+        # days_overdue moves with the date
+        as_of = timezone.now().date()
+        count = None
+        if request.META.get('HTTP_IF_NONE_MATCH'):
+            # Compare the page's ids and versions before reading its rows
+            versions, count = page_versions(queryset, ['pk', *VERSION_FIELDS], page_size, page)
+            etag = rows_etag('loans', versions, count, as_of)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+        paginator = Paginator(loan_rows(queryset, [*LOAN_LIST_FIELDS, *VERSION_FIELDS]), page_size)
+        if count is not None:
+            paginator.count = count
+        try:
+            loans = paginator.page(page)
+        except PageNotAnInteger:
+            loans = paginator.page(1)
+        except EmptyPage:
+            loans = paginator.page(paginator.num_pages)
+
+        etag = rows_etag('loans', [_pop_versions(row) for row in loans], paginator.count, as_of)
+        return with_etag(Response({
+            'count': paginator.count,
+            'total_pages': paginator.num_pages,
+            'current_page': loans.number,
+            'page_size': page_size,
+            'next': loans.next_page_number() if loans.has_next() else None,
+            'previous': loans.previous_page_number() if loans.has_previous() else None,
+            'results': encode_loan_rows(loans, as_of)
+        }), etag)
+
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to retrieve loan list", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, BrowsableAPIRenderer])
+def loan_detail(request, pk):
+    try:
+        as_of = timezone.now().date()
+        if request.META.get('HTTP_IF_NONE_MATCH'):
+            # Answer a poll from the versions alone
+            versions = Loan.objects.filter(pk=pk).values_list(*VERSION_FIELDS).first()
+            if versions is not None and etag_matches(request, _loan_etag(pk, *versions, as_of)):
+                return not_modified(_loan_etag(pk, *versions, as_of))
+
+        row = loan_rows(Loan.objects.filter(pk=pk), [*LOAN_DETAIL_FIELDS, *VERSION_FIELDS]).first()
+        if row is None:
+            return Response({"error": "Loan not found"}, status=status.HTTP_404_NOT_FOUND)
+        etag = _loan_etag(*_pop_versions(row), as_of)
+        return with_etag(Response(encode_loan_row(row, as_of)), etag)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to retrieve loan details", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_from_replica
+def loan_statement(request, pk):
+    # ?file_type=csv|pdf; DRF reserves ?format= for renderer selection
+    loan = get_object_or_404(Loan, pk=pk)
+    return _statement_response(
+        request, statement_entries(loan), STATEMENT_COLUMNS,
+        title=f"Loan #{loan.pk} statement - {loan.get_loan_type_display()}",
+        filename=f"loan-{loan.pk}-statement",
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_from_replica
+def client_statement(request, client_id):
+    # Every loan of the client, each with its own running balance
+    client = get_object_or_404(Client, pk=client_id)
+    name = f"{client.first_name} {client.other_names or ''}".strip()
+    return _statement_response(
+        request, client_statement_entries(client), ['loan'] + STATEMENT_COLUMNS,
+        title=f"Client #{client.pk} statement - {name}",
+        filename=f"client-{client.pk}-statement",
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_from_replica
+def portfolio_export(request):
+    # Streams the loan book; ?file_type=csv|jsonl|columnar&columns=a,b&gzip=1
+    try:
+        params = request.query_params
+        columns = parse_columns(params.get('columns'))
+        file_type = params.get('file_type', 'csv')
+        if file_type not in STREAM_FORMATS:
+            raise ValueError(f"file_type must be one of {STREAM_FORMATS}")
+        start_id = int(params['start_id']) if params.get('start_id') else None
+        end_id = int(params['end_id']) if params.get('end_id') else None
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    pieces = encode_chunks(export_chunks(columns, start_id, end_id), columns, file_type)
+    content_type = 'text/csv' if file_type == 'csv' else 'application/x-ndjson'
+    filename = f"portfolio-{timezone.now().date():%Y%m%d}.{file_type}"
+    if params.get('gzip') in ('1', 'true'):
+        pieces = gzip_stream(pieces)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(pieces, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, BrowsableAPIRenderer])
+def loan_quote(request):
+    # A list of scenarios, or {'scenarios': [...], 'include_schedule': true}
+    try:
+        if isinstance(request.data, list):
+            scenarios, include_schedule = request.data, False
+        else:
+            scenarios = request.data.get('scenarios', [])
+            include_schedule = bool(request.data.get('include_schedule', False))
+
+        if not scenarios:
+            return Response({"error": "No scenarios provided"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(scenarios) > MAX_QUOTE_SCENARIOS:
+            return Response(
+                {"error": f"At most {MAX_QUOTE_SCENARIOS} scenarios per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        valid, errors = [], []
+        for number, scenario in enumerate(scenarios, start=1):
+            serializer = LoanQuoteSerializer(data=scenario)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                errors.append({'scenario': number, 'errors': serializer.errors})
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        today = timezone.now().date()
+        for scenario in valid:
+            scenario.setdefault('start_date', today)
+        return Response({'quotes': quote_loans(valid, include_schedule)})
+
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to calculate quotes", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def repayment_bulk_create(request):
+    # Accepts an uploaded CSV/JSON settlement file, or a JSON list of repayments
+    try:
+        upload = request.FILES.get('file')
+        if upload is not None:
+            fmt = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+            if fmt not in IMPORT_FORMATS:
+                return Response(
+                    {"error": f"Unsupported file format, expected one of {IMPORT_FORMATS}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            rows = parse_repayment_rows(io.StringIO(upload.read().decode('utf-8-sig')), fmt)
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            rows = request.data.get('repayments', [])
+
+        if not rows:
+            return Response({"error": "No repayments provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+        valid_rows, errors = validate_repayment_rows(rows)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        summary = ingest_repayments(valid_rows)
+        return Response(summary, status=status.HTTP_201_CREATED)
+
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to import repayments", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def loan_bulk_renewal(request):
+    # {'loans': [ids], 'renewal_type', 'renewal_date', 'new_interest_rate', 'new_loan_term', 'reason'}
+    try:
+        serializer = LoanBulkRenewalSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        terms = dict(serializer.validated_data)
+        loan_ids = terms.pop('loans')
+        if len(loan_ids) > MAX_BULK_RENEWALS:
+            return Response(
+                {"error": f"At most {MAX_BULK_RENEWALS} loans per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        def progress(summary):
+            logger.info("Bulk renewal: %d/%d loans processed, %d renewed",
+                        summary['processed'], summary['total'], summary['renewed'])
+
+        summary = renew_loans(loan_ids, progress=progress, **terms)
+        return Response(summary)
+
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to renew loans", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, BrowsableAPIRenderer])
+@read_from_replica
+def portfolio_at_risk(request):
+    # Served from the maintained aging summary, never from the loan book
+    try:
+        rows = PortfolioAgingSummary.objects.all()
+        for param in PAR_GROUPINGS:
+            value = request.query_params.get(param)
+            if value:
+                rows = rows.filter(**{param: value})
+
+        group_by = request.query_params.get('group_by')
+        if group_by and group_by not in PAR_GROUPINGS:
+            return Response(
+                {"error": f"group_by must be one of {PAR_GROUPINGS}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        group_fields = [group_by] if group_by else []
+        totals = rows.values(*group_fields, 'bucket').annotate(
+            loan_count=Sum('loan_count'),
+            outstanding_balance=Sum('outstanding_balance'),
+        ).order_by()
+
+        groups = {}
+        for row in totals:
+            group = row[group_by] if group_by else None
+            groups.setdefault(group, {})[row['bucket']] = row
+
+        if not group_by:
+            return Response(_par_report(groups.get(None, {})))
+        return Response({
+            'group_by': group_by,
+            'results': [
+                dict({group_by: group}, **_par_report(buckets))
+                for group, buckets in sorted(groups.items(), key=lambda item: str(item[0]))
+            ],
+        })
+
+    except Exception as e:
+        return Response(
+            {"error": "Failed to retrieve portfolio at risk", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def _loan_etag(pk, version, client_version, as_of):
+    return make_etag('loan', pk, version, client_version, as_of)
+
+
+def _pop_versions(row):
+    # (id, version, client version), taken out of a loan_rows() dict
+    return (row['id'], *(row.pop(field) for field in VERSION_FIELDS))
+
+
+def _statement_response(request, entries, columns, title, filename):
+    file_type = request.query_params.get('file_type', 'csv')
+    if file_type not in STATEMENT_FORMATS:
+        return Response(
+            {"error": f"file_type must be one of {STATEMENT_FORMATS}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if file_type == 'pdf':
+        response = StreamingHttpResponse(stream_pdf(title, entries), content_type='application/pdf')
+    else:
+        response = StreamingHttpResponse(stream_csv(entries, columns), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_type}"'
+    return response
+
+
+def _parse_page_size(request):
+    # Capped at MAX_PAGE_SIZE; zero or negative sizes would reach the paginator
+    try:
+        page_size = int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        page_size = 0
+    if page_size < 1:
+        raise ValueError("page_size must be a positive integer")
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def _apply_loan_filters(queryset, request):
+    params = request.query_params
+    filters = {}
+    if params.get('status'):
+        filters['status'] = params['status']
+    if params.get('loan_type'):
+        filters['loan_type'] = params['loan_type']
+    if params.get('client'):
+        filters['client_id'] = params['client']
+    if params.get('credit_officer'):
+        filters['client__credit_officer_id'] = params['credit_officer']
+
+    # Maturity date range, inclusive
+    for param, lookup in (('due_date_after', 'due_date__gte'), ('due_date_before', 'due_date__lte')):
+        if params.get(param):
+            value = parse_date(params[param])
+            if value is None:
+                raise ValueError(f"{param} must be a date (YYYY-MM-DD)")
+            filters[lookup] = value
+    return queryset.filter(**filters)
+
+
+def _par_report(bucket_totals):
+    buckets = []
+    total_count, total_balance = 0, Decimal('0')
+    for bucket, label, _, _ in PortfolioAgingSummary.AGING_BUCKETS:
+        row = bucket_totals.get(bucket, {})
+        count = row.get('loan_count') or 0
+        # Two places on every backend (SQLite sums come back unscaled)
+        balance = to_cents(row.get('outstanding_balance') or 0)
+        total_count += count
+        total_balance += balance
+        buckets.append({'bucket': bucket, 'label': label, 'loan_count': count, 'outstanding_balance': balance})
+
+    report = {'loan_count': total_count, 'outstanding_balance': total_balance, 'buckets': buckets}
+    for name, threshold in PAR_THRESHOLDS.items():
+        at_risk = sum(
+            entry['outstanding_balance']
+            for entry, (_, _, low, _) in zip(buckets, PortfolioAgingSummary.AGING_BUCKETS)
+            if low > threshold
+        )
+        ratio = (at_risk / total_balance * 100).quantize(Decimal('0.01')) if total_balance else Decimal('0.00')
+        report[name] = {'balance': at_risk, 'ratio': ratio}
+    return report
@@ -0,0 +1,186 @@
+"""
+Savings balances read from the ledger without summing its history.
+
+- Current balance: SavingsAccount.balance, kept by every posting.
+- Balance as of a moment: balance_after of the account's latest
+  transaction posted by then, one index seek on (account, posted_at,
+  sequence) however long the history is.
+- Daily checkpoints (create_checkpoints, run by the checkpoint_savings
+  command) hold every account's closing balance and the day's credits and
+  debits, so the total held on a past day is one indexed read of that
+  day's rows. A checkpoint's balance must equal the previous checkpoint's
+  plus its credits minus its debits, which verify_checkpoints checks.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from loans.calculations import to_cents
+from .models import SavingsAccount, SavingsBalanceCheckpoint, SavingsTransaction
+
+CHECKPOINT_BATCH_SIZE = 1000
+
+# Postings that add to the balance: credit types, and reversals of debits
+CREDIT = (
+    Q(transaction_type__in=SavingsTransaction.CREDIT_TYPES)
+    | Q(transaction_type='reversal', reverses__transaction_type__in=SavingsTransaction.DEBIT_TYPES)
+)
+
+
+def day_bounds(day):
+    """[start, end) of a local calendar day as aware datetimes"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def balance_as_of(account_id, when):
+    """(balance, sequence of the latest transaction) of an account just before ``when``"""
+    row = (
+        SavingsTransaction.objects.filter(account_id=account_id, posted_at__lt=when)
+        .order_by('-posted_at', '-sequence')
+        .values_list('balance_after', 'sequence')
+        .first()
+    )
+    return row or (Decimal('0'), 0)
+
+
+def balances_as_of(when, accounts=None):
+    """Accounts with history before ``when``, annotated with balance_as_of and sequence_as_of"""
+    accounts = SavingsAccount.objects.all() if accounts is None else accounts
+    latest = SavingsTransaction.objects.filter(
+        account=OuterRef('pk'), posted_at__lt=when
+    ).order_by('-posted_at', '-sequence')
+    return accounts.annotate(
+        balance_as_of=Subquery(latest.values('balance_after')[:1]),
+        sequence_as_of=Subquery(latest.values('sequence')[:1]),
+    ).filter(sequence_as_of__isnull=False)
+
+
+def daily_flows(day):
+    """{account id: (credits, debits)} posted during ``day``"""
+    start, end = day_bounds(day)
+    rows = (
+        SavingsTransaction.objects.filter(posted_at__gte=start, posted_at__lt=end)
+        .values('account')
+        .annotate(credits=Sum('amount', filter=CREDIT), debits=Sum('amount', filter=~CREDIT))
+        .order_by()
+    )
+    return {row['account']: (row['credits'] or Decimal('0'), row['debits'] or Decimal('0')) for row in rows}
+
+
+def create_checkpoints(day, progress=None):
+    """Checkpoint every account with history at the end of ``day``; re-running replaces the day.
+
+    Returns the number of checkpoints written. ``progress`` is called with
+    the running count after each batch.
+    """
+    _, end = day_bounds(day)
+    flows = daily_flows(day)
+    accounts = balances_as_of(end).order_by('pk').values_list('pk', 'balance_as_of', 'sequence_as_of')
+
+    written = 0
+    with transaction.atomic():
+        SavingsBalanceCheckpoint.objects.filter(date=day).delete()
+        batch = []
+        for account_id, balance, sequence in accounts.iterator(chunk_size=CHECKPOINT_BATCH_SIZE):
+            credits, debits = flows.get(account_id, (Decimal('0'), Decimal('0')))
+            batch.append(SavingsBalanceCheckpoint(
+                account_id=account_id, date=day, balance=balance,
+                credits=credits, debits=debits, last_sequence=sequence,
+            ))
+            if len(batch) == CHECKPOINT_BATCH_SIZE:
+                written += _write_checkpoints(batch, progress, written)
+        written += _write_checkpoints(batch, progress, written)
+    return written
+
+
+def _write_checkpoints(batch, progress, written=0):
+    count = len(batch)
+    if count:
+        SavingsBalanceCheckpoint.objects.bulk_create(batch)
+        batch.clear()
+        if progress:
+            progress(written + count)
+    return count
+
+
+def verify_checkpoints(day):
+    """Accounts whose checkpoint for ``day`` does not follow from their previous one.
+
+    Returns [(account id, expected balance, checkpoint balance)].
+    """
+    previous = SavingsBalanceCheckpoint.objects.filter(
+        account=OuterRef('account'), date__lt=day
+    ).order_by('-date')
+    rows = SavingsBalanceCheckpoint.objects.filter(date=day).annotate(
+        previous_balance=Subquery(previous.values('balance')[:1]),
+    ).values_list('account', 'previous_balance', 'credits', 'debits', 'balance')
+
+    mismatches = []
+    for account_id, previous_balance, credits, debits, balance in rows:
+        if previous_balance is None:
+            continue
+        expected = previous_balance + credits - debits
+        if expected != balance:
+            mismatches.append((account_id, expected, balance))
+    return mismatches
+
+
+def savings_summary(day=None):
+    """Branch dashboard totals: the day's flows and the balance held at its end.
+
+    Each flow is net of reversals posted that day, so deposits and
+    withdrawals less their reversals, plus interest less fees, add up to
+    net_flow, which is how far the day moved the balances.
+    """
+    today = timezone.localdate()
+    day = day or today
+    start, end = day_bounds(day)
+    flows = daily_totals(start, end)
+
+    if day >= today:
+        held = SavingsAccount.objects.aggregate(
+            balance=Sum('balance'), accounts=Count('pk', filter=Q(last_sequence__gt=0))
+        )
+    else:
+        held = SavingsBalanceCheckpoint.objects.filter(date=day).aggregate(
+            balance=Sum('balance'), accounts=Count('pk')
+        )
+        if not held['accounts']:
+            # No checkpoint run for that day: one seek per account instead
+            held = balances_as_of(end).aggregate(balance=Sum('balance_as_of'), accounts=Count('pk'))
+
+    net_flow = (
+        sum(flows[posting_type] for posting_type in SavingsTransaction.CREDIT_TYPES)
+        - sum(flows[posting_type] for posting_type in SavingsTransaction.DEBIT_TYPES)
+    )
+    return {
+        'date': day,
+        'deposits': flows['deposit'],
+        'withdrawals': flows['withdrawal'],
+        'interest': flows['interest'],
+        'fees': flows['fee'],
+        'net_flow': net_flow,
+        'balance': to_cents(held['balance'] or 0),
+        'accounts': held['accounts'],
+    }
+
+
+def daily_totals(start, end):
+    """{transaction type: amount posted in [start, end) less reversals of that type posted then}"""
+    posting_types = [*SavingsTransaction.CREDIT_TYPES, *SavingsTransaction.DEBIT_TYPES]
+    sums = {}
+    for posting_type in posting_types:
+        sums[posting_type] = Sum('amount', filter=Q(transaction_type=posting_type))
+        # Reversals take the type of the posting they undo, as in CREDIT
+        sums[f'{posting_type}_reversed'] = Sum(
+            'amount', filter=Q(transaction_type='reversal', reverses__transaction_type=posting_type)
+        )
+    totals = SavingsTransaction.objects.filter(posted_at__gte=start, posted_at__lt=end).aggregate(**sums)
+    return {
+        posting_type: to_cents((totals[posting_type] or 0) - (totals[f'{posting_type}_reversed'] or 0))
+        for posting_type in posting_types
+    }
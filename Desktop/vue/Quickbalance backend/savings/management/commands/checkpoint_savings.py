@@ -0,0 +1,32 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from savings.ledger import create_checkpoints, verify_checkpoints
+
+
+class Command(BaseCommand):
+    help = "Record every savings account's closing balance for a day (run nightly after midnight)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Day to checkpoint (YYYY-MM-DD, defaults to yesterday)")
+
+    def handle(self, *args, **options):
+        try:
+            day = date.fromisoformat(options['date']) if options['date'] else timezone.localdate() - timedelta(days=1)
+        except ValueError:
+            raise CommandError("--date must be in YYYY-MM-DD format")
+        if day >= timezone.localdate():
+            raise CommandError("Only days that have ended can be checkpointed")
+
+        started = time.monotonic()
+        written = create_checkpoints(day, progress=lambda count: self.stdout.write(f"  {count} accounts"))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Checkpointed {written} savings accounts for {day} in {elapsed:.1f}s"))
+
+        mismatches = verify_checkpoints(day)
+        for account_id, expected, balance in mismatches:
+            self.stderr.write(f"Account {account_id}: expected {expected} from the previous checkpoint, found {balance}")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} checkpoints do not follow from the previous ones")
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:52
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('clients', '0007_client_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavingsAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_number', models.CharField(blank=True, help_text='Generated from the id when left blank', max_length=30, null=True, unique=True)),
+                ('account_type', models.CharField(choices=[('voluntary', 'Voluntary Savings'), ('compulsory', 'Compulsory Savings'), ('fixed', 'Fixed Deposit')], default='voluntary', max_length=20)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('dormant', 'Dormant'), ('closed', 'Closed')], default='active', max_length=20)),
+                ('opened_date', models.DateField(default=django.utils.timezone.localdate)),
+                ('balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('last_sequence', models.PositiveIntegerField(default=0, help_text='Sequence of the latest transaction')),
+                ('last_transaction_at', models.DateTimeField(blank=True, null=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='savings_accounts', to='clients.client')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SavingsBalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('credits', models.DecimalField(decimal_places=2, default=0.0, help_text='Posted during the day', max_digits=14)),
+                ('debits', models.DecimalField(decimal_places=2, default=0.0, help_text='Posted during the day', max_digits=14)),
+                ('last_sequence', models.PositiveIntegerField(help_text='Latest transaction included')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='savings.savingsaccount')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SavingsTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField(help_text='1, 2, 3... within the account, in posting order')),
+                ('transaction_type', models.CharField(choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal'), ('interest', 'Interest'), ('fee', 'Fee'), ('reversal', 'Reversal')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Always positive; the type decides the direction', max_digits=14, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('posted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('payment_mode', models.CharField(choices=[('cash', 'Cash'), ('bank', 'Bank Transfer'), ('mobile_money', 'Mobile Money')], default='cash', max_length=20)),
+                ('reference', models.CharField(blank=True, help_text='Receipt or transfer reference', max_length=50)),
+                ('notes', models.TextField(blank=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transactions', to='savings.savingsaccount')),
+                ('posted_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='savings_transactions', to=settings.AUTH_USER_MODEL)),
+                ('reverses', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reversal', to='savings.savingstransaction')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='savingsaccount',
+            index=models.Index(fields=['client', 'status'], name='savings_sav_client__50404a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savingsbalancecheckpoint',
+            index=models.Index(fields=['date'], name='savings_sav_date_b0b3b6_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='savingsbalancecheckpoint',
+            constraint=models.UniqueConstraint(fields=('account', 'date'), name='savings_checkpoint_account_date'),
+        ),
+        migrations.AddIndex(
+            model_name='savingstransaction',
+            index=models.Index(fields=['account', 'posted_at', 'sequence'], name='savings_sav_account_36b936_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savingstransaction',
+            index=models.Index(fields=['posted_at', 'transaction_type'], name='savings_sav_posted__564368_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='savingstransaction',
+            constraint=models.UniqueConstraint(fields=('account', 'sequence'), name='savings_transaction_account_sequence'),
+        ),
+    ]
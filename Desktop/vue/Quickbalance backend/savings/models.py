@@ -1,3 +1,226 @@
+from django.conf import settings
 from django.db import models
+from django.core.validators import MinValueValidator
+from django.utils import timezone
+from decimal import Decimal
+from clients.models import Client
+from loans.concurrency import run_with_retry
 
-# Create your models here.
+
+class SavingsAccount(models.Model):
+    ACCOUNT_TYPE_CHOICES = [
+        ('voluntary', 'Voluntary Savings'),
+        ('compulsory', 'Compulsory Savings'),
+        ('fixed', 'Fixed Deposit'),
+    ]
+
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('dormant', 'Dormant'),
+        ('closed', 'Closed'),
+    ]
+
+    # Moved only by SavingsTransaction postings, under the account lock; a
+    # plain save() of a stale instance must not write them back
+    RUNNING_FIELDS = ['balance', 'last_sequence', 'last_transaction_at']
+
+    client = models.ForeignKey(Client, on_delete=models.PROTECT, related_name="savings_accounts")
+    account_number = models.CharField(
+        max_length=30,
+        unique=True,
+        blank=True,
+        null=True,
+        help_text="Generated from the id when left blank"
+    )
+    account_type = models.CharField(max_length=20, choices=ACCOUNT_TYPE_CHOICES, default='voluntary')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    opened_date = models.DateField(default=timezone.localdate)
+
+    # Balance after the latest transaction, so the current balance is a read
+    # of this row
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    last_sequence = models.PositiveIntegerField(default=0, help_text="Sequence of the latest transaction")
+    last_transaction_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # A client's accounts by status (client page, dashboard totals)
+            models.Index(fields=['client', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.account_number} - {self.client.first_name} {self.client.other_names or ''}".strip()
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if not adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.RUNNING_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        if adding and not self.account_number:
+            self.account_number = f"SAV{self.pk:08d}"
+            SavingsAccount.objects.filter(pk=self.pk).update(account_number=self.account_number)
+
+
+class SavingsTransaction(models.Model):
+    """One posting to a savings account. Rows are never changed or deleted.
+
+    Each row stores the account balance right after it, so the balance at
+    any moment is the balance_after of the latest row posted by then (see
+    ledger.py) rather than a SUM over the history. A mistaken posting is
+    undone by posting its reversal.
+    """
+    TRANSACTION_TYPE_CHOICES = [
+        ('deposit', 'Deposit'),
+        ('withdrawal', 'Withdrawal'),
+        ('interest', 'Interest'),
+        ('fee', 'Fee'),
+        ('reversal', 'Reversal'),
+    ]
+
+    PAYMENT_MODE_CHOICES = [
+        ('cash', 'Cash'),
+        ('bank', 'Bank Transfer'),
+        ('mobile_money', 'Mobile Money'),
+    ]
+
+    CREDIT_TYPES = ('deposit', 'interest')
+    DEBIT_TYPES = ('withdrawal', 'fee')
+
+    account = models.ForeignKey(SavingsAccount, on_delete=models.PROTECT, related_name="transactions")
+    sequence = models.PositiveIntegerField(help_text="1, 2, 3... within the account, in posting order")
+    transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPE_CHOICES)
+    amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))],
+        help_text="Always positive; the type decides the direction"
+    )
+    balance_after = models.DecimalField(max_digits=14, decimal_places=2)
+    posted_at = models.DateTimeField(default=timezone.now)
+    payment_mode = models.CharField(max_length=20, choices=PAYMENT_MODE_CHOICES, default='cash')
+    reference = models.CharField(max_length=50, blank=True, help_text="Receipt or transfer reference")
+    notes = models.TextField(blank=True)
+    reverses = models.OneToOneField(
+        'self',
+        on_delete=models.PROTECT,
+        blank=True,
+        null=True,
+        related_name="reversal"
+    )
+    posted_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="savings_transactions"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'sequence'], name='savings_transaction_account_sequence'),
+        ]
+        indexes = [
+            # Balance as of a moment: the account's latest row posted by then
+            models.Index(fields=['account', 'posted_at', 'sequence']),
+            # Branch deposits and withdrawals for a day
+            models.Index(fields=['posted_at', 'transaction_type']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_transaction_type_display()} of {self.amount} on {self.account.account_number}"
+
+    @property
+    def signed_amount(self):
+        """What this posting adds to the balance (negative for debits)"""
+        if self.transaction_type in self.CREDIT_TYPES:
+            return self.amount
+        if self.transaction_type in self.DEBIT_TYPES:
+            return -self.amount
+        return -self.reverses.signed_amount
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Savings transactions cannot be changed; post a reversal instead")
+        run_with_retry(self._post, *args, reset=self._retry_reset(), **kwargs)
+
+    def _retry_reset(self):
+        """Undo, before a retry, what a rolled-back attempt changed in memory"""
+        initial = (self.pk, self._state.adding)
+
+        def reset():
+            self.pk, self._state.adding = initial
+        return reset
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Savings transactions cannot be deleted; post a reversal instead")
+
+    def _post(self, *args, **kwargs):
+        # Sequence, balance and posting time are read-then-write; the account
+        # lock keeps other postings out until this one commits
+        account = SavingsAccount.objects.select_for_update().get(pk=self.account_id)
+        if account.status == 'closed':
+            raise ValueError(f"Account {account.account_number} is closed")
+        if self.transaction_type == 'reversal':
+            self._check_reversal()
+        elif self.reverses_id:
+            raise ValueError("Only reversals can reference another transaction")
+
+        self.amount = Decimal(str(self.amount))
+        balance = account.balance + self.signed_amount
+        if balance < 0:
+            raise ValueError(f"Insufficient balance: {account.balance} available")
+
+        self.sequence = account.last_sequence + 1
+        self.balance_after = balance
+        # Never before the previous posting, so posting order and time agree
+        self.posted_at = timezone.now()
+        if account.last_transaction_at and self.posted_at < account.last_transaction_at:
+            self.posted_at = account.last_transaction_at
+        super().save(*args, **kwargs)
+
+        SavingsAccount.objects.filter(pk=account.pk).update(
+            balance=balance, last_sequence=self.sequence, last_transaction_at=self.posted_at,
+        )
+        # Keep the caller's account instance current
+        if not SavingsTransaction.account.is_cached(self):
+            self.account = account
+        self.account.balance = balance
+        self.account.last_sequence = self.sequence
+        self.account.last_transaction_at = self.posted_at
+
+    def _check_reversal(self):
+        original = self.reverses
+        if original is None:
+            raise ValueError("A reversal must reference the transaction it reverses")
+        if original.account_id != self.account_id:
+            raise ValueError("A reversal must be posted to the same account")
+        if original.transaction_type == 'reversal':
+            raise ValueError("A reversal cannot be reversed")
+        if SavingsTransaction.objects.filter(reverses=original).exists():
+            raise ValueError(f"Transaction #{original.pk} has already been reversed")
+        self.amount = original.amount
+
+
+class SavingsBalanceCheckpoint(models.Model):
+    """An account's closing balance and flows for a day (see ledger.create_checkpoints)"""
+    account = models.ForeignKey(SavingsAccount, on_delete=models.CASCADE, related_name="checkpoints")
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    credits = models.DecimalField(max_digits=14, decimal_places=2, default=0.00, help_text="Posted during the day")
+    debits = models.DecimalField(max_digits=14, decimal_places=2, default=0.00, help_text="Posted during the day")
+    last_sequence = models.PositiveIntegerField(help_text="Latest transaction included")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='savings_checkpoint_account_date'),
+        ]
+        indexes = [
+            # Every account's balance on a day, for portfolio totals
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.account.account_number} balance {self.balance} on {self.date}"
@@ -0,0 +1,73 @@
+# serializers.py
+from decimal import Decimal
+from rest_framework import serializers
+from .models import SavingsAccount, SavingsTransaction
+
+
+class SavingsAccountSerializer(serializers.ModelSerializer):
+    client_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SavingsAccount
+        fields = [
+            'id',
+            'client',
+            'client_name',
+            'account_number',
+            'account_type',
+            'status',
+            'opened_date',
+            'balance',
+            'last_sequence',
+            'last_transaction_at',
+        ]
+        # Moved only by postings
+        read_only_fields = SavingsAccount.RUNNING_FIELDS
+
+    def get_client_name(self, account):
+        # Client.full_name is only set on save
+        client = account.client
+        return f"{client.first_name} {client.other_names or ''}".strip()
+
+    def validate_client(self, value):
+        # An account stays with the client it was opened for
+        if self.instance is not None and value != self.instance.client:
+            raise serializers.ValidationError("The client of an account cannot be changed")
+        return value
+
+    def validate_status(self, value):
+        if value == 'closed' and self.instance is not None and self.instance.balance != 0:
+            raise serializers.ValidationError("Withdraw the balance before closing the account")
+        return value
+
+
+class SavingsTransactionSerializer(serializers.ModelSerializer):
+    # Reversals go through the reverse endpoint, which checks the original
+    transaction_type = serializers.ChoiceField(
+        choices=[choice for choice in SavingsTransaction.TRANSACTION_TYPE_CHOICES if choice[0] != 'reversal']
+    )
+    amount = serializers.DecimalField(max_digits=14, decimal_places=2, min_value=Decimal('0.01'))
+
+    class Meta:
+        model = SavingsTransaction
+        fields = [
+            'id',
+            'account',
+            'sequence',
+            'transaction_type',
+            'amount',
+            'balance_after',
+            'posted_at',
+            'payment_mode',
+            'reference',
+            'notes',
+            'reverses',
+            'posted_by',
+        ]
+        read_only_fields = ['account', 'sequence', 'balance_after', 'posted_at', 'reverses', 'posted_by']
+
+    def to_representation(self, instance):
+        # Reversal rows are listed with the other postings
+        data = super().to_representation(instance)
+        data['transaction_type'] = instance.transaction_type
+        return data
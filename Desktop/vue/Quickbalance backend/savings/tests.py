@@ -1,3 +1,242 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from clients.models import Client
+from .ledger import (
+    balance_as_of, create_checkpoints, day_bounds, daily_flows, savings_summary, verify_checkpoints,
+)
+from .models import SavingsAccount, SavingsBalanceCheckpoint, SavingsTransaction
+
+
+def make_account(phone='0700000001', **fields):
+    client = Client.objects.create(
+        first_name='Test', other_names='Saver', phone=phone, other_phoneNos=f'x{phone}',
+        national_id=f'NID{phone}', passport_number=f'P{phone}',
+    )
+    return SavingsAccount.objects.create(client=client, **fields)
+
+
+class SavingsTestCase(TestCase):
+    def setUp(self):
+        self.account = make_account()
+        self.today = timezone.localdate()
+
+    def post(self, transaction_type, amount, account=None, **fields):
+        posting = SavingsTransaction(
+            account=account or self.account, transaction_type=transaction_type, amount=Decimal(amount), **fields
+        )
+        posting.save()
+        return posting
+
+    def reverse(self, original):
+        return self.post('reversal', original.amount, account=original.account, reverses=original)
+
+    def move_to(self, day, *postings, hour=10):
+        """Backdate postings to ``day``, keeping their order"""
+        start, _ = day_bounds(day)
+        for minute, posting in enumerate(postings):
+            SavingsTransaction.objects.filter(pk=posting.pk).update(
+                posted_at=start + timedelta(hours=hour, minutes=minute)
+            )
+
+
+class PostingTests(SavingsTestCase):
+    def test_each_posting_stores_its_running_balance(self):
+        postings = [self.post('deposit', '100.00'), self.post('withdrawal', '30.50'),
+                    self.post('interest', '2.00'), self.post('fee', '1.50')]
+        self.assertEqual([p.sequence for p in postings], [1, 2, 3, 4])
+        self.assertEqual([p.balance_after for p in postings],
+                         [Decimal('100.00'), Decimal('69.50'), Decimal('71.50'), Decimal('70.00')])
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.balance, self.account.last_sequence), (Decimal('70.00'), 4))
+        self.assertEqual(self.account.account_number, f'SAV{self.account.pk:08d}')
+
+    def test_overdrawing_is_refused(self):
+        self.post('deposit', '10.00')
+        with self.assertRaisesMessage(ValueError, 'Insufficient balance'):
+            self.post('withdrawal', '10.01')
+        self.assertEqual(SavingsTransaction.objects.count(), 1)
+
+    def test_closed_accounts_take_no_postings(self):
+        SavingsAccount.objects.filter(pk=self.account.pk).update(status='closed')
+        with self.assertRaisesMessage(ValueError, 'is closed'):
+            self.post('deposit', '10.00')
+
+    def test_postings_cannot_be_changed_or_deleted(self):
+        deposit = self.post('deposit', '10.00')
+        deposit.notes = 'edited'
+        with self.assertRaises(ValueError):
+            deposit.save()
+        with self.assertRaises(ValueError):
+            deposit.delete()
+
+    def test_plain_account_save_keeps_the_running_balance(self):
+        stale = SavingsAccount.objects.get(pk=self.account.pk)
+        self.post('deposit', '25.00')
+        stale.account_type = 'fixed'
+        stale.save()
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.balance, self.account.account_type), (Decimal('25.00'), 'fixed'))
+
+    def test_reversal_undoes_the_original_once(self):
+        self.post('deposit', '100.00')
+        withdrawal = self.post('withdrawal', '30.50')
+        reversal = self.reverse(withdrawal)
+        self.assertEqual(reversal.balance_after, Decimal('100.00'))
+        self.assertEqual(reversal.signed_amount, Decimal('30.50'))
+        with self.assertRaisesMessage(ValueError, 'already been reversed'):
+            self.reverse(withdrawal)
+        with self.assertRaisesMessage(ValueError, 'cannot be reversed'):
+            self.reverse(reversal)
+
+    def test_reversal_must_stay_on_the_original_account(self):
+        deposit = self.post('deposit', '10.00')
+        other = make_account('0700000002')
+        with self.assertRaisesMessage(ValueError, 'same account'):
+            self.post('reversal', '10.00', account=other, reverses=deposit)
+
+
+class BalanceAsOfTests(SavingsTestCase):
+    def test_balance_at_the_end_of_past_days(self):
+        two_days_ago, yesterday = self.today - timedelta(days=2), self.today - timedelta(days=1)
+        first = [self.post('deposit', '100.00'), self.post('deposit', '50.00')]
+        second = [self.post('withdrawal', '20.00')]
+        self.post('deposit', '5.00')
+        self.move_to(two_days_ago, *first)
+        self.move_to(yesterday, *second)
+
+        self.assertEqual(balance_as_of(self.account.pk, day_bounds(two_days_ago)[0]), (Decimal('0'), 0))
+        self.assertEqual(balance_as_of(self.account.pk, day_bounds(two_days_ago)[1]), (Decimal('150.00'), 2))
+        self.assertEqual(balance_as_of(self.account.pk, day_bounds(yesterday)[1]), (Decimal('130.00'), 3))
+
+    def test_as_of_lookup_is_a_single_query(self):
+        for _ in range(5):
+            self.post('deposit', '1.00')
+        with self.assertNumQueries(1):
+            balance_as_of(self.account.pk, timezone.now() + timedelta(seconds=1))
+
+
+class CheckpointTests(SavingsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = make_account('0700000002')
+        self.days = [self.today - timedelta(days=2), self.today - timedelta(days=1)]
+        day_one = [self.post('deposit', '100.00'), self.post('deposit', '40.00', account=self.other)]
+        withdrawal = self.post('withdrawal', '30.00')
+        day_two = [withdrawal, self.post('fee', '1.00'), self.reverse(withdrawal)]
+        self.move_to(self.days[0], *day_one)
+        self.move_to(self.days[1], *day_two)
+
+    def checkpoints(self, day):
+        return {
+            row.account_id: (row.balance, row.credits, row.debits, row.last_sequence)
+            for row in SavingsBalanceCheckpoint.objects.filter(date=day)
+        }
+
+    def test_checkpoints_hold_closing_balance_and_flows(self):
+        for day in self.days:
+            create_checkpoints(day)
+        self.assertEqual(self.checkpoints(self.days[0]), {
+            self.account.pk: (Decimal('100.00'), Decimal('100.00'), Decimal('0.00'), 1),
+            self.other.pk: (Decimal('40.00'), Decimal('40.00'), Decimal('0.00'), 1),
+        })
+        # The reversed withdrawal counts as a credit; quiet accounts carry over
+        self.assertEqual(self.checkpoints(self.days[1]), {
+            self.account.pk: (Decimal('99.00'), Decimal('30.00'), Decimal('31.00'), 4),
+            self.other.pk: (Decimal('40.00'), Decimal('0.00'), Decimal('0.00'), 1),
+        })
+        self.assertEqual(verify_checkpoints(self.days[1]), [])
+
+    def test_rerunning_a_day_replaces_it(self):
+        create_checkpoints(self.days[1])
+        self.assertEqual(create_checkpoints(self.days[1]), 2)
+        self.assertEqual(SavingsBalanceCheckpoint.objects.filter(date=self.days[1]).count(), 2)
+
+    def test_verify_reports_checkpoints_that_do_not_follow(self):
+        for day in self.days:
+            create_checkpoints(day)
+        SavingsBalanceCheckpoint.objects.filter(account=self.account, date=self.days[1]).update(balance=Decimal('98.00'))
+        self.assertEqual(verify_checkpoints(self.days[1]), [(self.account.pk, Decimal('99.00'), Decimal('98.00'))])
+
+    def test_daily_flows_match_the_balance_movement(self):
+        credits, debits = daily_flows(self.days[1])[self.account.pk]
+        self.assertEqual(credits - debits, Decimal('-1.00'))
+
+
+class SummaryTests(SavingsTestCase):
+    def test_reversed_withdrawal_is_netted(self):
+        self.post('deposit', '100.00')
+        self.reverse(self.post('withdrawal', '30.50'))
+        summary = savings_summary()
+        self.assertEqual(summary['deposits'], Decimal('100.00'))
+        self.assertEqual(summary['withdrawals'], Decimal('0.00'))
+        self.assertEqual(summary['net_flow'], Decimal('100.00'))
+        self.assertEqual(summary['balance'], Decimal('100.00'))
+
+    def test_net_flow_is_the_balance_movement(self):
+        deposit = self.post('deposit', '100.00')
+        self.post('withdrawal', '20.00')
+        self.post('interest', '3.00')
+        self.post('fee', '2.00')
+        self.post('deposit', '60.00')
+        self.reverse(deposit)
+        summary = savings_summary()
+        self.assertEqual((summary['deposits'], summary['withdrawals']), (Decimal('60.00'), Decimal('20.00')))
+        self.assertEqual((summary['interest'], summary['fees']), (Decimal('3.00'), Decimal('2.00')))
+        self.assertEqual(summary['net_flow'], Decimal('41.00'))
+        self.assertEqual(summary['balance'], Decimal('41.00'))
+
+    def test_past_day_reads_checkpoints_or_falls_back_to_the_ledger(self):
+        yesterday = self.today - timedelta(days=1)
+        self.move_to(yesterday, self.post('deposit', '80.00'))
+        self.post('deposit', '5.00')
+
+        fallback = savings_summary(yesterday)
+        create_checkpoints(yesterday)
+        with self.assertNumQueries(2):
+            from_checkpoints = savings_summary(yesterday)
+        self.assertEqual(fallback, from_checkpoints)
+        self.assertEqual((from_checkpoints['balance'], from_checkpoints['deposits']), (Decimal('80.00'), Decimal('80.00')))
+
+
+class SavingsApiTests(SavingsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create_user('teller', password='x'))
+
+    def test_post_reverse_and_read_balances(self):
+        url = f'/api/savings/accounts/{self.account.pk}/transactions/'
+        response = self.api.post(url, {'transaction_type': 'deposit', 'amount': '100.00'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        withdrawal = self.api.post(url, {'transaction_type': 'withdrawal', 'amount': '30.50'}, format='json').json()
+        self.assertEqual(withdrawal['balance_after'], '69.50')
+
+        response = self.api.post(url, {'transaction_type': 'withdrawal', 'amount': '500'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.api.post(url, {'transaction_type': 'reversal', 'amount': '1'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.api.post(f"/api/savings/transactions/{withdrawal['id']}/reverse/", {}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['balance_after'], '100.00')
+
+        balance = self.api.get(f'/api/savings/accounts/{self.account.pk}/balance/').json()
+        self.assertEqual((balance['balance'], balance['sequence']), ('100.00', 3))
+        yesterday = self.today - timedelta(days=1)
+        balance = self.api.get(f'/api/savings/accounts/{self.account.pk}/balance/?as_of={yesterday}').json()
+        self.assertEqual((balance['balance'], balance['sequence']), ('0', 0))
+        self.assertEqual(self.api.get(f'/api/savings/accounts/{self.account.pk}/balance/?as_of=bad').status_code, 400)
+
+        summary = self.api.get('/api/savings/summary/').json()
+        self.assertEqual((summary['withdrawals'], summary['net_flow']), ('0.00', '100.00'))
 
-# Create your tests here.
+    def test_running_fields_are_read_only(self):
+        response = self.api.patch(f'/api/savings/accounts/{self.account.pk}/', {'balance': '999'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['balance'], '0.00')
@@ -0,0 +1,14 @@
+#endpoints
+from django.urls import path
+from . import views
+
+app_name = 'savings'
+
+urlpatterns = [
+    path('accounts/', views.account_list_create, name='account-list-create'),
+    path('accounts/<int:pk>/', views.account_detail, name='account-detail'),
+    path('accounts/<int:pk>/balance/', views.account_balance, name='account-balance'),
+    path('accounts/<int:pk>/transactions/', views.transaction_list_create, name='transaction-list-create'),
+    path('transactions/<int:pk>/reverse/', views.transaction_reverse, name='transaction-reverse'),
+    path('summary/', views.savings_dashboard, name='savings-summary'),
+]
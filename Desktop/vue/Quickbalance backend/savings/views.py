@@ -1,3 +1,265 @@
-from django.shortcuts import render
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from config.renderers import ORJSONRenderer
+from config.routers import read_from_replica
+from .ledger import balance_as_of, day_bounds, savings_summary
+from .models import SavingsAccount, SavingsTransaction
+from .serializers import SavingsAccountSerializer, SavingsTransactionSerializer
 
-# Create your views here.
+DEFAULT_PAGE_SIZE = 15
+MAX_PAGE_SIZE = 50
+ACCOUNT_FILTERS = ['client', 'account_type', 'status']
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, BrowsableAPIRenderer])
+@read_from_replica
+def account_list_create(request):
+    if request.method == 'GET':
+        return _get_account_list(request)
+    elif request.method == 'POST':
+        return _create_account(request)
+
+
+@api_view(['GET', 'PATCH'])
+@permission_classes([IsAuthenticated])
+def account_detail(request, pk):
+    account = get_object_or_404(SavingsAccount.objects.select_related('client'), pk=pk)
+    if request.method == 'GET':
+        return Response(SavingsAccountSerializer(account).data)
+
+    try:
+        serializer = SavingsAccountSerializer(account, data=request.data, partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to update savings account", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, BrowsableAPIRenderer])
+@read_from_replica
+def transaction_list_create(request, pk):
+    account = get_object_or_404(SavingsAccount, pk=pk)
+    if request.method == 'GET':
+        return _get_transaction_list(account, request)
+    elif request.method == 'POST':
+        return _post_transaction(account, request)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def transaction_reverse(request, pk):
+    original = get_object_or_404(SavingsTransaction, pk=pk)
+    try:
+        reversal = SavingsTransaction(
+            account_id=original.account_id,
+            transaction_type='reversal',
+            amount=original.amount,
+            reverses=original,
+            payment_mode=original.payment_mode,
+            reference=original.reference,
+            notes=request.data.get('notes', ''),
+            posted_by=request.user,
+        )
+        with transaction.atomic():
+            reversal.save()
+        return Response(SavingsTransactionSerializer(reversal).data, status=status.HTTP_201_CREATED)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to reverse transaction", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, BrowsableAPIRenderer])
+def account_balance(request, pk):
+    # The current balance is on the account row; ?as_of=YYYY-MM-DD is the
+    # closing balance of that day, one index seek into the ledger
+    try:
+        account = SavingsAccount.objects.filter(pk=pk).values(
+            'pk', 'account_number', *SavingsAccount.RUNNING_FIELDS
+        ).first()
+        if account is None:
+            return Response({"error": "Savings account not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        as_of = _parse_day(request, 'as_of')
+        if as_of is None:
+            return Response({
+                'account': account['pk'],
+                'account_number': account['account_number'],
+                'as_of': timezone.now(),
+                'balance': account['balance'],
+                'sequence': account['last_sequence'],
+            })
+
+        _, end = day_bounds(as_of)
+        balance, sequence = balance_as_of(pk, end)
+        return Response({
+            'account': account['pk'],
+            'account_number': account['account_number'],
+            'as_of': as_of,
+            'balance': balance,
+            'sequence': sequence,
+        })
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to retrieve balance", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([ORJSONRenderer, BrowsableAPIRenderer])
+@read_from_replica
+def savings_dashboard(request):
+    # ?date=YYYY-MM-DD, defaults to today
+    try:
+        return Response(savings_summary(_parse_day(request, 'date')))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to retrieve savings summary", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def _get_account_list(request):
+    try:
+        queryset = SavingsAccount.objects.select_related('client')
+        for param in ACCOUNT_FILTERS:
+            value = request.query_params.get(param)
+            if value:
+                queryset = queryset.filter(**{param: value})
+        queryset = queryset.order_by('-opened_date', '-pk')
+
+        page = request.query_params.get('page', 1)
+        page_size = min(int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        accounts = _get_page(Paginator(queryset, page_size), page)
+        return Response(_page_response(
+            accounts, page_size, SavingsAccountSerializer(accounts.object_list, many=True).data
+        ))
+    except ValueError:
+        return Response(
+            {"error": "Invalid filter, page or page_size parameter"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except Exception as e:
+        return Response(
+            {"error": "Failed to retrieve savings accounts", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def _create_account(request):
+    try:
+        serializer = SavingsAccountSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to create savings account", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def _get_transaction_list(account, request):
+    # Newest first, on the (account, sequence) unique index; ?from= and ?to=
+    # (YYYY-MM-DD) narrow it to posting dates
+    try:
+        queryset = SavingsTransaction.objects.filter(account=account)
+        date_from = _parse_day(request, 'from')
+        if date_from:
+            queryset = queryset.filter(posted_at__gte=day_bounds(date_from)[0])
+        date_to = _parse_day(request, 'to')
+        if date_to:
+            queryset = queryset.filter(posted_at__lt=day_bounds(date_to)[1])
+        queryset = queryset.order_by('-sequence')
+
+        page = request.query_params.get('page', 1)
+        page_size = min(int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        postings = _get_page(Paginator(queryset, page_size), page)
+        return Response(_page_response(
+            postings, page_size, SavingsTransactionSerializer(postings.object_list, many=True).data
+        ))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to retrieve savings transactions", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def _post_transaction(account, request):
+    try:
+        serializer = SavingsTransactionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            # save() takes the account lock and sets sequence and balance_after
+            serializer.save(account=account, posted_by=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {"error": "Failed to post savings transaction", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def _parse_day(request, param):
+    value = request.query_params.get(param)
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"{param} must be a date (YYYY-MM-DD)")
+    return day
+
+
+def _get_page(paginator, page):
+    try:
+        return paginator.page(page)
+    except PageNotAnInteger:
+        return paginator.page(1)
+    except EmptyPage:
+        return paginator.page(paginator.num_pages)
+
+
+def _page_response(page, page_size, results):
+    return {
+        'count': page.paginator.count,
+        'total_pages': page.paginator.num_pages,
+        'current_page': page.number,
+        'page_size': page_size,
+        'next': page.next_page_number() if page.has_next() else None,
+        'previous': page.previous_page_number() if page.has_previous() else None,
+        'results': results,
+    }